@@ -0,0 +1,181 @@
+"""
+업스트림 호출 동시 실행 제한 (admission control)
+
+업스트림(n8n /webhook/1149, search-pdf, OpenAI)별로 동시에 실행할 수 있는 요청 수를 제한하고,
+넘치는 요청은 사용자(uuid)별 라운드로빈 대기열에서 공평하게 순서를 기다린다.
+
+- 대기열이 가득 차면 기다리지 않고 즉시 QueueFullError를 올린다 (fail fast).
+- 대기 시간이 max_wait를 넘으면 QueueTimeoutError를 올린다.
+- 대기 중에는 on_queued 콜백으로 현재 대기 순번을 알려 준다.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import metrics
+import settings
+
+
+class AdmissionError(Exception):
+    """업스트림 대기열 관련 오류"""
+
+    def __init__(self, upstream: str, message: str):
+        super().__init__(message)
+        self.upstream = upstream
+
+
+class QueueFullError(AdmissionError):
+    """대기열이 가득 차 요청을 받을 수 없음"""
+
+
+class QueueTimeoutError(AdmissionError):
+    """대기열에서 max_wait 안에 차례가 오지 않음"""
+
+
+class _Waiter:
+    __slots__ = ("key", "granted", "changed", "position")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Event()
+        self.position = 0
+
+
+class FairLimiter:
+    """사용자(key)별 라운드로빈으로 순서를 배정하는 동시 실행 제한기"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        # key -> 대기자 목록, 순서 = 라운드로빈 순서
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def _update_positions(self) -> None:
+        """라운드로빈 순서 기준 대기 순번(1부터)을 다시 계산하고, 바뀐 대기자에게 알린다."""
+        keys = list(self._queues)
+        lengths = [len(self._queues[k]) for k in keys]
+        for index, key in enumerate(keys):
+            for rank, waiter in enumerate(self._queues[key]):
+                # 앞 순서 사용자는 rank+1명, 뒤 순서 사용자는 rank명, 자기 앞에는 rank명이 먼저 처리된다
+                ahead = sum(min(n, rank + 1) for n in lengths[:index]) + sum(min(n, rank) for n in lengths[index + 1:])
+                position = ahead + rank + 1
+                if waiter.position != position:
+                    waiter.position = position
+                    waiter.changed.set()
+
+    def _grant_next(self) -> None:
+        while self.active < self.concurrency and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._waiting -= 1
+            # 다음 차례는 다른 사용자에게: 처리한 사용자를 라운드로빈 맨 뒤로
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if waiter.granted.done():
+                continue
+            self.active += 1
+            waiter.granted.set_result(True)
+        self._update_positions()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        self._waiting -= 1
+        if not queue:
+            del self._queues[waiter.key]
+        self._update_positions()
+
+    def release(self) -> None:
+        self.active -= 1
+        self._grant_next()
+
+    async def acquire(
+        self,
+        key: str,
+        on_queued: Optional[Callable[[int], Awaitable[Any]]] = None,
+    ) -> None:
+        if self.active < self.concurrency and not self._queues:
+            self.active += 1
+            return
+
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            metrics.ERRORS["admission"].inc()
+            raise QueueFullError(self.name, f"{self.name} 대기열이 가득 찼습니다 ({self._waiting}/{self.max_queue})")
+
+        waiter = _Waiter(key)
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._waiting += 1
+        self._update_positions()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        try:
+            while not waiter.granted.done():
+                if waiter.changed.is_set():
+                    waiter.changed.clear()
+                    if on_queued is not None:
+                        await on_queued(waiter.position)
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    metrics.TIMEOUTS["admission"].inc()
+                    raise QueueTimeoutError(self.name, f"{self.name} 대기 시간 초과 ({self.max_wait}초)")
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                try:
+                    await asyncio.wait({waiter.granted, changed}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+        except BaseException:
+            if waiter.granted.done() and not waiter.granted.cancelled():
+                # 차례를 받은 직후 취소/실패한 경우 자리를 돌려준다
+                self.release()
+            else:
+                waiter.granted.cancel()
+                self._remove(waiter)
+            raise
+
+    @asynccontextmanager
+    async def slot(self, key: str, on_queued: Optional[Callable[[int], Awaitable[Any]]] = None):
+        await self.acquire(key, on_queued)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+# 업스트림별 제한기
+limiters: Dict[str, FairLimiter] = {
+    "chat": FairLimiter("chat", settings.ADMISSION_CHAT_CONCURRENCY, settings.ADMISSION_CHAT_QUEUE, settings.ADMISSION_MAX_WAIT),
+    "search-pdf": FairLimiter("search-pdf", settings.ADMISSION_SEARCH_PDF_CONCURRENCY, settings.ADMISSION_SEARCH_PDF_QUEUE, settings.ADMISSION_MAX_WAIT),
+    "openai": FairLimiter("openai", settings.ADMISSION_OPENAI_CONCURRENCY, settings.ADMISSION_OPENAI_QUEUE, settings.ADMISSION_MAX_WAIT),
+}
@@ -0,0 +1,94 @@
+"""
+반복 질문 답변 캐시 (선택 기능, ANSWER_CACHE_ENABLED)
+
+키 = 정규화한 질문 + 세션 참조 문서 지문 + 챗봇 설정 버전 + 답변 엔진
+같은 설정·같은 참조 문서로 같은 질문이 들어오면 OpenAI를 다시 호출하지 않고 저장된 답변을 재생한다.
+
+OpenAI 엔진에서만 사용한다. n8n 엔진은 참조 문서가 워크플로우 실행 중에 도착하므로 호출 전에 키를 만들 수 없다.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+import settings
+from cache import MISSING, TTLCache
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?!.。？！~ "
+
+# 설정 버전 계산에 포함하는 챗봇 설정 필드
+CONFIG_VERSION_FIELDS = ("instructionData", "trainingData", "gpt-model", "temperature", "max-tokens", "answer-engine")
+
+
+def normalize_question(text: str) -> str:
+    """유니코드 정규화(NFKC), 소문자화, 공백 정리, 끝 문장부호 제거"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+def config_version(chatbot_data: Dict[str, Any]) -> str:
+    """답변에 영향을 주는 챗봇 설정 값들의 지문"""
+    payload = json.dumps(
+        [chatbot_data.get(field) for field in CONFIG_VERSION_FIELDS],
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def references_fingerprint(references: List[Dict[str, str]]) -> str:
+    """참조 문서 목록의 지문 (순서와 무관)"""
+    if not references:
+        return "-"
+    digest = hashlib.sha256()
+    for source, content in sorted((ref.get("source", ""), ref.get("content", "")) for ref in references):
+        digest.update(source.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        digest.update(b"\1")
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        *,
+        enabled: bool = settings.ANSWER_CACHE_ENABLED,
+        maxsize: int = settings.ANSWER_CACHE_SIZE,
+        ttl: float = settings.ANSWER_CACHE_TTL,
+    ):
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize, ttl)
+        self.bypassed = 0
+        self.stores = 0
+
+    def key(self, chat_input: str, references: List[Dict[str, str]], chatbot_data: Dict[str, Any], engine: str) -> str:
+        version = chatbot_data.get("config-version") or config_version(chatbot_data)
+        return "|".join((engine, version, references_fingerprint(references), normalize_question(chat_input)))
+
+    def get(self, key: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """(답변, 참조 문서 목록)을 반환하고, 없으면 None"""
+        cached = self._cache.get(key)
+        return None if cached is MISSING else cached
+
+    def put(self, key: str, answer: str, references: List[Dict[str, str]]) -> None:
+        if not answer.strip():
+            return
+        self._cache.set(key, (answer, references))
+        self.stores += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+        }
@@ -0,0 +1,149 @@
+"""
+답변 엔진 선택 및 OpenAI 스트리밍
+
+- n8n: /webhook/1149 워크플로우 응답을 그대로 전달 (기본값)
+- openai: OpenAI(호환) Chat Completions 스트림을 직접 호출해 토큰을 전달
+
+엔진은 배포 단위(ANSWER_ENGINE 환경 변수) 또는 챗봇 설정의 "answer-engine" 값으로 선택한다.
+OPENAI_BASE_URL을 지정하면 로컬 가짜 서버 등 OpenAI 호환 엔드포인트로 보낼 수 있다.
+
+OPENAI_STREAM_USAGE가 켜져 있으면 스트림 마지막 청크의 사용량(usage)을 받아 입력 토큰 중
+공급자 프롬프트 캐시로 처리된 토큰(prompt_tokens_details.cached_tokens)을 설정 버전별로 집계한다.
+"""
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+import metrics
+import settings
+from resilience import budget
+
+logger = logging.getLogger(__name__)
+
+ENGINE_N8N = "n8n"
+ENGINE_OPENAI = "openai"
+ENGINES = (ENGINE_N8N, ENGINE_OPENAI)
+
+
+def resolve_engine(chatbot_data: Dict[str, Any]) -> str:
+    """챗봇 설정의 answer-engine 값을 우선 사용하고, 없거나 잘못된 값이면 배포 기본값을 사용한다."""
+    engine = str(chatbot_data.get("answer-engine") or settings.ANSWER_ENGINE).strip().lower()
+    if engine not in ENGINES:
+        logger.warning("⚠️ 알 수 없는 answer-engine '%s', %s 사용", engine, settings.ANSWER_ENGINE)
+        return settings.ANSWER_ENGINE
+    return engine
+
+
+def completion_params(model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    """
+    모델 계열에 맞는 생성 파라미터를 만든다.
+
+    GPT-5 계열은 max_completion_tokens를 사용하고 temperature를 1.0으로 고정한다.
+    """
+    if model.lower().startswith("gpt-5"):
+        return {"temperature": 1.0, "max_completion_tokens": max_tokens}
+    return {"temperature": temperature, "max_tokens": max_tokens}
+
+
+def create_openai_client() -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL or None,
+        timeout=settings.OPENAI_TIMEOUT,
+    )
+
+
+async def stream_openai_answer(
+    client: AsyncOpenAI,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    usage: Optional[Dict[str, int]] = None,
+) -> AsyncIterator[str]:
+    """
+    Chat Completions 스트림에서 텍스트 조각만 꺼내 내보낸다.
+
+    호출 측이 순회를 중단하면(취소, 연결 종료) 업스트림 HTTP 스트림도 닫는다.
+    Args:
+        usage: 주면 스트림이 끝날 때 사용량(prompt_tokens, cached_tokens, completion_tokens)을 채운다.
+    """
+    # 턴 마감까지 남은 시간이 OPENAI_TIMEOUT보다 짧으면 그만큼만 기다림
+    extra: Dict[str, Any] = {"timeout": budget(settings.OPENAI_TIMEOUT, "openai")}
+    if settings.OPENAI_STREAM_USAGE:
+        # openai 1.12에는 stream_options 인자가 없어 본문에 직접 넣는다
+        extra["extra_body"] = {"stream_options": {"include_usage": True}}
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        **completion_params(model, temperature, max_tokens),
+        **extra,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            chunk_usage = getattr(chunk, "usage", None)
+            if chunk_usage and usage is not None:
+                usage.update(parse_usage(chunk_usage))
+    finally:
+        await stream.response.aclose()
+
+
+def _field(value: Any, name: str) -> Any:
+    # SDK 버전에 따라 usage가 모델 객체 또는 dict로 들어온다
+    return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+
+def parse_usage(usage: Any) -> Dict[str, int]:
+    details = _field(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": int(_field(usage, "prompt_tokens") or 0),
+        "cached_tokens": int((_field(details, "cached_tokens") if details else 0) or 0),
+        "completion_tokens": int(_field(usage, "completion_tokens") or 0),
+    }
+
+
+class UsageTracker:
+    """설정 버전(챗봇 설정)별 OpenAI 토큰 사용량과 프롬프트 캐시 적중 집계"""
+
+    def __init__(self, max_versions: int = 32):
+        self.max_versions = max_versions
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, version: str, layout: str, usage: Dict[str, int], ttft: Optional[float]) -> None:
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        cached = usage.get("cached_tokens", 0)
+        metrics.OPENAI_PROMPT_TOKENS["cached"].inc(cached)
+        metrics.OPENAI_PROMPT_TOKENS["uncached"].inc(prompt_tokens - cached)
+        metrics.OPENAI_COMPLETION_TOKENS.inc(usage.get("completion_tokens", 0))
+
+        key = f"{version}:{layout}"
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_versions:
+                self._stats.pop(next(iter(self._stats)))
+            stats = self._stats[key] = {
+                "config_version": version, "layout": layout, "turns": 0, "prompt_tokens": 0,
+                "cached_tokens": 0, "completion_tokens": 0, "ttft_sum": 0.0, "ttft_count": 0,
+            }
+        stats["turns"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached
+        stats["completion_tokens"] += usage.get("completion_tokens", 0)
+        if ttft is not None:
+            stats["ttft_sum"] += ttft
+            stats["ttft_count"] += 1
+
+    def stats(self) -> List[Dict[str, Any]]:
+        result = []
+        for stats in self._stats.values():
+            entry = {k: v for k, v in stats.items() if k not in ("ttft_sum", "ttft_count")}
+            entry["uncached_tokens"] = stats["prompt_tokens"] - stats["cached_tokens"]
+            entry["cached_ratio"] = round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0
+            entry["avg_ttft_ms"] = round(stats["ttft_sum"] / stats["ttft_count"] * 1000, 1) if stats["ttft_count"] else None
+            result.append(entry)
+        return result
@@ -1,30 +1,79 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from openai import AsyncOpenAI
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from pydantic import BaseModel
-import os
+from starlette.websockets import WebSocketState
 import dotenv
 import asyncio
 import json
+import logging
+import time
 import httpx
+import openai
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any
 
+import metrics
+import settings
+from admission import AdmissionError, limiters
+from answer_cache import AnswerCache, config_version
+from answer_engine import ENGINE_OPENAI, UsageTracker, create_openai_client, resolve_engine, stream_openai_answer
+from app_logging import begin_turn, setup_logging, truncate
+from cache import StaleWhileRevalidate
+from download_links import DownloadLinkResolver
+from drain import CLOSE_SERVICE_RESTART, ConnectionDrainer
+from frames import ReferenceFrames, current_turn, encode_frame, pipelined
+from ingest import DocumentCollector, IngestError, is_ndjson, iter_ndjson_documents, parse_json_body, read_body
+from log_shipper import LogShipper
+from n8n_client import is_streaming_response, iter_stream_text, n8n
+from prompt_builder import PromptBuilder, format_reference
+from reference_store import SHARED_SESSION
+from resilience import CircuitOpenError, set_deadline
+from retrieval import SessionRetriever
+from sessions import CLOSE_TRY_AGAIN_LATER, PONG_FRAME, ClientSession, SessionRegistry, is_heartbeat
+from state import create_state_backend
+from static_assets import StaticAssets
+from streaming import coalesce
+
 # 환경 변수 로드
 dotenv.load_dotenv()
 
+# 진단 로그는 큐를 거쳐 백그라운드 스레드에서 출력
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # OpenAI 클라이언트 초기화
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = create_openai_client()
+
+# 종료 신호 시 /ws 연결 정리 (재연결 안내 후 진행 중인 턴 완료 대기)
+drainer = ConnectionDrainer()
+
+# /ws 세션 재개(토큰) + 연결 수 제한 (워커 단위)
+sessions = SessionRegistry()
+
+# 앱 수명주기: 공유 리소스 생성/정리
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await n8n.start()
+    if settings.CHATBOT_CONFIG_REFRESH_INTERVAL > 0:
+        chatbot_config.start(settings.CHATBOT_CONFIG_REFRESH_INTERVAL)
+    log_shipper.start()
+    drainer.install_signal_handlers()
+    try:
+        yield
+    finally:
+        # 신호 핸들러를 거치지 않은 종료라면 여기서라도 남은 연결에 재연결 안내
+        await drainer.drain()
+        await chatbot_config.stop()
+        # 남은 로그는 커넥션 풀을 닫기 전에 전송
+        await log_shipper.stop()
+        await n8n.aclose()
+        await state.close()
 
 # FastAPI 앱 생성
-app = FastAPI()
-
-# Templates 설정
-templates = Jinja2Templates(directory=str(Path(__file__).parent / "static"))
+app = FastAPI(lifespan=lifespan)
 
 # Pydantic 모델 정의
 class FileRequest(BaseModel):
@@ -41,27 +90,24 @@ def format_references(references):
     """
     if not references:
         return ""
-
-    formatted = []
-    for i, ref in enumerate(references, 1):
-        title = ref.get('title', f'문서 {i}')
-        content = ref.get('content', '내용 없음')
-        formatted.append(f"[문서{i}] {title}\n내용: {content}")
-    return '\n\n' + '\n\n'.join(formatted)
+    # 문서 하나의 형식은 프롬프트 조립과 같은 포맷터를 사용
+    return '\n\n' + '\n\n'.join(format_reference(i, ref) for i, ref in enumerate(references, 1))
 
 # 정적 파일 경로 설정
 static_path = Path(__file__).parent / "static"
 
-# 정적 파일 디렉토리 마운트
-app.mount("/static", StaticFiles(directory=static_path, html=True), name="static")
+# 정적 파일은 시작 시 한 번 읽어 사전 압축본과 함께 메모리에서 서빙 (해시 URL은 immutable 캐시)
+assets = StaticAssets(static_path)
+assets.load()
 
-# 루트 경로에 index.html 서빙
-@app.get("/", response_class=HTMLResponse)
+# 루트 경로에 index.html 서빙 (해시 URL로 바꾼 사본, ETag 재검증)
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
 async def read_root(request: Request):
-    index_path = static_path / "index.html"
-    if not index_path.exists():
-        raise HTTPException(status_code=404, detail="index.html not found")
-    return templates.TemplateResponse("index.html", {"request": request})
+    return assets.index_response(request)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def read_static(request: Request, path: str):
+    return assets.response(request, path)
 
 app.add_middleware(
     CORSMiddleware,
@@ -71,316 +117,721 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 전역 변수
-reference_data = []
-
-# 루트 경로
-@app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request):
-    index_path = static_path / "index.html"
-    if not index_path.exists():
-        raise HTTPException(status_code=404, detail="index.html not found")
-    return templates.TemplateResponse("index.html", {"request": request})
+# 워커 간 공유 상태 (세션(uuid)별 참조 문서 등)
+state = create_state_backend()
 
 # 채팅 데이터 수신
+# 세션별 참조 문서 검색 인덱스 (수집 시점에 증분 색인)
+retriever = SessionRetriever()
+
 @app.post("/chat")
-async def receive_prompt(request: Request):
-    global reference_data
-    data = await request.json()
-    
-    # Initialize variables
-    current_prompt = ""
-    documents = []
-    
-    # Handle the new document structure
-    if isinstance(data, list):
-        documents = [
-            {
-                "source": os.path.basename(doc.get("source", f"문서 {i+1}")),  # 파일명만 추출
-                "summary": doc.get("summary", "")
-            }
-            for i, doc in enumerate(data)
-            if isinstance(doc, dict) and ("source" in doc or "summary" in doc)
-        ]
-    
-    entry = {
-        "prompt": current_prompt,
-        "documents": documents
-    }
+async def receive_prompt(request: Request, uuid: str | None = None):
+    """
+    n8n 워크플로우가 보내는 참조 문서를 세션별로 저장한다.
     
-    reference_data.append(entry)
+    세션 uuid는 쿼리 파라미터(?uuid=), X-Session-Id 헤더, 본문 {"uuid": ..., "documents": [...]},
+    또는 각 문서의 "uuid" 필드 순서로 찾는다. 없으면 공용 세션에 저장한다
+    (공용 세션 문서는 REFERENCE_SHARED_FALLBACK이 켜져 있을 때만 답변에 쓰인다).
+    Content-Type이 application/x-ndjson이면 한 줄에 문서 하나씩 받아 도착하는 대로 저장한다.
+    """
+    collector = DocumentCollector(uuid or request.headers.get("x-session-id"))
+    stored = 0
+    try:
+        if is_ndjson(request.headers.get("content-type", "")):
+            async for documents in iter_ndjson_documents(request.stream(), collector):
+                # 첫 묶음에서 정한 세션을 업로드 끝까지 유지
+                collector.session_id = collector.session_id or SHARED_SESSION
+                stored = await state.add_references(collector.session_id, documents)
+                retriever.add(collector.session_id, documents)
+        else:
+            body = await read_body(request.stream(), request.headers.get("content-length"))
+            documents = parse_json_body(body, collector)
+            collector.session_id = collector.session_id or SHARED_SESSION
+            stored = await state.add_references(collector.session_id, documents)
+            retriever.add(collector.session_id, documents)
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
-    print(f"✅ 저장된 참조 데이터 ({len(reference_data)}/1):")
-    print(f"- 프롬프트: {current_prompt}")
-    print(f"- 참조 문서 수: {len(documents)}개")
-    for i, doc in enumerate(documents, 1):
-        print(f"  {i}. 출처: {doc.get('source', '없음')}")
-        print(f"     내용: {doc.get('summary', '없음')[:50]}..." if doc.get('summary') else "     내용: 없음")
+    session_id = collector.session_id or SHARED_SESSION
+    if session_id == SHARED_SESSION and not settings.REFERENCE_SHARED_FALLBACK:
+        logger.warning("⚠️ uuid 없는 참조 데이터는 REFERENCE_SHARED_FALLBACK이 꺼져 있어 답변에 사용되지 않습니다")
+    logger.info(
+        "✅ 참조 데이터 %d개 저장 (세션: %s, 보관 중 %d개, 중복 %d개, 제한 초과 %d개)",
+        collector.accepted, session_id, stored, collector.duplicates, collector.skipped
+    )
+
+    return {"status": f"{collector.accepted}개의 참조 데이터가 저장되었습니다.", "uuid": session_id, "stored": stored}
 
-    if len(reference_data) >= 1:
-        return {"status": "1개의 참조 데이터가 저장되었습니다."}
-    return {"status": f"참조 데이터 {len(reference_data)}/1 저장됨"}
+# 파일명별 다운로드 링크 캐시
+download_links = DownloadLinkResolver()
 
 # 다운로드 링크 엔드포인트
 @app.post("/download-link")
 async def get_download_link(data: FileRequest):
+    start = time.perf_counter()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://sunjea1149.app.n8n.cloud/webhook/search-pdf",
-                json={"filename": data.filename},
-                timeout=10
-            )
-            response.raise_for_status()
-            n8n_response = response.json()
-            download_url = n8n_response.get("download_url")
-            if not download_url:
-                raise HTTPException(status_code=400, detail="다운로드 링크 없음")
-            return {"download_url": download_url}
+        download_url = await download_links.resolve(data.filename, data.uuid)
+        if not download_url:
+            raise HTTPException(status_code=400, detail="다운로드 링크 없음")
+        return {"download_url": download_url}
+    except HTTPException:
+        raise
+    except AdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
     except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"n8n 요청 실패: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    finally:
+        metrics.DOWNLOAD_LINK.observe(time.perf_counter() - start)
+
+# 챗봇 프롬프트 기본값 (n8n에서 한 번도 받아오지 못했을 때 사용)
+DEFAULT_CHATBOT_PROMPT = {
+    "aiGreeting": "안녕하세요! 무엇을 도와드릴까요?",
+    "trainingData": "",
+    "instructionData": ""
+}
 
-async def fetch_chatbot_prompt() -> Dict[str, str]:
+async def load_chatbot_prompt() -> Dict[str, Any]:
     """
-    n8n 웹훅에서 챗봇 프롬프트 데이터를 가져오는 함수
+    n8n 웹훅에서 챗봇 프롬프트 데이터를 가져오는 함수 (캐시 로더)
     
     Returns:
-        Dict[str, str]: 추출된 챗봇 데이터 (ai_greeting, training_data, instruction_data)
+        Dict[str, Any]: 추출된 챗봇 데이터 (aiGreeting, trainingData, instructionData, gpt-model, temperature, max-tokens)
+    Raises:
+        Exception: n8n 요청 또는 응답 파싱 실패 시 (캐시가 이전 값을 유지하도록 그대로 전달)
     """
-    url = "https://sunjea1149.app.n8n.cloud/webhook/getchatbotprompt"
-    default_values = {
-        "aiGreeting": "안녕하세요! 무엇을 도와드릴까요?",
-        "trainingData": "",
-        "instructionData": ""
+    # 1. POST 요청 보내기 (멱등 조회: 재시도/헤지, 서킷이 열려 있으면 바로 실패해 이전 값/기본값 사용)
+    response = await n8n.fetch("prompt")
+    response.raise_for_status()
+    
+    # 2. JSON 응답 파싱
+    data = response.json()
+    
+    # 3. 응답이 리스트인 경우 첫 번째 항목 사용
+    item = data[0] if isinstance(data, list) and len(data) > 0 else data
+    if not isinstance(item, dict):
+        raise ValueError(f"예상하지 못한 응답 형식: {type(item).__name__}")
+    
+    # 4. 필요한 필드 추출 (camelCase 그대로 유지)
+    result = {
+        "aiGreeting": item.get("aiGreeting", DEFAULT_CHATBOT_PROMPT["aiGreeting"]),
+        "trainingData": item.get("trainingData", DEFAULT_CHATBOT_PROMPT["trainingData"]),
+        "instructionData": item.get("instructionData", DEFAULT_CHATBOT_PROMPT["instructionData"]),
+        "gpt-model": item.get("gpt-model", "gpt-4o-mini"),
+        "temperature": float(item.get("temperature", 0.7)),
+        "max-tokens": int(item.get("max-tokens", 2000)),
+        "answer-engine": item.get("answer-engine", "")
     }
+    result["config-version"] = config_version(result)
+    logger.info(
+        "✅ 챗봇 데이터 갱신 완료 - 모델: %s, trainingData %d자, instructionData %d자",
+        result['gpt-model'], len(result['trainingData']), len(result['instructionData'])
+    )
+    return result
+
+# 챗봇 프롬프트 캐시 (TTL 만료 시 이전 값을 반환하면서 백그라운드 갱신)
+chatbot_config = StaleWhileRevalidate(
+    load_chatbot_prompt,
+    ttl=settings.CHATBOT_CONFIG_TTL,
+    fallback=lambda: dict(DEFAULT_CHATBOT_PROMPT),
+    name="chatbot-config",
+)
+
+async def fetch_chatbot_prompt() -> Dict[str, Any]:
+    """
+    캐시된 챗봇 프롬프트 데이터를 반환하는 함수
     
+    Returns:
+        Dict[str, Any]: 챗봇 데이터. n8n 장애 시 마지막 정상 값, 그마저 없으면 기본값
+    """
+    return await chatbot_config.get()
+
+def verify_admin_token(token: str | None) -> None:
+    if not settings.ADMIN_TOKEN or token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="관리자 권한이 없습니다")
+
+# 답변 캐시 통계 조회 / 비우기
+@app.get("/admin/answer-cache")
+async def get_answer_cache_stats(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    return answer_cache.stats()
+
+@app.delete("/admin/answer-cache")
+async def clear_answer_cache(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    answer_cache.clear()
+    return {"status": "cleared"}
+
+# Prometheus 수집용 지표 (워커별)
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admin/admission")
+async def get_admission_stats(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+@app.get("/admin/sessions")
+async def get_session_stats(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    return sessions.stats()
+
+# n8n 엔드포인트별 서킷 상태와 최근 응답 시간 p95
+@app.get("/admin/upstreams")
+async def get_upstream_stats(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    return n8n.stats()
+
+# 설정 버전별 OpenAI 토큰 사용량과 프롬프트 캐시 적중률
+@app.get("/admin/prompt-cache")
+async def get_prompt_cache_stats(x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    return {"layout": "cache" if prompt_builder.cache_layout else "default", "versions": usage_tracker.stats()}
+
+# 챗봇 프롬프트 캐시 강제 무효화
+@app.post("/admin/chatbot-config/invalidate")
+async def invalidate_chatbot_config(wait: bool = False, x_admin_token: str | None = Header(default=None)):
+    verify_admin_token(x_admin_token)
+    if not wait:
+        chatbot_config.invalidate()
+        return {"status": "invalidated"}
     try:
-        async with httpx.AsyncClient() as client:
-            # 1. POST 요청 보내기
-            response = await client.post(url)
-            response.raise_for_status()
-            
-            # 2. JSON 응답 파싱
-            data = response.json()
-            print(f"📥 원본 응답 데이터: {data}")
-            
-            # 3. 응답이 리스트인 경우 첫 번째 항목 사용
-            item = data[0] if isinstance(data, list) and len(data) > 0 else data
-            
-            # 4. 필요한 필드 추출 (camelCase 그대로 유지)
-            result = {
-                "aiGreeting": item.get("aiGreeting", default_values["aiGreeting"]),
-                "trainingData": item.get("trainingData", default_values["trainingData"]),
-                "instructionData": item.get("instructionData", default_values["instructionData"]),
-                "gpt-model": item.get("gpt-model", "gpt-4o-mini"),
-                "temperature": float(item.get("temperature", 0.7)),
-                "max-tokens": int(item.get("max-tokens", 2000))
-            }
-            print(f"✅ 챗봇 데이터 추출 완료: {result}")
-            return result
-            
-        return default_values
-            
+        await chatbot_config.refresh()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"n8n 요청 실패, 이전 값 유지: {str(e)}")
+    return {"status": "refreshed"}
+
+# 토큰 예산 기반 프롬프트 구성기 (설정 버전별 고정 부분 캐시)
+prompt_builder = PromptBuilder()
+usage_tracker = UsageTracker()
+
+def to_client_references(documents: list) -> list:
+    """저장된 참조 문서를 클라이언트 전송 형식으로 변환하는 함수 (같은 출처는 처음 것만 사용)"""
+    references = []
+    seen = set()
+    for doc in documents:
+        source = doc.get('source', '출처 없음')
+        summary = doc.get('summary', '')
+        if source in seen:
+            continue
+        seen.add(source)
+        
+        # source를 title로 사용
+        references.append({
+            'title': source,
+            'content': summary,
+            'source': source
+        })
+    return references
+
+async def pop_session_references(user_uuid: str, query: str | None = None) -> list:
+    """
+    세션의 참조 문서를 꺼내 클라이언트 전송 형식으로 변환하는 함수
+    (꺼낸 문서는 저장소에서 제거되어 중복 처리 방지)
+    query를 주면 질문과 관련 있는 상위 문단만 남긴다.
+    """
+    documents = await state.pop_references(user_uuid)
+    if settings.REFERENCE_SHARED_FALLBACK and user_uuid != SHARED_SESSION:
+        documents += await state.pop_references(SHARED_SESSION)
+        retriever.discard(SHARED_SESSION)
+    if query:
+        documents = retriever.select(user_uuid, documents, query)
+    else:
+        retriever.discard(user_uuid)
+    return to_client_references(documents)
+
+async def peek_session_references(user_uuid: str) -> list:
+    """세션의 참조 문서를 꺼내지 않고 조회하는 함수 (답변 캐시 키 계산용)"""
+    documents = await state.get_references(user_uuid)
+    if settings.REFERENCE_SHARED_FALLBACK and user_uuid != SHARED_SESSION:
+        documents += await state.get_references(SHARED_SESSION)
+    return to_client_references(documents)
+
+async def send_frame(websocket: WebSocket, message: Any) -> None:
+    """WebSocket 프레임 전송 (전송 소요 시간을 지표로 남김)"""
+    start = time.perf_counter()
+    try:
+        await websocket.send_text(encode_frame(message))
+    finally:
+        metrics.WS_SEND.observe(time.perf_counter() - start)
+
+async def send_references(websocket: WebSocket, encoded: ReferenceFrames) -> None:
+    if not encoded:
+        return
+    try:
+        await send_frame(websocket, encoded.references_frame())
+        logger.debug("✅ %d개의 참조 문서 전송 완료", len(encoded))
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ 참조 문서 전송 중 오류: %s", e)
+
+async def send_turn_end(websocket: WebSocket, references: list) -> None:
+    """references 프레임과 signal done 프레임 전송 (참조 문서 목록은 한 번만 인코딩)"""
+    encoded = ReferenceFrames(references)
+    await send_references(websocket, encoded)
+    await send_frame(websocket, encoded.done_frame())
+
+async def send_queued(websocket: WebSocket, upstream: str, position: int) -> None:
+    """업스트림 대기열 순번을 클라이언트에 알린다."""
+    await send_frame(websocket, {
+        "type": "queued",
+        "upstream": upstream,
+        "position": position
+    })
+
+async def relay_n8n_stream(websocket: WebSocket, response: httpx.Response, user_uuid: str, chat_input: str) -> tuple:
+    """
+    n8n 스트리밍 응답(청크/NDJSON/SSE)을 도착하는 대로 프레임 단위로 병합해 전달한다.
+    Returns:
+        tuple: (전체 답변, 참조 문서 목록)
+    """
+    full_response = []
+    async for frame in coalesce(iter_stream_text(response)):
+        full_response.append(frame)
+        await send_frame(websocket, {
+            "type": "text",
+            "content": frame
+        })
+    full_response = "".join(full_response)
+    logger.info("📡 n8n 스트리밍 응답 완료: %d자", len(full_response))
+
+    references = await pop_session_references(user_uuid, chat_input)
+    await send_turn_end(websocket, references)
+    return full_response, references
+
+async def answer_with_n8n(websocket: WebSocket, chat_input: str, user_uuid: str) -> tuple | None:
+    """
+    n8n 워크플로우(/webhook/1149)의 응답을 전달한다.
+    
+    N8N_STREAM_RESPONSE가 켜져 있고 워크플로우가 스트리밍으로 응답하면 도착하는 대로 전달하고,
+    단일 JSON 본문으로 응답하면 기존처럼 'response' 값을 한 번에 전달한다.
+    Returns:
+        tuple | None: (전체 답변, 참조 문서 목록), 답변을 보내지 못했으면 None
+    """
+    payload = {"chatInput": chat_input, "uuid": user_uuid}
+    async with limiters["chat"].slot(user_uuid, lambda position: send_queued(websocket, "chat", position)):
+        # 대기열 대기 시간을 빼고 n8n 왕복(스트리밍이면 전달 완료까지)만 측정
+        start = time.perf_counter()
+        try:
+            if settings.N8N_STREAM_RESPONSE:
+                async with n8n.stream("chat", json=payload) as response:
+                    response.raise_for_status()
+                    if is_streaming_response(response):
+                        return await relay_n8n_stream(websocket, response, user_uuid, chat_input)
+                    n8n_response = json.loads(await response.aread())
+            else:
+                response = await n8n.post("chat", json=payload)
+                response.raise_for_status()
+                n8n_response = response.json()
+        finally:
+            metrics.N8N_CHAT.observe(time.perf_counter() - start)
+    
+    # 응답 전송 (에러 처리 추가)
+    answer = n8n_response.get('response', '')
+    try:
+        await send_frame(websocket, answer)
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ 응답 전송 중 오류: %s", e)
+        return None
+
+    # 워크플로우 실행 중 /chat으로 저장된 이 세션의 참조 문서 중 질문과 관련 있는 문서 전송
+    references = await pop_session_references(user_uuid, chat_input)
+    await send_references(websocket, ReferenceFrames(references))
+    return (answer, references) if isinstance(answer, str) else None
+
+async def answer_with_openai(websocket: WebSocket, chatbot_data: Dict[str, Any], chat_input: str, user_uuid: str) -> tuple | None:
+    """
+    OpenAI(호환) 모델 토큰을 프레임 단위로 병합해 스트리밍한다.
+    Returns:
+        tuple | None: 답변 캐시에 저장할 (전체 답변, 참조 문서 목록), 빈 응답이면 None
+    """
+    full_response = []
+    frame_count = 0
+    ttft = None
+    async with limiters["openai"].slot(user_uuid, lambda position: send_queued(websocket, "openai", position)):
+        # 대기열을 통과한 뒤에 참조 문서를 꺼냄 (대기열에서 거절되면 문서는 세션에 그대로 남음)
+        references = await pop_session_references(user_uuid, chat_input)
+        prompt = prompt_builder.build(chatbot_data, chat_input, references)
+        # 예산에 맞지 않아 빠진 문서는 답변 근거가 아니므로 클라이언트에도 보내지 않음
+        references = prompt.references
+
+        # Get GPT model settings from chatbot data
+        gpt_model = chatbot_data.get("gpt-model", "gpt-4o-mini")
+        temperature = float(chatbot_data.get("temperature", 0.7))
+        max_tokens = int(chatbot_data.get("max-tokens", 2000))
+
+        # 로깅: 모델 설정 및 섹션별 프롬프트 토큰
+        logger.debug("챗봇 모델 설정 - 모델: %s, temperature: %s, max tokens: %d", gpt_model, temperature, max_tokens)
+        logger.info("🧮 프롬프트 토큰: %s", prompt.report)
+
+        usage: Dict[str, int] = {}
+        tokens = stream_openai_answer(
+            client,
+            model=gpt_model,
+            messages=prompt.messages(),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            usage=usage,
+        )
+
+        inflight = metrics.UPSTREAM_INFLIGHT["openai"]
+        inflight.inc()
+        start = time.perf_counter()
+        try:
+            async for frame in coalesce(tokens):
+                if not frame_count:
+                    ttft = time.perf_counter() - start
+                    metrics.OPENAI_TTFT.observe(ttft)
+                full_response.append(frame)
+                frame_count += 1
+                await send_frame(websocket, {
+                    "type": "text",
+                    "content": frame
+                })
+        except openai.APITimeoutError:
+            metrics.TIMEOUTS["openai"].inc()
+            raise
+        except openai.OpenAIError:
+            metrics.ERRORS["openai"].inc()
+            raise
+        finally:
+            inflight.dec()
+            metrics.OPENAI_STREAM.observe(time.perf_counter() - start)
+    full_response = "".join(full_response)
+    logger.info("🧠 GPT 응답 완료: %d자, %d개 프레임", len(full_response), frame_count)
+    if usage:
+        usage_tracker.record(prompt.report["version"], prompt.report["layout"], usage, ttft)
+        logger.info(
+            "🧮 OpenAI 사용량 - 입력 %d토큰 (캐시 %d), 출력 %d토큰",
+            usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"],
+        )
+
+    # 응답이 비어있는지 확인
+    if not full_response.strip():
+        logger.warning("⚠️ 빈 응답이 생성되었습니다.")
+        await send_frame(websocket, {
+            'type': 'error',
+            'message': '응답 생성 중 오류가 발생했습니다.'
+        })
+        return None
+
+    await send_turn_end(websocket, references)
+
+    # 로깅 (큐에 넣기만 하고 바로 반환)
+    log_to_n8n({
+        "uuid": user_uuid,
+        "type": "bot",
+        "message": full_response,
+        "references": format_references(references),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    return full_response, references
+
+# 반복 질문 답변 캐시
+answer_cache = AnswerCache()
+
+async def send_busy_error(websocket: WebSocket) -> None:
+    """업스트림 대기열 포화/대기 시간 초과 시 즉시 알린다 (개별 타임아웃까지 기다리지 않음)."""
+    try:
+        await send_frame(websocket, {
+            'type': 'error',
+            'code': 'busy',
+            'message': '요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.'
+        })
+    except WebSocketDisconnect:
+        raise
+    except Exception:
+        pass
+
+async def replay_cached_answer(websocket: WebSocket, answer: str, references: list) -> None:
+    """캐시된 답변을 스트리밍과 같은 프레임(text → references → signal done)으로 전송한다."""
+    await send_frame(websocket, {
+        "type": "text",
+        "content": answer
+    })
+    await send_turn_end(websocket, references)
+
+async def run_turn(session: ClientSession, data: Any, turn: int, pipeline: bool) -> None:
+    """
+    한 턴(질문 하나)을 처리한다. 세션이 소유한 작업으로 실행되며, 취소되면 진행 중인 업스트림 요청/스트림도 닫힌다.
+
+    이 작업에서 보내는 객체 프레임에는 모두 턴 id("turn")가 붙는다.
+    """
+    current_turn.set(turn)
+    pipelined.set(pipeline)
+    # 이 턴에서 나가는 업스트림 호출은 남은 시간만큼만 기다림
+    set_deadline(settings.TURN_DEADLINE)
+    try:
+        chat_input = data.get("chatInput", "")
+        user_uuid = data.get("uuid", "unknown-user")
+        session.uuid = session.uuid or user_uuid
+        # 이 턴의 로그에 uuid:턴 상관 ID를 붙이고 샘플링 여부를 정함
+        begin_turn(user_uuid, turn)
+        logger.info("🧾 유저 입력: %s", truncate(chat_input, 100))
+
+        # 매 턴마다 최신 설정 사용 (캐시에서 즉시 반환)
+        chatbot_data = await fetch_chatbot_prompt()
+        engine = resolve_engine(chatbot_data)
+
+        # 응답이 비어있는지 확인
+        if engine == ENGINE_OPENAI and not chat_input.strip():
+            logger.info("⚠️ 빈 입력이 감지되었습니다.")
+            await send_frame(session, {
+                'type': 'error',
+                'message': '유효한 입력이 필요합니다.'
+            })
+            return
+
+        # 답변 캐시 조회 (클라이언트가 noCache를 보내면 건너뜀)
+        # n8n 엔진은 참조 문서가 워크플로우 실행 중에 /chat으로 도착하므로 호출 전에는 키의 참조 문서 지문을 알 수 없어 캐시하지 않음
+        cache_key = None
+        if answer_cache.enabled and engine == ENGINE_OPENAI and chat_input.strip():
+            if data.get("noCache"):
+                answer_cache.bypassed += 1
+            else:
+                cache_key = answer_cache.key(chat_input, await peek_session_references(user_uuid), chatbot_data, engine)
+                cached = answer_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("⚡ 답변 캐시 적중")
+                    await pop_session_references(user_uuid)
+                    await replay_cached_answer(session, *cached)
+                    # 캐시 적중도 대화 기록에 남긴다 (cached로 구분)
+                    answer, references = cached
+                    log_to_n8n({
+                        "uuid": user_uuid,
+                        "type": "bot",
+                        "message": answer,
+                        "references": format_references(references),
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "cached": True
+                    })
+                    return
+
+        if engine == ENGINE_OPENAI:
+            try:
+                result = await answer_with_openai(session, chatbot_data, chat_input, user_uuid)
+                if cache_key and result:
+                    answer_cache.put(cache_key, *result)
+            except AdmissionError as e:
+                logger.warning("⚠️ %s", e)
+                await send_busy_error(session)
+            except Exception as e:
+                logger.error("❌ 스트리밍 응답 처리 중 오류: %s", e)
+                await send_frame(session, {
+                    'type': 'error',
+                    'message': '응답 생성 중 오류가 발생했습니다.'
+                })
+            return
+
+        try:
+            await answer_with_n8n(session, chat_input, user_uuid)
+        except AdmissionError as e:
+            logger.warning("⚠️ %s", e)
+            await send_busy_error(session)
+        except CircuitOpenError as e:
+            # n8n 장애 중: 타임아웃까지 기다리지 않고 바로 안내
+            logger.warning("⚠️ %s", e)
+            await send_frame(session, {
+                'type': 'error',
+                'code': 'unavailable',
+                'message': '답변 서버가 일시적으로 응답하지 않습니다. 잠시 후 다시 시도해주세요.',
+                'retryAfterMs': int(e.retry_after * 1000)
+            })
+        except httpx.HTTPError as e:
+            logger.error("❌ n8n API 요청 실패: %s", e)
+            await send_frame(session, {
+                'type': 'error',
+                'message': '서버와의 통신 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.'
+            })
+    except asyncio.CancelledError:
+        logger.info("🛑 턴 취소됨")
+        await send_frame(session, {"type": "signal", "signal": "cancelled"})
+        raise
     except Exception as e:
-        print(f"❌ 챗봇 프롬프트 가져오기 실패: {str(e)}")
-        return default_values
+        metrics.ERRORS["ws"].inc()
+        logger.exception("❌ 턴 처리 중 예상치 못한 오류: %s", e)
+        await send_frame(session, {
+            'type': 'error',
+            'message': '처리 중 오류가 발생했습니다.'
+        })
 
 # WebSocket 핸들러
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    global reference_data
-    
+    # 재연결 시 ?session=<토큰>이면 기존 세션에 다시 붙음 (uuid는 연결 수 제한용)
+    connect_uuid = websocket.query_params.get("uuid")
+    resume_token = websocket.query_params.get("session")
     # WebSocket 연결 수락
+    accepted_at = time.perf_counter()
     try:
         await websocket.accept()
-        print("🔌 WebSocket 연결됨")
+        logger.info("🔌 WebSocket 연결됨")
     except Exception as e:
-        print(f"❌ WebSocket 연결 수락 중 오류: {str(e)}")
+        metrics.ERRORS["ws"].inc()
+        logger.error("❌ WebSocket 연결 수락 중 오류: %s", e)
+        return
+
+    # 종료 정리 중이면 다른 워커/인스턴스로 다시 연결하도록 안내
+    if drainer.draining:
+        try:
+            await send_frame(websocket, drainer.reconnect_frame())
+            await websocket.close(code=CLOSE_SERVICE_RESTART, reason="server restart")
+        except Exception:
+            pass
+        return
+
+    # 워커 전체 연결 수 제한: 잠시 후 재연결하도록 1013으로 닫음
+    if sessions.at_capacity():
+        metrics.WS_SESSIONS["rejected"].inc()
+        logger.warning("⚠️ /ws 연결 수 제한(%d) 초과", sessions.max_connections)
+        try:
+            await send_busy_error(websocket)
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="too many connections")
+        except Exception:
+            pass
         return
     
+    metrics.ACTIVE_WEBSOCKETS.inc()
+    drainer.register(websocket)
+    session = None
+    stale = sessions.connect(websocket, connect_uuid)
     try:
-        # WebSocket 연결 시 챗봇 프롬프트 데이터 가져오기
-        chatbot_data = await fetch_chatbot_prompt()
-        
-        # fetch_chatbot_prompt에서 이미 camelCase로 통일되어 반환됨
-        ai_greeting = chatbot_data.get("aiGreeting", "안녕하세요! 무엇을 도와드릴까요?")
-        training_data = chatbot_data.get("trainingData", "")
-        instruction_data = chatbot_data.get("instructionData", "")
-        
-        print(f"📊 챗봇 데이터 로드 완료 - 인사말: {ai_greeting[:50]}...")
-        
-        # 연결 시 인사 메시지 전송 (에러 처리 추가)
-        greeting_message = {
-            "type": "greeting",
-            "message": ai_greeting,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        try:
-            await websocket.send_json(greeting_message)
-        except WebSocketDisconnect:
-            print("⚠️ 클라이언트가 연결을 종료했습니다 (인사 메시지 전송 전)")
-            return
-        except Exception as e:
-            print(f"⚠️ 인사 메시지 전송 중 오류: {str(e)}")
-            return
+        # uuid별 연결 수 제한: 같은 uuid의 가장 오래된 연결(대개 끊긴 탭)을 닫음
+        if stale is not None:
+            logger.info("⚠️ uuid별 연결 수 제한(%d) 초과: 가장 오래된 연결을 닫습니다", sessions.max_per_uuid)
+            try:
+                await stale.close(code=1000, reason="replaced by new connection")
+            except Exception:
+                pass
+
+        session = sessions.resume(resume_token, connect_uuid)
+        if session is not None:
+            # 재개: 설정 조회와 인사말 없이, 끊긴 동안 못 보낸 프레임(진행 중이던 답변 포함)부터 전달
+            previous = session.websocket
+            await send_frame(websocket, {"type": "resumed", "session": session.token})
+            replayed = await session.attach(websocket)
+            if previous is not None and previous is not websocket:
+                try:
+                    await previous.close(code=1000, reason="session resumed elsewhere")
+                except Exception:
+                    pass
+            metrics.WS_SESSIONS["resumed"].inc()
+            logger.info("🔁 세션 재개: 밀린 프레임 %d개 전달", replayed)
+        else:
+            session = sessions.create(connect_uuid)
+            metrics.WS_SESSIONS["new"].inc()
+
+            # WebSocket 연결 시 챗봇 프롬프트 데이터 가져오기
+            chatbot_data = await fetch_chatbot_prompt()
+            
+            # fetch_chatbot_prompt에서 이미 camelCase로 통일되어 반환됨
+            ai_greeting = chatbot_data.get("aiGreeting", "안녕하세요! 무엇을 도와드릴까요?")
+            
+            logger.debug("📊 챗봇 데이터 로드 완료 - 인사말: %s", truncate(ai_greeting, 50))
+            
+            # 연결 시 인사 메시지 전송 (재연결 시 사용할 세션 토큰 포함)
+            greeting_message = {
+                "type": "greeting",
+                "message": ai_greeting,
+                "session": session.token,
+                "timestamp": datetime.now().isoformat()
+            }
+            
+            try:
+                await send_frame(websocket, greeting_message)
+                await session.attach(websocket)
+                metrics.WS_GREETING.observe(time.perf_counter() - accepted_at)
+            except WebSocketDisconnect:
+                logger.info("⚠️ 클라이언트가 연결을 종료했습니다 (인사 메시지 전송 전)")
+                return
+            except Exception as e:
+                logger.warning("⚠️ 인사 메시지 전송 중 오류: %s", e)
+                return
+
+        # 파이프라인 모드(?pipeline=1): 앞선 답변이 끝나기 전에도 다음 질문을 받아 동시에 처리
+        pipeline = websocket.query_params.get("pipeline") in ("1", "true") and settings.WS_PIPELINE_MAX_TURNS > 1
 
         while True:
             try:
-                # 클라이언트로부터 메시지 수신 (타임아웃 추가)
-                raw_data = await asyncio.wait_for(websocket.receive_text(), timeout=300)  # 5분 타임아웃
-                print("📨 유저 메시지 수신:", raw_data[:100])  # 로그 길이 제한
+                # 클라이언트로부터 메시지 수신 (턴은 별도 작업으로 실행되므로 답변 중에도 계속 수신)
+                raw_data = await asyncio.wait_for(websocket.receive_text(), timeout=settings.WS_RECEIVE_TIMEOUT)
+                # 클라이언트 하트비트: 턴으로 세지 않고 바로 응답
+                if is_heartbeat(raw_data):
+                    await send_frame(websocket, PONG_FRAME)
+                    continue
+                logger.debug("📨 유저 메시지 수신: %s", truncate(raw_data, 100))
 
                 try:
                     data = json.loads(raw_data)
-                    chat_input = data.get("chatInput", "")
-                    user_uuid = data.get("uuid", "unknown-user")
-                    print(f"🧾 유저 입력: {chat_input[:100]}... (uuid: {user_uuid})")
-
-                    async with httpx.AsyncClient() as http_client:
-                        try:
-                            response = await http_client.post(
-                                "https://sunjea1149.app.n8n.cloud/webhook/1149",
-                                json={"chatInput": chat_input},
-                                timeout=60
-                            )
-                            response.raise_for_status()
-                            n8n_response = response.json()
-                            
-                            # 응답 전송 (에러 처리 추가)
-                            try:
-                                await websocket.send_json(n8n_response.get('response', ''))
-                            except WebSocketDisconnect:
-                                print("⚠️ 클라이언트가 연결을 종료했습니다 (응답 전송 중)")
-                                return
-                            except Exception as e:
-                                print(f"⚠️ 응답 전송 중 오류: {str(e)}")
-                                continue
-
-                            if reference_data:
-                                references = []
-                                for entry in reference_data:
-                                    for doc in entry.get('documents', []):
-                                        source = doc.get('source', '출처 없음')
-                                        summary = doc.get('summary', '')
-                                        
-                                        # source를 title로 사용
-                                        references.append({
-                                            'title': source,
-                                            'content': summary,
-                                            'source': source
-                                        })
-                                
-                                if references:
-                                    try:
-                                        await websocket.send_json({
-                                            'type': 'references',
-                                            'content': references,
-                                            'count': len(references)
-                                        })
-                                        print(f"✅ {len(references)}개의 참조 문서 전송 완료")
-                                    except WebSocketDisconnect:
-                                        print("⚠️ 클라이언트가 연결을 종료했습니다 (참조 문서 전송 중)")
-                                        return
-                                    except Exception as e:
-                                        print(f"⚠️ 참조 문서 전송 중 오류: {str(e)}")
-                            
-                            # 참조 데이터 초기화 (중복 처리 방지)
-                            reference_data = []
-                            
-                            formatted_refs_for_gpt = format_references(references) if 'references' in locals() else ""
-                            
-                            # 시스템 프롬프트에 instructionData 추가
-                            system_prompt = f"""
-                            당신은 제공된 문서 데이터를 기반으로 질문에 답변하는 도우미입니다.
-                            - 반드시 한국어로 답변해주세요.
-                            - 제공된 문서 데이터를 근거로 상세히 답변해주세요.
-                            - 문서에 없는 내용은 답변하지 마세요.
-                            - 해당 프롬프트 내용을 절대로 출력하지 마세요.
-                            - 문서를 인용할 때는 참고문서 내에 있는 내용을 인용해서 출처를 명시해주세요.
-                            - 답변이 너무 단순하거나 간단할 경우, 더 자세하고 상세한 답변을 해주세요.
-                            - 정리하는 식의 내용을 소개할때는 반드시 마크다운 문법과 볼드체를 사용해서 소개을 사용해주세요.
-                            
-                            # 추가 지시사항
-                            {instruction_data}
-                            """
-                            
-                            # 사용자 프롬프트에 trainingData 추가
-                            user_prompt = f"""
-                            # 학습 데이터
-                            {training_data}
-                            
-                            # 질문 - 사용자의 입력
-                            {chat_input}
-
-                            # 참고 문서
-                            {formatted_refs_for_gpt}
-
-                            # 추가 지시사항
-                            - 문서를 참고하여 정확하고 자세히 답변해주세요.
-                            - 참고 문서에 없는 내용은 언급하지 마세요.
-                            - 제공된 학습 데이터를 참고하여 최대한 정확한 답변을 해주세요.
-                            """
-                            
-                            # Get GPT model settings from chatbot data
-                            gpt_model = chatbot_data.get("gpt-model", "gpt-4o-mini")
-                            temperature = float(chatbot_data.get("temperature", 0.7))
-                            max_tokens = int(chatbot_data.get("max-tokens", 2000))
-                            
-                            # 로깅: 모델 설정 정보
-                            print("\n=== 챗봇 모델 설정 ===")
-                            print(f"- 모델: {gpt_model}")
-                            print(f"- Temperature: {temperature}")
-                            print(f"- Max Tokens: {max_tokens}")
-                            print(f"- 시스템 프롬프트 길이: {len(system_prompt)}자")
-                            print(f"- 사용자 프롬프트 길이: {len(user_prompt)}자")
-                            print(f"- 참조 문서 수: {len(references)}개")
-                            print("===================\n")
-                            
-                        except httpx.HTTPError as e:
-                            error_msg = f"n8n API 요청 실패: {str(e)}"
-                            print(f"❌ {error_msg}")
-                            try:
-                                await websocket.send_json({
-                                    'type': 'error',
-                                    'message': '서버와의 통신 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.'
-                                })
-                            except:
-                                pass
-                            continue
-                            
-                except json.JSONDecodeError as e:
-                    error_msg = f"잘못된 JSON 형식: {str(e)}"
-                    print(f"❌ {error_msg}")
-                    print(f"수신된 데이터: {data}")
+                    if not isinstance(data, dict):
+                        raise ValueError(f"JSON 객체가 아님 ({type(data).__name__})")
+                except ValueError as e:
+                    logger.warning("❌ 잘못된 JSON 형식: %s (수신된 데이터: %s)", e, truncate(raw_data, 100))
                     try:
-                        await websocket.send_json({
+                        await send_frame(session, {
                             'type': 'error',
                             'message': '잘못된 요청 형식입니다.'
                         })
                     except:
                         pass
                     continue
+
+                # 턴 취소: {"type": "cancel"} (진행 중인 모든 턴) 또는 {"type": "cancel", "turn": id}
+                if data.get("type") == "cancel":
+                    cancelled = session.cancel(data.get("turn"))
+                    metrics.TURNS_CANCELLED["client"].inc(cancelled)
+                    logger.info("🛑 클라이언트 요청으로 턴 %d개 취소", cancelled)
+                    continue
+
+                # 연결당 진행 중 + 순서 대기 중인 턴 수 제한 (순차 모드에서도 대기열이 끝없이 쌓이지 않도록)
+                if len(session.turns) >= max(1, settings.WS_PIPELINE_MAX_TURNS):
+                    await send_busy_error(session)
+                    continue
+
+                session.turn += 1
+                drainer.begin_turn(websocket)
+                task = session.start_turn(
+                    session.turn,
+                    run_turn(session, data, session.turn, pipeline),
+                    sequential=not pipeline,
+                )
+                # 종료 정리 중이면 이 연결의 마지막 턴이 끝날 때 연결을 닫음 (재연결 안내는 이미 보냄)
+                task.add_done_callback(lambda _, ws=websocket: drainer.end_turn(ws))
                     
             except asyncio.TimeoutError:
-                print("⚠️ 클라이언트로부터 메시지 수신 대기 중 타임아웃")
+                metrics.TIMEOUTS["ws_receive"].inc()
+                logger.info("⚠️ 클라이언트로부터 메시지 수신 대기 중 타임아웃")
                 try:
                     await websocket.close(code=1000, reason="연결 시간 초과")
                 except:
                     pass
+                session.cancel_later(settings.WS_CANCEL_GRACE)
                 return
                 
-            except WebSocketDisconnect:
-                print("⚠️ 클라이언트가 연결을 종료했습니다")
+            except WebSocketDisconnect as e:
+                logger.info("⚠️ 클라이언트가 연결을 종료했습니다")
+                # 정상 종료(탭 닫기 등)면 바로, 아니면 재개를 기다렸다가 진행 중인 턴(업스트림 스트림 포함) 취소
+                if session.websocket is None or session.websocket is websocket:
+                    session.detach(websocket)
+                    session.cancel_later(0 if e.code == 1000 else settings.WS_CANCEL_GRACE)
                 return
                 
             except Exception as e:
-                error_msg = f"예상치 못한 오류: {str(e)}"
-                print(f"❌ {error_msg}")
+                # 다른 작업(세션 재개, uuid별 제한, 종료 정리)이 이 연결을 닫은 경우
+                if websocket.application_state == WebSocketState.DISCONNECTED:
+                    logger.info("🔌 다른 연결로 대체되어 종료합니다")
+                    return
+                metrics.ERRORS["ws"].inc()
+                logger.exception("❌ 예상치 못한 오류: %s", e)
                 try:
-                    await websocket.send_json({
+                    await send_frame(session, {
                         'type': 'error',
                         'message': '처리 중 오류가 발생했습니다.'
                     })
@@ -389,198 +840,44 @@ async def websocket_endpoint(websocket: WebSocket):
                 continue
                 
     except WebSocketDisconnect:
-        print("⚠️ 클라이언트 연결이 종료되었습니다")
+        logger.info("⚠️ 클라이언트 연결이 종료되었습니다")
     except Exception as e:
-        print(f"❌ WebSocket 핸들러 오류: {str(e)}")
+        metrics.ERRORS["ws"].inc()
+        logger.exception("❌ WebSocket 핸들러 오류: %s", e)
     finally:
+        metrics.ACTIVE_WEBSOCKETS.dec()
+        drainer.unregister(websocket)
+        # 세션은 WS_RESUME_TTL 동안 남겨 두어 재연결 시 이어 받을 수 있게 함
+        sessions.disconnect(websocket, connect_uuid, session)
         # 리소스 정리
         try:
             await websocket.close()
-            print("🔌 WebSocket 연결 종료됨")
+            logger.info("🔌 WebSocket 연결 종료됨")
         except:
             pass
 
-    try:
-        while True:
-            raw_data = await websocket.receive_text()
-            print("📨 유저 메시지 수신:", raw_data[:100])  # 로그 길이 제한
-
-            try:
-                data = json.loads(raw_data)
-                chat_input = data.get("chatInput", "")
-                user_uuid = data.get("uuid", "unknown-user")
-                print(f"🧾 유저 입력: {chat_input[:100]}... (uuid: {user_uuid})")
-
-                # GPT 모델 설정 출력
-                print(f"🤖 모델 설정 - 모델: {gpt_model}, 온도: {temperature}, 최대 토큰: {max_tokens}")
-
-                # GPT-5 계열 호환 처리 (대소문자 구분 없이 체크)
-                model_lower = gpt_model.lower()
-                if model_lower.startswith("gpt-5") or model_lower.startswith("gpt-5-mini"):
-                    # gpt-5는 max_completion_tokens 사용하고 temperature를 1.0으로 고정
-                    max_tokens_param = {"max_completion_tokens": max_tokens}
-                    temperature = 1.0  # GPT-5 계열은 temperature를 1.0으로 고정
-                else:
-                    # 기존 gpt-4 계열은 max_tokens 사용
-                    max_tokens_param = {"max_tokens": max_tokens}
-
-                # 프롬프트 구성
-                system_message = instruction_data.strip()
-                user_message = chat_input.strip()
-                
-                print(f"🔧 프롬프트 구성 - 시스템: {system_message[:100]}...")
-                print(f"🔧 사용자 입력: {user_message[:100]}...")
-
-                # API 호출
-                stream = await client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
-                    temperature=temperature,
-                    stream=True,
-                    **max_tokens_param
-                )
-                
-                full_response = ""
-                RESPONSE_TYPE_SIGNAL = "signal"
-                SIGNAL_DONE = "done"
-
-                # 응답이 비어있는지 확인
-                if not chat_input.strip():
-                    print("⚠️ 빈 입력이 감지되었습니다.")
-                    await websocket.send_json({
-                        'type': 'error',
-                        'message': '유효한 입력이 필요합니다.'
-                    })
-                    continue
-
-                try:
-                    async for chunk in stream:
-                        if chunk.choices and chunk.choices[0].delta.content:
-                            token = chunk.choices[0].delta.content
-                            full_response += token
-                            try:
-                                await websocket.send_json({
-                                    "type": "text",
-                                    "content": token
-                                })
-                                await asyncio.sleep(0)
-                            except WebSocketDisconnect:
-                                print("⚠️ 클라이언트가 연결을 종료했습니다 (응답 전송 중)")
-                                return
-                            except Exception as e:
-                                print(f"⚠️ 응답 전송 중 오류: {str(e)}")
-                                continue
-
-                    print("🧠 GPT 응답 전체 메시지:\n" + full_response)
-
-                    # 응답이 비어있는지 확인
-                    if not full_response.strip():
-                        print("⚠️ 빈 응답이 생성되었습니다.")
-                        await websocket.send_json({
-                            'type': 'error',
-                            'message': '응답 생성 중 오류가 발생했습니다.'
-                        })
-                        continue
-
-                    # 로깅 및 참조 데이터 처리
-                    if 'formatted_refs_for_gpt' in locals():
-                        try:
-                            await log_to_n8n({
-                                "uuid": user_uuid,
-                                "type": "bot",
-                                "message": full_response,
-                                "references": formatted_refs_for_gpt,
-                                "timestamp": datetime.utcnow().isoformat()
-                            })
-                        except Exception as e:
-                            print(f"❌ 로깅 중 오류: {str(e)}")
-
-                    # 참조 데이터가 있는 경우 전송
-                    if 'references' in locals() and references:
-                        print(f"📤 [WebSocket] 전송할 참조 데이터: {references}")
-                        try:
-                            await websocket.send_text(json.dumps({
-                                "type": RESPONSE_TYPE_SIGNAL,
-                                "signal": SIGNAL_DONE,
-                                "references": references
-                            }))
-                        except WebSocketDisconnect:
-                            print("⚠️ 클라이언트가 연결을 종료했습니다 (참조 데이터 전송 중)")
-                            return
-                        except Exception as e:
-                            print(f"⚠️ 참조 데이터 전송 중 오류: {str(e)}")
-
-                    # 참조 데이터 초기화
-                    reference_data = []
-
-                except Exception as e:
-                    print(f"❌ 스트리밍 응답 처리 중 오류: {str(e)}")
-                    try:
-                        await websocket.send_json({
-                            'type': 'error',
-                            'message': '응답 생성 중 오류가 발생했습니다.'
-                        })
-                    except:
-                        pass
-                    continue
-
-            except json.JSONDecodeError as e:
-                error_msg = f"잘못된 JSON 형식: {str(e)}"
-                print(f"❌ {error_msg}")
-                try:
-                    await websocket.send_json({
-                        'type': 'error',
-                        'message': '잘못된 요청 형식입니다.'
-                    })
-                except:
-                    pass
-                continue
-                
-            except Exception as e:
-                error_msg = f"요청 처리 중 오류: {str(e)}"
-                print(f"❌ {error_msg}")
-                try:
-                    await websocket.send_json({
-                        'type': 'error',
-                        'message': '요청 처리 중 오류가 발생했습니다.'
-                    })
-                except:
-                    pass
-                continue
+@app.get("/health")
+def health():
+    return {"status": "✅ FastAPI WebSocket GPT 서버 실행 중"}
 
-    except asyncio.TimeoutError:
-        print("⚠️ 클라이언트로부터 메시지 수신 대기 중 타임아웃")
-    except WebSocketDisconnect:
-        print("⚠️ 클라이언트 연결이 종료되었습니다")
-    except Exception as e:
-        print(f"❌ WebSocket 핸들러 오류: {str(e)}")
+async def send_log_batch(records: list):
+    """로그 레코드 묶음을 n8n 로깅 웹훅으로 전송 (LOG_BATCH_SIZE가 1이면 레코드 하나를 객체로 전송)"""
+    body = records[0] if settings.LOG_BATCH_SIZE <= 1 else records
+    start = time.perf_counter()
+    try:
+        response = await n8n.post("log", json=body)
+        response.raise_for_status()
     finally:
-        # 리소스 정리
-        try:
-            await websocket.close()
-            print("🔌 WebSocket 연결 종료됨")
-        except:
-            pass
-        
+        metrics.LOG_SHIP.observe(time.perf_counter() - start)
+    logger.debug("📝 로그 전송됨: %d건", len(records))
 
-@app.get("/")
-def root():
-    return {"status": "✅ FastAPI WebSocket GPT 서버 실행 중"}
+# 대화 로그 백그라운드 전송기
+log_shipper = LogShipper(send_log_batch)
 
-async def log_to_n8n(payload: dict):
-    try:
-        async with httpx.AsyncClient() as http_client:
-            await http_client.post(
-                "https://sunjea1149.app.n8n.cloud/webhook/d8b35487-e81b-45c6-95ce-248852c5e3a3",
-                json=payload,
-                timeout=10
-            )
-            print(f"📝 로그 전송됨: {payload['type']} | {payload['uuid']}")
-    except Exception as e:
-        print("❌ 로그 전송 실패:", e)
+def log_to_n8n(payload: dict) -> None:
+    """대화 로그를 전송 큐에 넣는다. 전송은 백그라운드에서 처리되므로 응답 지연이 없다."""
+    if not log_shipper.submit(payload):
+        logger.warning("⚠️ 로그 큐 포화로 로그 제외: %s | %s", payload.get('type'), payload.get('uuid'))
 
 if __name__ == "__main__":
     import uvicorn
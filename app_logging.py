@@ -0,0 +1,163 @@
+"""
+비동기 진단 로깅
+
+이벤트 루프에서는 로그 레코드를 큐에 넣기만 하고, 포맷팅과 stdout 쓰기는 백그라운드 스레드
+(QueueListener)가 맡는다. 컨테이너 로그 파이프가 밀려도 이벤트 루프가 멈추지 않는다.
+
+- 레벨: APP_LOG_LEVEL (DEBUG, INFO, WARNING, ...)
+- 턴 단위 샘플링: APP_LOG_SAMPLE_RATE 비율의 턴만 INFO 이하를 남기고, WARNING 이상은 항상 남긴다.
+- 길이 제한: 메시지는 APP_LOG_MAX_CHARS 자에서 자른다.
+- 상관 ID: begin_turn()으로 설정한 "uuid앞8자리:턴번호"가 같은 태스크의 모든 로그에 붙는다.
+- 큐가 가득 차면 기다리지 않고 버린다.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+import settings
+
+_correlation_id: contextvars.ContextVar = contextvars.ContextVar("correlation_id", default="-")
+_sampled: contextvars.ContextVar = contextvars.ContextVar("log_sampled", default=True)
+
+# 포맷팅을 미뤄도 되는 (변하지 않는) 인자 타입
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+# 요청마다 INFO 로그를 남기는 HTTP 클라이언트 라이브러리
+_NOISY_LOGGERS = ("httpx", "httpcore", "openai", "hpack")
+
+
+def truncate(value, limit: int = settings.APP_LOG_MAX_CHARS) -> str:
+    """로그에 넣을 값을 limit 자로 자른다."""
+    text = value if isinstance(value, str) else str(value)
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit}자)"
+
+
+def begin_turn(uuid: str, turn: int) -> str:
+    """
+    현재 태스크(와 여기서 만드는 하위 태스크)의 상관 ID와 샘플링 여부를 정한다.
+
+    Returns:
+        str: 상관 ID
+    """
+    correlation_id = f"{(uuid or '-')[:8]}:{turn}"
+    _correlation_id.set(correlation_id)
+    _sampled.set(settings.APP_LOG_SAMPLE_RATE >= 1.0 or random.random() < settings.APP_LOG_SAMPLE_RATE)
+    return correlation_id
+
+
+class _ContextFilter(logging.Filter):
+    """상관 ID를 붙이고, 샘플링되지 않은 턴의 WARNING 미만 로그를 버린다."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        record.cid = _correlation_id.get()
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 메시지 포맷팅은 출력 스레드로 미룬다. 나중에 바뀔 수 있는 인자나 예외 정보만 지금 문자열로 고정한다.
+        if record.args and not (isinstance(record.args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, max_chars: int = settings.APP_LOG_MAX_CHARS):
+        super().__init__("%(asctime)s %(levelname)s [%(cid)s] %(name)s: %(message)s")
+        self.max_chars = max_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message, self.max_chars)
+        return super().formatMessage(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_chars: int = settings.APP_LOG_MAX_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "cid": getattr(record, "cid", "-"),
+            "msg": truncate(record.getMessage(), self.max_chars),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[_NonBlockingQueueHandler] = None
+
+
+def setup_logging() -> None:
+    """루트 로거를 큐 핸들러 + 백그라운드 출력 스레드로 구성한다. 여러 번 호출해도 한 번만 적용된다."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    level = logging.getLevelName(settings.APP_LOG_LEVEL)
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.APP_LOG_FORMAT == "json" else TextFormatter())
+
+    _handler = _NonBlockingQueueHandler(queue.Queue(maxsize=settings.APP_LOG_QUEUE_SIZE))
+    _handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    if level > logging.DEBUG:
+        for name in _NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """큐에 남은 로그를 출력하고 출력 스레드를 멈춘다."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        if _handler.dropped:
+            print(f"⚠️ 로그 큐 포화로 진단 로그 {_handler.dropped}건 버림", file=sys.stderr)
+
+
+def dropped_count() -> int:
+    return _handler.dropped if _handler is not None else 0
@@ -0,0 +1,158 @@
+"""
+벤치마크용 가짜 업스트림 서버 (n8n 웹훅 + OpenAI Chat Completions 스트림)
+
+실제 n8n 클라우드/OpenAI 대신 로컬에서 띄워 지연 시간과 응답 크기를 조절한다.
+설정은 환경 변수로 받는다 (bench/run.py가 설정해서 실행한다).
+
+- BENCH_LATENCY_MS / BENCH_JITTER_MS: 웹훅 응답 지연(밀리초)과 무작위 편차
+- BENCH_N8N_MODE: /webhook/1149 응답 형식 (stream: NDJSON 스트림, json: 단일 JSON)
+- BENCH_RESPONSE_CHARS: /webhook/1149 답변 길이(자)
+- BENCH_TOKENS / BENCH_TOKEN_INTERVAL_MS: 스트림 토큰(청크) 수와 토큰 사이 간격
+- BENCH_PROMPT_CHARS: getchatbotprompt의 trainingData 길이(자)
+
+실행: python bench/fake_upstream.py --port 9100
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+LATENCY = float(os.getenv("BENCH_LATENCY_MS", "50")) / 1000
+JITTER = float(os.getenv("BENCH_JITTER_MS", "10")) / 1000
+N8N_MODE = os.getenv("BENCH_N8N_MODE", "stream")
+RESPONSE_CHARS = int(os.getenv("BENCH_RESPONSE_CHARS", "800"))
+TOKENS = int(os.getenv("BENCH_TOKENS", "100"))
+TOKEN_INTERVAL = float(os.getenv("BENCH_TOKEN_INTERVAL_MS", "5")) / 1000
+PROMPT_CHARS = int(os.getenv("BENCH_PROMPT_CHARS", "2000"))
+
+# 호출 횟수 (GET /calls)
+CALLS = {}
+
+
+async def _delay() -> None:
+    await asyncio.sleep(max(0.0, LATENCY + random.uniform(-JITTER, JITTER)))
+
+
+def _text(chars: int) -> str:
+    unit = "벤치마크 응답 문장입니다. "
+    return (unit * (chars // len(unit) + 1))[:chars]
+
+
+def _chunks(text: str, count: int):
+    size = max(1, len(text) // max(1, count))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def chat(body: dict):
+    answer = _text(RESPONSE_CHARS)
+    if N8N_MODE != "stream":
+        await _delay()
+        return JSONResponse({"response": answer})
+
+    async def generate():
+        await _delay()
+        for piece in _chunks(answer, TOKENS):
+            yield (json.dumps({"type": "item", "content": piece}, ensure_ascii=False) + "\n").encode()
+            await asyncio.sleep(TOKEN_INTERVAL)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def chatbot_prompt(body: dict):
+    await _delay()
+    return JSONResponse([{
+        "aiGreeting": "안녕하세요! 벤치마크 챗봇입니다.",
+        "trainingData": _text(PROMPT_CHARS),
+        "instructionData": "참조 문서를 근거로 답변하세요.",
+        "gpt-model": "gpt-4o-mini",
+        "temperature": 0.7,
+        "max-tokens": 1000,
+    }])
+
+
+async def search_pdf(body: dict):
+    await _delay()
+    return JSONResponse({"download_url": f"https://files.example.com/{body.get('filename', '')}?X-Amz-Expires=600"})
+
+
+async def log_sink(body):
+    await _delay()
+    return JSONResponse({"ok": True})
+
+
+HOOKS = {
+    "1149": chat,
+    "getchatbotprompt": chatbot_prompt,
+    "search-pdf": search_pdf,
+}
+
+
+async def webhook(request: Request):
+    hook = request.path_params["hook"]
+    CALLS[hook] = CALLS.get(hook, 0) + 1
+    # 앱은 getchatbotprompt를 빈 본문으로 호출한다
+    body = await request.json() if await request.body() else {}
+    # 등록되지 않은 웹훅은 로깅 웹훅으로 취급 (N8N_LOG_PATH가 배포마다 다름)
+    return await HOOKS.get(hook, log_sink)(body)
+
+
+async def chat_completions(request: Request):
+    CALLS["openai"] = CALLS.get("openai", 0) + 1
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+
+    def chunk(delta: dict, finish_reason=None, usage=None) -> bytes:
+        data = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            data["usage"] = usage
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+    async def generate():
+        await _delay()
+        pieces = _chunks(_text(RESPONSE_CHARS), TOKENS)
+        for piece in pieces:
+            yield chunk({"content": piece})
+            await asyncio.sleep(TOKEN_INTERVAL)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 2
+        yield chunk({}, "stop", {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        })
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+async def calls(request: Request):
+    return JSONResponse(CALLS)
+
+
+app = Starlette(routes=[
+    Route("/webhook/{hook:path}", webhook, methods=["POST"]),
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/calls", calls),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="벤치마크용 가짜 n8n/OpenAI 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
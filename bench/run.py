@@ -0,0 +1,357 @@
+"""
+부하 테스트 / 벤치마크 실행기
+
+가짜 업스트림(bench/fake_upstream.py)과 app:app을 각각 별도 프로세스로 띄운 뒤,
+N개의 /ws 클라이언트와 M개의 /chat 수집기를 동시에 돌려 다음을 측정한다.
+
+- 턴 처리량(turns/s), 턴 지연 p50/p95/p99, 첫 토큰(첫 text 프레임)까지 시간
+- /chat 수집 처리량과 지연
+- 연결당 RSS (연결 전/모든 연결이 열린 뒤 앱 프로세스 RSS 차이, Linux /proc 기준)
+
+결과를 기준선(bench/baselines/<이름>.json)으로 저장하고, 이후 실행을 기준선과 비교해
+허용 범위(--tolerance)를 넘게 나빠지면 종료 코드 1로 끝난다.
+
+사용 예:
+    python bench/run.py --clients 50 --turns 5 --ingesters 5
+    python bench/run.py --engine openai --save-baseline openai-50
+    python bench/run.py --engine openai --compare openai-50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+# 기준선 비교 대상: (결과 경로, 높을수록 좋은지)
+COMPARED_METRICS = (
+    ("throughput_turns_per_s", True),
+    ("turn_latency_ms.p50", False),
+    ("turn_latency_ms.p95", False),
+    ("turn_latency_ms.p99", False),
+    ("ttft_ms.p50", False),
+    ("ttft_ms.p95", False),
+    ("ingest.throughput_per_s", True),
+    ("ingest.latency_ms.p95", False),
+    ("rss_kb_per_connection", False),
+)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """nearest-rank 방식 p50/p95/p99 (밀리초, 소수 첫째 자리)"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 1)
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99)}
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    # 부하 중 stderr 파이프가 차서 프로세스가 멈추지 않도록 임시 파일로 받는다
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(args, cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=stderr)
+    process.stderr_file = stderr
+    return process
+
+
+def read_stderr(process: subprocess.Popen) -> str:
+    process.stderr_file.seek(0)
+    return process.stderr_file.read().decode(errors="replace")
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} 프로세스가 시작 중 종료됨:\n{read_stderr(process)}")
+            try:
+                await http.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} 준비 시간 초과")
+
+
+class Results:
+    def __init__(self):
+        self.turn_latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.turn_errors = 0
+        self.connect_errors = 0
+        self.ingest_latencies: List[float] = []
+        self.ingest_errors = 0
+
+
+def is_turn_end(message) -> bool:
+    if not isinstance(message, dict):
+        # n8n 단일 JSON 응답은 답변 문자열 프레임 하나로 끝난다
+        return True
+    return message.get("type") == "error" or message.get("signal") == "done"
+
+
+async def ws_client(index: int, args, url: str, results: Results, connected: asyncio.Queue, go: asyncio.Event) -> None:
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=30) as ws:
+            await asyncio.wait_for(ws.recv(), args.turn_timeout)  # greeting
+            connected.put_nowait(True)
+            await go.wait()
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                first_token = None
+                await ws.send(json.dumps({"uuid": f"bench-{index}", "chatInput": f"벤치마크 질문 {index}-{turn}", "noCache": True}))
+                try:
+                    while True:
+                        message = json.loads(await asyncio.wait_for(ws.recv(), args.turn_timeout))
+                        if first_token is None and (not isinstance(message, dict) or message.get("type") == "text"):
+                            first_token = time.perf_counter() - start
+                        if is_turn_end(message):
+                            break
+                except asyncio.TimeoutError:
+                    results.turn_errors += 1
+                    return
+                if isinstance(message, dict) and message.get("type") == "error":
+                    results.turn_errors += 1
+                    continue
+                results.turn_latencies.append(time.perf_counter() - start)
+                if first_token is not None:
+                    results.ttfts.append(first_token)
+                if args.think_time:
+                    await asyncio.sleep(args.think_time / 1000)
+    except (OSError, websockets.WebSocketException, asyncio.TimeoutError):
+        results.connect_errors += 1
+        connected.put_nowait(False)
+
+
+async def ingester(index: int, args, base_url: str, results: Results, go: asyncio.Event) -> None:
+    # /ws 클라이언트와 같은 uuid로 보내 참조 문서 저장 → 검색 → 프롬프트 예산 경로까지 턴에서 쓰이게 함
+    uuid = f"bench-{index % max(1, args.clients)}"
+    summary = (f"벤치마크 질문 {index} 참조 문서 요약 문장입니다. " * (args.doc_chars // 20 + 1))[:args.doc_chars]
+    documents = [{"source": f"/docs/bench-{index}-{i}.pdf", "summary": summary} for i in range(args.docs_per_request)]
+    body = json.dumps(documents, ensure_ascii=False).encode()
+    await go.wait()
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.turn_timeout) as http:
+        for _ in range(args.ingest_requests):
+            start = time.perf_counter()
+            try:
+                response = await http.post(f"/chat?uuid={uuid}", content=body, headers={"Content-Type": "application/json"})
+                response.raise_for_status()
+                results.ingest_latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                results.ingest_errors += 1
+
+
+async def run(args) -> dict:
+    fake_env = {
+        "BENCH_LATENCY_MS": str(args.latency_ms),
+        "BENCH_JITTER_MS": str(args.jitter_ms),
+        "BENCH_N8N_MODE": args.n8n_mode,
+        "BENCH_RESPONSE_CHARS": str(args.response_chars),
+        "BENCH_TOKENS": str(args.tokens),
+        "BENCH_TOKEN_INTERVAL_MS": str(args.token_interval_ms),
+        "BENCH_PROMPT_CHARS": str(args.prompt_chars),
+    }
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    app_env = {
+        "N8N_BASE_URL": fake_url,
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "ANSWER_ENGINE": args.engine,
+        "APP_LOG_LEVEL": "WARNING",
+        "STATE_BACKEND": "memory",
+        "LOG_SPILL_PATH": "/tmp/n8ngpt-bench-log-spill.jsonl",
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+    app_url = f"http://127.0.0.1:{args.app_port}"
+
+    fake = start_process([sys.executable, "bench/fake_upstream.py", "--port", str(args.fake_port)], fake_env)
+    app = start_process(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.app_port), "--log-level", "warning"],
+        app_env,
+    )
+    try:
+        await wait_ready(f"{fake_url}/calls", fake)
+        await wait_ready(f"{app_url}/metrics", app)
+
+        results = Results()
+        connected: asyncio.Queue = asyncio.Queue()
+        go = asyncio.Event()
+        rss_idle = rss_kb(app.pid)
+
+        clients = [
+            asyncio.create_task(ws_client(i, args, f"ws://127.0.0.1:{args.app_port}/ws", results, connected, go))
+            for i in range(args.clients)
+        ]
+        ingesters = [asyncio.create_task(ingester(i, args, app_url, results, go)) for i in range(args.ingesters)]
+
+        for _ in range(args.clients):
+            await connected.get()
+        rss_connected = rss_kb(app.pid)
+
+        start = time.perf_counter()
+        go.set()
+        await asyncio.gather(*clients, *ingesters)
+        elapsed = time.perf_counter() - start
+        rss_end = rss_kb(app.pid)
+    finally:
+        for process in (app, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    open_clients = args.clients - results.connect_errors
+    per_connection = None
+    if rss_idle is not None and rss_connected is not None and open_clients:
+        per_connection = round((rss_connected - rss_idle) / open_clients, 1)
+
+    return {
+        "scenario": {
+            key: getattr(args, key)
+            for key in ("engine", "n8n_mode", "clients", "turns", "ingesters", "ingest_requests", "docs_per_request",
+                        "doc_chars", "latency_ms", "jitter_ms", "response_chars", "tokens", "token_interval_ms",
+                        "prompt_chars", "think_time")
+        },
+        "duration_s": round(elapsed, 3),
+        "turns": len(results.turn_latencies),
+        "turn_errors": results.turn_errors,
+        "connect_errors": results.connect_errors,
+        "throughput_turns_per_s": round(len(results.turn_latencies) / elapsed, 2) if elapsed else None,
+        "turn_latency_ms": percentiles(results.turn_latencies),
+        "ttft_ms": percentiles(results.ttfts),
+        "ingest": {
+            "requests": len(results.ingest_latencies),
+            "errors": results.ingest_errors,
+            "throughput_per_s": round(len(results.ingest_latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": percentiles(results.ingest_latencies),
+        },
+        "rss_kb": {"idle": rss_idle, "connected": rss_connected, "end": rss_end},
+        "rss_kb_per_connection": per_connection,
+    }
+
+
+def lookup(result: dict, path: str):
+    value = result
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """기준선보다 tolerance 비율 이상 나빠진 지표 목록"""
+    regressions = []
+    if result["scenario"] != baseline.get("scenario"):
+        print("⚠️ 기준선과 시나리오 설정이 다릅니다. 비교 결과를 주의해서 보세요.")
+    for path, higher_is_better in COMPARED_METRICS:
+        current, previous = lookup(result, path), lookup(baseline, path)
+        if current is None or previous is None or previous == 0:
+            continue
+        change = (current - previous) / abs(previous)
+        worse = -change if higher_is_better else change
+        marker = "❌" if worse > tolerance else "✅"
+        print(f"{marker} {path}: {previous} → {current} ({change:+.1%})")
+        if worse > tolerance:
+            regressions.append(path)
+    return regressions
+
+
+def print_report(result: dict) -> None:
+    turns = result["turn_latency_ms"]
+    ttft = result["ttft_ms"]
+    ingest = result["ingest"]
+    print(f"\n=== 벤치마크 결과 ({result['scenario']['engine']}, 클라이언트 {result['scenario']['clients']}개) ===")
+    print(f"- 턴: {result['turns']}개 / {result['duration_s']}초, 처리량 {result['throughput_turns_per_s']} turns/s")
+    print(f"- 턴 지연(ms): p50 {turns['p50']} / p95 {turns['p95']} / p99 {turns['p99']}")
+    print(f"- 첫 토큰(ms): p50 {ttft['p50']} / p95 {ttft['p95']} / p99 {ttft['p99']}")
+    print(f"- /chat 수집: {ingest['requests']}건, {ingest['throughput_per_s']} req/s, "
+          f"p50 {ingest['latency_ms']['p50']} / p95 {ingest['latency_ms']['p95']} / p99 {ingest['latency_ms']['p99']} ms")
+    print(f"- RSS(KB): 대기 {result['rss_kb']['idle']}, 연결 후 {result['rss_kb']['connected']}, 종료 시 {result['rss_kb']['end']}, "
+          f"연결당 {result['rss_kb_per_connection']}")
+    print(f"- 오류: 턴 {result['turn_errors']}, 연결 {result['connect_errors']}, 수집 {ingest['errors']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="n8ngpt 부하 테스트 / 벤치마크")
+    parser.add_argument("--engine", choices=("n8n", "openai"), default="n8n", help="답변 엔진 (ANSWER_ENGINE)")
+    parser.add_argument("--n8n-mode", choices=("stream", "json"), default="stream", help="가짜 /webhook/1149 응답 형식")
+    parser.add_argument("--clients", type=int, default=20, help="동시 /ws 클라이언트 수")
+    parser.add_argument("--turns", type=int, default=5, help="클라이언트당 턴 수")
+    parser.add_argument("--think-time", type=float, default=0, help="턴 사이 대기(ms)")
+    parser.add_argument("--turn-timeout", type=float, default=60, help="턴 응답 대기 한도(초)")
+    parser.add_argument("--ingesters", type=int, default=2, help="동시 /chat 수집기 수")
+    parser.add_argument("--ingest-requests", type=int, default=20, help="수집기당 /chat 요청 수")
+    parser.add_argument("--docs-per-request", type=int, default=5, help="/chat 요청당 문서 수")
+    parser.add_argument("--doc-chars", type=int, default=1000, help="문서 요약 길이(자)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="가짜 업스트림 응답 지연(ms)")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="가짜 업스트림 지연 편차(ms)")
+    parser.add_argument("--response-chars", type=int, default=800, help="답변 길이(자)")
+    parser.add_argument("--tokens", type=int, default=100, help="스트림 청크 수")
+    parser.add_argument("--token-interval-ms", type=float, default=5, help="스트림 청크 간격(ms)")
+    parser.add_argument("--prompt-chars", type=int, default=2000, help="챗봇 설정 trainingData 길이(자)")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="앱 프로세스에 추가할 환경 변수")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--save-baseline", metavar="NAME", help="결과를 bench/baselines/NAME.json으로 저장")
+    parser.add_argument("--compare", metavar="NAME", help="bench/baselines/NAME.json과 비교")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="허용 악화 비율 (기본 15%%)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로도 출력")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"📝 기준선 저장: {path.relative_to(ROOT)}")
+
+    if args.compare:
+        path = BASELINE_DIR / f"{args.compare}.json"
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        print(f"\n=== 기준선 비교: {path.relative_to(ROOT)} (허용 {args.tolerance:.0%}) ===")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ 성능 저하: {', '.join(regressions)}")
+            return 1
+        print("✅ 기준선 대비 성능 저하 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
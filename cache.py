@@ -0,0 +1,216 @@
+"""
+프로세스 내 캐시 도구 모음
+
+- SingleFlight: 같은 키에 대한 동시 요청을 하나의 업스트림 호출로 합친다.
+- StaleWhileRevalidate: 단일 값을 TTL 동안 캐시하고, 만료되면 이전 값을 돌려주면서 백그라운드에서 갱신한다.
+- TTLCache: 항목별 TTL을 지원하는 LRU 캐시
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 캐시에 값이 없음을 나타내는 표식 (None도 캐시할 수 있도록 구분)
+MISSING = object()
+
+
+class SingleFlight:
+    """
+    같은 키로 동시에 들어온 호출은 첫 호출의 결과(또는 예외)를 함께 받는다.
+
+    업스트림 호출은 별도 태스크로 실행되므로, 기다리던 호출자 하나가 취소되어도
+    나머지 호출자의 작업은 계속 진행된다.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 기다리는 쪽이 모두 취소된 경우 "exception was never retrieved" 경고 방지
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        return await asyncio.shield(task)
+
+
+class StaleWhileRevalidate:
+    """
+    단일 값 캐시 (stale-while-revalidate)
+
+    - TTL 안에서는 캐시된 값을 즉시 반환한다.
+    - TTL이 지나면 마지막 정상 값을 즉시 반환하고 백그라운드에서 한 번만 갱신한다.
+    - 로더가 실패하면 마지막 정상 값을 계속 사용한다. 정상 값이 한 번도 없으면 fallback을 반환한다.
+    - 동시 캐시 미스는 SingleFlight로 하나의 로더 호출로 합친다.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        *,
+        fallback: Optional[Callable[[], Any]] = None,
+        retry_after: float = 5.0,
+        name: str = "cache",
+    ):
+        self._loader = loader
+        self.ttl = ttl
+        self._fallback = fallback
+        self.retry_after = retry_after
+        self._failed_at: Optional[float] = None
+        self.name = name
+        self._value: Any = None
+        self._has_value = False
+        self._loaded_at = 0.0
+        self._flight = SingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_tasks: set = set()
+
+    @property
+    def has_value(self) -> bool:
+        return self._has_value
+
+    @property
+    def age(self) -> Optional[float]:
+        if not self._has_value:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def is_fresh(self) -> bool:
+        return self._has_value and (time.monotonic() - self._loaded_at) < self.ttl
+
+    async def _load(self) -> Any:
+        try:
+            value = await self._loader()
+        except Exception:
+            self._failed_at = time.monotonic()
+            raise
+        self._failed_at = None
+        self._value = value
+        self._has_value = True
+        self._loaded_at = time.monotonic()
+        return value
+
+    async def refresh(self) -> Any:
+        """로더를 호출해 값을 갱신한다. 실패하면 예외를 그대로 올린다."""
+        return await self._flight.do(self.name, self._load)
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning("⚠️ [%s] 백그라운드 갱신 실패, 이전 값 유지: %s", self.name, e)
+
+    def _schedule_refresh(self) -> None:
+        if self._flight.inflight(self.name):
+            return
+        task = asyncio.create_task(self._refresh_quietly())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def get(self) -> Any:
+        if self._has_value:
+            if not self.is_fresh():
+                self._schedule_refresh()
+            return self._value
+
+        # 최근 로드에 실패했다면 retry_after 동안은 기다리지 않고 fallback 반환
+        if (
+            self._fallback is not None
+            and self._failed_at is not None
+            and time.monotonic() - self._failed_at < self.retry_after
+        ):
+            return self._fallback()
+
+        # 값이 한 번도 없는 경우에만 로더를 기다린다
+        try:
+            return await self.refresh()
+        except Exception as e:
+            logger.error("❌ [%s] 로드 실패, 기본값 사용: %s", self.name, e)
+            if self._fallback is None:
+                raise
+            return self._fallback()
+
+    def invalidate(self) -> None:
+        """캐시를 만료 처리하고 즉시 백그라운드 갱신을 시작한다 (마지막 정상 값은 유지)"""
+        self._loaded_at = 0.0
+        self._schedule_refresh()
+
+    async def _refresh_loop(self, interval: float) -> None:
+        while True:
+            await self._refresh_quietly()
+            await asyncio.sleep(interval)
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """TTL보다 먼저 주기적으로 값을 갱신하는 백그라운드 작업 시작"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(interval or self.ttl))
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._refresh_task, *self._background_tasks] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_task = None
+
+
+class TTLCache:
+    """
+    크기 제한(LRU)과 항목별 TTL을 가진 캐시
+
+    만료된 항목은 조회 시점에 제거한다. 값으로 None을 저장할 수 있으며(부정 캐시),
+    값이 없으면 MISSING을 반환한다.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = item
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
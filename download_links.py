@@ -0,0 +1,120 @@
+"""
+PDF 다운로드 링크 조회 캐시
+
+참조 목록에 나오는 같은 파일을 여러 사용자가 반복해서 누르므로 /webhook/search-pdf 결과를 파일명별로 캐시한다.
+
+- 같은 파일에 대한 동시 조회는 업스트림 호출 하나로 합친다 (singleflight).
+- 링크가 없다는 응답도 짧게 캐시한다 (부정 캐시).
+- 서명된 URL에 만료 시각이 들어 있으면 그보다 먼저 캐시에서 내려 만료된 링크를 주지 않는다.
+- 조회는 멱등이므로 실패/지연 시 재시도와 헤지 요청을 쓴다 (N8NClient.fetch). 캐시된 링크는 n8n 장애 중에도 그대로 준다.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import settings
+from admission import limiters
+from cache import MISSING, SingleFlight, TTLCache
+from n8n_client import n8n
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    """20240101T000000Z 또는 ISO 8601 형식 시각을 epoch 초로 변환"""
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def signed_url_expiry(url: str) -> Optional[float]:
+    """
+    서명된 URL의 만료 시각(epoch 초)을 추출한다.
+
+    지원 형식: S3/GCS V4 (X-Amz-Date + X-Amz-Expires, X-Goog-Date + X-Goog-Expires),
+    S3/GCS V2·CloudFront (Expires=epoch), Azure SAS (se=ISO 시각)
+    Returns:
+        Optional[float]: 만료 시각, 만료 정보가 없으면 None
+    """
+    try:
+        query = {k.lower(): v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    except ValueError:
+        return None
+
+    for prefix in ("x-amz-", "x-goog-"):
+        signed_at = query.get(prefix + "date")
+        expires_in = query.get(prefix + "expires")
+        if signed_at and expires_in:
+            start = _parse_timestamp(signed_at)
+            try:
+                return start + int(expires_in) if start is not None else None
+            except ValueError:
+                return None
+
+    expires = query.get("expires")
+    if expires and expires.isdigit():
+        return float(expires)
+
+    sas_expiry = query.get("se")
+    if sas_expiry:
+        return _parse_timestamp(sas_expiry)
+    return None
+
+
+class DownloadLinkResolver:
+    def __init__(
+        self,
+        *,
+        maxsize: int = settings.DOWNLOAD_LINK_CACHE_SIZE,
+        ttl: float = settings.DOWNLOAD_LINK_TTL,
+        negative_ttl: float = settings.DOWNLOAD_LINK_NEGATIVE_TTL,
+        expiry_margin: float = settings.DOWNLOAD_LINK_EXPIRY_MARGIN,
+    ):
+        self.cache = TTLCache(maxsize, ttl)
+        self.negative_ttl = negative_ttl
+        self.expiry_margin = expiry_margin
+        self._flight = SingleFlight()
+
+    def _ttl_for(self, url: str) -> float:
+        expires_at = signed_url_expiry(url)
+        if expires_at is None:
+            return self.cache.ttl
+        return min(self.cache.ttl, expires_at - time.time() - self.expiry_margin)
+
+    async def _fetch(self, filename: str, user_key: str) -> Optional[str]:
+        async with limiters["search-pdf"].slot(user_key):
+            response = await n8n.fetch("search-pdf", json={"filename": filename})
+        response.raise_for_status()
+        download_url = response.json().get("download_url")
+        if download_url:
+            self.cache.set(filename, download_url, self._ttl_for(download_url))
+        else:
+            self.cache.set(filename, None, self.negative_ttl)
+        return download_url or None
+
+    async def resolve(self, filename: str, user_key: Optional[str] = None) -> Optional[str]:
+        """
+        파일명의 다운로드 링크를 반환한다.
+
+        Args:
+            filename: 파일명
+            user_key: 업스트림 대기열에서 공평하게 순서를 나눌 사용자 키 (uuid, 없으면 파일명)
+
+        Returns:
+            Optional[str]: 다운로드 URL, 링크가 없으면 None
+        Raises:
+            httpx.HTTPError: n8n 요청 실패 (실패 결과는 캐시하지 않음), 서킷이 열려 있으면 CircuitOpenError
+            AdmissionError: search-pdf 대기열 포화 또는 대기 시간 초과
+        """
+        cached = self.cache.get(filename)
+        if cached is not MISSING:
+            return cached
+        return await self._flight.do(filename, lambda: self._fetch(filename, user_key or filename))
@@ -0,0 +1,151 @@
+"""
+종료 시 WebSocket 연결 정리 (graceful drain)
+
+uvicorn은 종료 신호를 받으면 곧바로 열린 WebSocket을 1012로 끊기 때문에 답변 중인 대화가 잘린다.
+앱 시작 시 SIGTERM/SIGINT 핸들러를 앞에 끼워 넣어, 신호를 받으면 uvicorn에 넘기기 전에 먼저 연결을 정리한다.
+
+1. 새 /ws 연결은 받지 않는다 (draining).
+2. 모든 연결에 재연결 안내 프레임({"type": "reconnect", "retryAfterMs": ...})을 보낸다.
+3. 대기 중(턴 사이)인 연결은 바로 1012로 닫고, 답변 중인 연결은 그 턴이 끝나면 닫는다.
+4. 진행 중인 턴이 모두 끝나거나 SHUTDOWN_DRAIN_TIMEOUT이 지나면 원래 핸들러(uvicorn 종료)를 호출한다.
+
+정리 중에 같은 신호를 한 번 더 받으면 기다리지 않고 바로 원래 핸들러를 호출한다.
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+import settings
+from frames import encode_frame
+
+logger = logging.getLogger(__name__)
+
+# 1012: Service Restart (클라이언트는 1000이 아니면 재연결을 시도한다)
+CLOSE_SERVICE_RESTART = 1012
+HANDLED_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class ConnectionDrainer:
+    """열린 WebSocket과 진행 중인 턴 추적 + 종료 시 정리"""
+
+    def __init__(
+        self,
+        *,
+        timeout: float = settings.SHUTDOWN_DRAIN_TIMEOUT,
+        retry_after_ms: int = settings.RECONNECT_RETRY_MS,
+    ):
+        self.timeout = timeout
+        self.retry_after_ms = retry_after_ms
+        self.draining = False
+        # 연결 -> 진행 중인 턴 수
+        self._connections: Dict[WebSocket, int] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._signalled = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> int:
+        return sum(1 for turns in self._connections.values() if turns)
+
+    def register(self, websocket: WebSocket) -> None:
+        self._connections[websocket] = 0
+
+    def unregister(self, websocket: WebSocket) -> None:
+        self._connections.pop(websocket, None)
+        self._update_idle()
+
+    def begin_turn(self, websocket: WebSocket) -> None:
+        if websocket in self._connections:
+            self._connections[websocket] += 1
+            self._idle.clear()
+
+    def end_turn(self, websocket: WebSocket) -> None:
+        """턴 종료를 기록한다. 종료 정리 중이고 이 연결에 남은 턴이 없으면 연결을 닫는다."""
+        if not self._connections.get(websocket):
+            return
+        self._connections[websocket] -= 1
+        self._update_idle()
+        if self.draining and not self._connections[websocket]:
+            logger.info("🚦 종료 정리: 턴 완료 후 연결을 닫습니다")
+            asyncio.get_running_loop().create_task(self._close(websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=CLOSE_SERVICE_RESTART, reason="server restart")
+        except Exception:
+            pass
+
+    def _update_idle(self) -> None:
+        if not any(self._connections.values()):
+            self._idle.set()
+
+    def reconnect_frame(self) -> Dict[str, object]:
+        return {"type": "reconnect", "reason": "shutdown", "retryAfterMs": self.retry_after_ms}
+
+    async def drain(self) -> None:
+        """재연결 안내를 보내고 진행 중인 턴이 끝날 때까지(최대 timeout초) 기다린다."""
+        if self.draining:
+            return
+        self.draining = True
+        if not self._connections:
+            return
+        start = time.perf_counter()
+        logger.info("🚦 종료 정리 시작: 연결 %d개 (답변 중 %d개)", len(self._connections), self.busy)
+
+        frame = encode_frame(self.reconnect_frame())
+        for websocket in list(self._connections):
+            try:
+                await asyncio.wait_for(websocket.send_text(frame), timeout=1.0)
+                # 안내를 보내는 동안 턴이 시작됐을 수 있으므로 다시 확인
+                if not self._connections.get(websocket, 1):
+                    await self._close(websocket)
+            except Exception:
+                pass
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.timeout)
+            logger.info("🚦 종료 정리 완료: %.1f초", time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ 종료 정리 시간 초과 (%.0f초): 답변 중인 연결 %d개를 끊습니다", self.timeout, self.busy)
+
+    def install_signal_handlers(self) -> None:
+        """현재 신호 핸들러(uvicorn) 앞에 정리 단계를 끼워 넣는다. 메인 스레드에서만 가능하다."""
+        if self.timeout <= 0 or threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in HANDLED_SIGNALS:
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                if self._signalled:
+                    # 정리 중 두 번째 신호: 바로 종료
+                    self._chain(previous, signum, frame)
+                    return
+                self._signalled = True
+                loop.call_soon_threadsafe(self._start, previous, signum, frame)
+
+            signal.signal(sig, handler)
+
+    def _start(self, previous, signum, frame) -> None:
+        async def run():
+            try:
+                await self.drain()
+            finally:
+                self._chain(previous, signum, frame)
+
+        self._task = asyncio.get_running_loop().create_task(run())
+
+    @staticmethod
+    def _chain(previous, signum, frame) -> None:
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signum, previous or signal.SIG_DFL)
+            signal.raise_signal(signum)
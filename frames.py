@@ -0,0 +1,74 @@
+"""
+WebSocket 프레임 인코딩
+
+모든 송신 프레임은 send_frame에서 여기 encode_frame()을 거쳐 텍스트 프레임으로 나간다.
+
+- JSON 인코딩은 orjson이 있으면 orjson을 사용한다 (없으면 표준 json, 출력은 같은 UTF-8 JSON).
+- 참조 문서 목록은 한 턴에 references 프레임과 signal done 프레임 두 곳에 실리므로
+  ReferenceFrames로 한 번만 인코딩하고 그 바이트를 이어 붙여 두 프레임을 만든다.
+- 인코딩 방식만 바꾸며 프레임 형식은 그대로다. 프레임 종류: greeting, text, references, signal(done/cancelled),
+  error, queued, reconnect(종료 정리, drain.py), resumed/pong(세션 재개·하트비트, sessions.py).
+  static/app.js가 이 프레임들을 모두 처리하므로 새 종류를 추가하면 함께 고친다.
+- 턴 작업 안에서 보내는 객체 프레임에는 턴 id("turn")가 붙는다 (current_turn 컨텍스트 변수).
+  파이프라인 모드에서는 여러 턴이 한 연결에서 동시에 진행되므로 문자열 답변도 text 프레임으로 감싼다.
+"""
+import json
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+
+    dumps_bytes: Callable[[Any], bytes] = orjson.dumps
+except ImportError:  # pragma: no cover - orjson 미설치 환경
+    def dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# 현재 턴 id / 파이프라인 모드 여부 (턴 작업마다 설정)
+current_turn: ContextVar[Optional[int]] = ContextVar("frame_turn", default=None)
+pipelined: ContextVar[bool] = ContextVar("frame_pipelined", default=False)
+
+
+class EncodedFrame(str):
+    """이미 JSON으로 인코딩된 프레임 (send_frame이 다시 인코딩하지 않음)"""
+
+
+def encode_frame(message: Any) -> str:
+    if isinstance(message, EncodedFrame):
+        return message
+    turn = current_turn.get()
+    if turn is not None:
+        if isinstance(message, str) and pipelined.get():
+            message = {"type": "text", "content": message}
+        if isinstance(message, dict):
+            message = {**message, "turn": turn}
+    return dumps_bytes(message).decode("utf-8")
+
+
+class ReferenceFrames:
+    """참조 문서 목록을 한 번 인코딩해 references / signal done 프레임에 재사용"""
+
+    __slots__ = ("references", "_payload", "_turn")
+
+    def __init__(self, references: List[Dict[str, Any]]):
+        self.references = references
+        self._payload = dumps_bytes(references)
+        turn = current_turn.get()
+        self._turn = b'"turn":%d,' % turn if turn is not None else b""
+
+    def __bool__(self) -> bool:
+        return bool(self.references)
+
+    def __len__(self) -> int:
+        return len(self.references)
+
+    def references_frame(self) -> EncodedFrame:
+        # {"type": "references", "content": [...], "count": n}
+        frame = b'{"type":"references",' + self._turn + b'"content":' + self._payload + b',"count":%d}' % len(self.references)
+        return EncodedFrame(frame.decode("utf-8"))
+
+    def done_frame(self) -> EncodedFrame:
+        # {"type": "signal", "signal": "done", "references": [...]}
+        frame = b'{"type":"signal","signal":"done",' + self._turn + b'"references":' + self._payload + b"}"
+        return EncodedFrame(frame.decode("utf-8"))
@@ -0,0 +1,180 @@
+"""
+/chat 참조 문서 수집
+
+n8n 검색 결과는 문서 수백 개짜리 본문이 될 수 있으므로 이벤트 루프를 오래 붙잡지 않도록 처리한다.
+
+- JSON 디코딩은 orjson이 있으면 orjson을 사용한다 (없으면 표준 json).
+- 본문 크기는 INGEST_MAX_BODY_BYTES로 제한하고, 넘으면 읽기를 중단한다 (413).
+- 문서 요약은 INGEST_MAX_SUMMARY_CHARS 자에서 자르고, 요청당 문서 수는 INGEST_MAX_DOCS로 제한한다.
+- 같은 출처(source)의 문서는 처음 것만 남긴다.
+- Content-Type이 application/x-ndjson이면 한 줄에 문서 하나씩 받으며, 도착한 만큼 바로 세션에 저장해
+  업로드가 끝나기 전에도 답변에 사용할 수 있다. application/json-seq(RFC 7464)는 줄 앞의 레코드 구분자(0x1E)를 떼고 읽는다.
+"""
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+import settings
+
+try:
+    import orjson
+
+    loads: Callable[[Any], Any] = orjson.loads
+    JSONDecodeError = (orjson.JSONDecodeError, UnicodeDecodeError)
+except ImportError:  # pragma: no cover - orjson 미설치 환경
+    loads = json.loads
+    JSONDecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+RECORD_SEPARATOR_AND_WHITESPACE = b"\x1e \t\r\n"
+
+
+class IngestError(Exception):
+    """수집 요청 오류 (status_code로 HTTP 상태 코드를 지정)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_ndjson(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES
+
+
+async def read_body(
+    chunks: AsyncIterator[bytes],
+    content_length: Optional[str],
+    max_bytes: int = settings.INGEST_MAX_BODY_BYTES,
+) -> bytes:
+    """본문을 max_bytes까지만 읽는다. Content-Length가 이미 크면 읽지 않고 거절한다."""
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise IngestError(413, f"본문이 너무 큽니다 (최대 {max_bytes}바이트)")
+    parts = []
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise IngestError(413, f"본문이 너무 큽니다 (최대 {max_bytes}바이트)")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+class DocumentCollector:
+    """문서 정규화 + 출처 기준 중복 제거 + 개수/요약 길이 제한"""
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        *,
+        max_docs: int = settings.INGEST_MAX_DOCS,
+        max_summary_chars: int = settings.INGEST_MAX_SUMMARY_CHARS,
+    ):
+        self.session_id = session_id
+        self.max_docs = max_docs
+        self.max_summary_chars = max_summary_chars
+        self.accepted = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self._seen: Set[str] = set()
+
+    def collect(self, items: Iterable[Any], offset: int = 0) -> List[Dict[str, str]]:
+        """
+        원본 문서 목록을 저장 형식으로 바꾼다.
+
+        Args:
+            items: n8n이 보낸 문서 목록 ({"source", "summary", "uuid"?})
+            offset: 출처가 없는 문서의 기본 이름 번호 (스트리밍 수집 시 이어지는 번호)
+        Returns:
+            List[Dict[str, str]]: {"source": 파일명, "summary": 요약} 목록
+        """
+        documents = []
+        for i, doc in enumerate(items, offset):
+            if not isinstance(doc, dict) or not ("source" in doc or "summary" in doc):
+                continue
+            if self.accepted >= self.max_docs:
+                self.skipped += 1
+                continue
+            self.session_id = self.session_id or doc.get("uuid")
+            # 파일명만 추출 (경로 구분자 기준)
+            source = str(doc.get("source") or f"문서 {i + 1}").rpartition("/")[2]
+            if source in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(source)
+            summary = doc.get("summary") or ""
+            if not isinstance(summary, str):
+                summary = str(summary)
+            if len(summary) > self.max_summary_chars:
+                summary = summary[:self.max_summary_chars]
+            documents.append({"source": source, "summary": summary})
+            self.accepted += 1
+        return documents
+
+
+def parse_json_body(body: bytes, collector: DocumentCollector) -> List[Dict[str, str]]:
+    """JSON 본문(문서 배열 또는 {"uuid", "documents"})에서 문서를 꺼낸다."""
+    try:
+        data = loads(body) if body else []
+    except JSONDecodeError as e:
+        raise IngestError(400, f"잘못된 JSON 형식: {e}")
+    items = data
+    if isinstance(data, dict):
+        collector.session_id = collector.session_id or data.get("uuid")
+        items = data.get("documents", [])
+    if not isinstance(items, list):
+        return []
+    return collector.collect(items)
+
+
+async def iter_ndjson_documents(
+    chunks: AsyncIterator[bytes],
+    collector: DocumentCollector,
+    max_bytes: int = settings.INGEST_MAX_BODY_BYTES,
+) -> AsyncIterator[List[Dict[str, str]]]:
+    """
+    NDJSON 본문을 받는 대로 줄 단위로 해석해, 네트워크 청크마다 새로 완성된 문서 묶음을 내보낸다.
+
+    {"uuid": ...}처럼 문서가 아닌 줄은 세션 지정으로만 사용한다.
+    """
+    # 마지막 줄바꿈 이후 아직 줄이 끝나지 않은 조각들 (긴 줄도 한 번만 이어 붙이도록 목록으로 모음)
+    pending: List[bytes] = []
+    size = 0
+    index = 0
+
+    def parse(lines: List[bytes]) -> List[Dict[str, str]]:
+        nonlocal index
+        items = []
+        for line in lines:
+            # json-seq 레코드 구분자(RS)와 공백 제거
+            line = line.strip(RECORD_SEPARATOR_AND_WHITESPACE)
+            if not line:
+                continue
+            try:
+                item = loads(line)
+            except JSONDecodeError as e:
+                raise IngestError(400, f"잘못된 NDJSON 줄: {e}")
+            if isinstance(item, dict) and not ("source" in item or "summary" in item):
+                collector.session_id = collector.session_id or item.get("uuid")
+                continue
+            items.append(item)
+        documents = collector.collect(items, index)
+        index += len(items)
+        return documents
+
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise IngestError(413, f"본문이 너무 큽니다 (최대 {max_bytes}바이트)")
+        if b"\n" not in chunk:
+            pending.append(chunk)
+            continue
+        head, _, tail = chunk.rpartition(b"\n")
+        pending.append(head)
+        complete = b"".join(pending)
+        pending = [tail] if tail else []
+        documents = parse(complete.split(b"\n"))
+        if documents:
+            yield documents
+
+    documents = parse([b"".join(pending)])
+    if documents:
+        yield documents
@@ -0,0 +1,315 @@
+"""
+대화 로그 백그라운드 전송
+
+log_to_n8n 호출은 큐에 넣기만 하고 즉시 반환한다. 백그라운드 워커가 레코드를 개수/대기 시간 기준으로
+묶어 한 번의 POST로 보낸다.
+
+- n8n 전송이 실패하거나 큐가 밀리면 배치를 디스크(JSONL)에 임시 저장하고, 전송이 회복되면 다시 보낸다.
+- 큐가 가득 차면 정책에 따라 버린다: drop_newest(새 레코드), drop_oldest(가장 오래된 레코드),
+  sample(큐가 절반 이상 차면 sample_rate 비율만 받고, 가득 차면 새 레코드를 버림)
+- 종료 시 남은 레코드를 전송하고, 시간 안에 못 보낸 레코드는 디스크에 남긴다.
+- 디스크 로그는 재전송 중 <경로>.sending 파일로 옮겨 두고, 전송이 끝난 뒤에 지운다.
+  재전송이 실패하거나 취소되면 보내지 못한 레코드를 디스크 로그로 되돌리고, 프로세스가 죽어 남은
+  .sending 파일은 다음 재전송 때 먼저 보낸다.
+- 디스크 로그 파일은 프로세스(워커)별로 따로 쓴다 (LOG_SPILL_PATH의 확장자 앞에 PID를 붙임).
+  이미 종료된 프로세스가 남긴 파일은 살아 있는 워커가 넘겨받아 재전송한다.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "sample")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_spill_path(base_path: str, pid: Optional[int] = None) -> str:
+    """LOG_SPILL_PATH에 PID를 붙인 이 프로세스 전용 경로 (/tmp/spill.jsonl -> /tmp/spill.<pid>.jsonl)"""
+    root, ext = os.path.splitext(base_path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def orphan_spill_files(base_path: str) -> List[str]:
+    """종료된 프로세스가 남긴 디스크 로그 파일 (PID를 붙이지 않던 이전 형식 파일 포함)"""
+    root, ext = os.path.splitext(base_path)
+    orphans = []
+    for path in glob.glob(f"{glob.escape(root)}.*{ext}") + glob.glob(f"{glob.escape(root)}.*{ext}.sending"):
+        pid = path[len(root) + 1:].split(".", 1)[0]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            orphans.append(path)
+    orphans.extend(path for path in (base_path, base_path + ".sending") if os.path.exists(path))
+    return orphans
+
+
+class LogShipper:
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        *,
+        max_queue: int = settings.LOG_QUEUE_SIZE,
+        batch_size: int = settings.LOG_BATCH_SIZE,
+        batch_age: float = settings.LOG_BATCH_AGE,
+        overflow_policy: str = settings.LOG_OVERFLOW_POLICY,
+        sample_rate: float = settings.LOG_SAMPLE_RATE,
+        spill_path: str = settings.LOG_SPILL_PATH,
+        spill_max_bytes: int = settings.LOG_SPILL_MAX_BYTES,
+        retry_interval: float = 5.0,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning("⚠️ 알 수 없는 LOG_OVERFLOW_POLICY '%s', drop_newest 사용", overflow_policy)
+            overflow_policy = "drop_newest"
+        self._send_batch = send_batch
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.batch_age = batch_age
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self.base_spill_path = spill_path
+        self.spill_path = process_spill_path(spill_path)
+        self.spill_max_bytes = spill_max_bytes
+        self.retry_interval = retry_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 워커가 큐에서 꺼내 모으는 중인 배치 (종료 시 유실 방지)
+        self._pending: List[Dict[str, Any]] = []
+        self._spill_lock = asyncio.Lock()
+        # _send_all이 배치마다 갱신하는 전송 완료 개수 (타임아웃/취소로 끊겨도 나머지만 디스크에 남기기 위함)
+        self._delivered = 0
+        self._next_spill_retry = 0.0
+        self._sending_path = self.spill_path + ".sending"
+        # 종료된 프로세스가 남긴 디스크 로그(재전송 중 끊긴 파일 포함)가 있으면 재전송 대상
+        self._has_spill = bool(orphan_spill_files(spill_path))
+        self.stats = {"submitted": 0, "sent": 0, "dropped": 0, "sampled_out": 0, "spilled": 0, "failed_batches": 0}
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        레코드를 전송 큐에 넣는다. 절대 기다리지 않는다.
+
+        Returns:
+            bool: 큐에 들어갔으면 True, 정책에 따라 버려졌으면 False
+        """
+        queue = self.queue
+        self.stats["submitted"] += 1
+
+        if self.overflow_policy == "sample" and queue.qsize() >= self.max_queue // 2:
+            if random.random() >= self.sample_rate:
+                self.stats["sampled_out"] += 1
+                return False
+
+        if queue.full():
+            if self.overflow_policy == "drop_oldest":
+                try:
+                    queue.get_nowait()
+                    self.stats["dropped"] += 1
+                except asyncio.QueueEmpty:
+                    pass
+            else:
+                self.stats["dropped"] += 1
+                return False
+
+        queue.put_nowait(record)
+        return True
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = settings.LOG_SHUTDOWN_TIMEOUT) -> None:
+        """워커를 멈추고 남은 레코드를 전송한다 (timeout 안에 못 보내면 디스크에 저장)."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        records = self._drain_nowait()
+        if not records:
+            return
+        try:
+            await asyncio.wait_for(self._send_all(records), timeout)
+            logger.info("📝 종료 전 로그 %d건 전송 완료", len(records))
+        except Exception as e:
+            logger.warning("⚠️ 종료 전 로그 전송 실패, 디스크에 저장: %s", e)
+            await self._spill(records[self._delivered:])
+
+    def _drain_nowait(self) -> List[Dict[str, Any]]:
+        records, self._pending = self._pending, []
+        if self._queue is None:
+            return records
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return records
+
+    async def _send_all(self, records: List[Dict[str, Any]]) -> None:
+        """
+        records를 batch_size 단위로 전송한다.
+
+        전송된 개수는 배치마다 self._delivered에 남기므로, 실패·취소·바깥 wait_for 타임아웃으로 끊겨도
+        호출 측은 records[self._delivered:]만 보존하면 된다.
+        """
+        self._delivered = 0
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            await self._send_batch(batch)
+            self._delivered += len(batch)
+            self.stats["sent"] += len(batch)
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        """첫 레코드를 기다린 뒤 batch_size개 또는 batch_age초가 될 때까지 모은다."""
+        queue = self.queue
+        loop = asyncio.get_running_loop()
+        batch = self._pending = [await queue.get()]
+        deadline = loop.time() + self.batch_age
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+
+            # 전송이 밀려 큐가 거의 찼으면 기다리지 않고 디스크로 넘겨 큐를 비운다
+            if self.queue.qsize() >= self.max_queue * 0.8:
+                await self._spill(batch)
+                self._pending = []
+                continue
+
+            try:
+                await self._send_batch(batch)
+                self.stats["sent"] += len(batch)
+            except asyncio.CancelledError:
+                # 종료 중 전송하던 배치는 stop()에서 남은 레코드와 함께 다시 보낸다
+                raise
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                logger.error("❌ 로그 전송 실패 (%d건), 디스크에 저장: %s", len(batch), e)
+                await self._spill(batch)
+                self._pending = []
+                continue
+            self._pending = []
+
+            # 전송이 정상이고 큐가 비어 있으면 디스크에 남은 로그 재전송
+            if self._has_spill and self.queue.empty() and time.monotonic() >= self._next_spill_retry:
+                await self._replay_spill()
+
+    async def _spill(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+
+        def write() -> bool:
+            try:
+                size = os.path.getsize(self.spill_path)
+            except OSError:
+                size = 0
+            if size + len(lines.encode("utf-8")) > self.spill_max_bytes:
+                return False
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            return True
+
+        async with self._spill_lock:
+            try:
+                written = await asyncio.to_thread(write)
+            except OSError as e:
+                logger.error("❌ 로그 디스크 저장 실패: %s", e)
+                written = False
+        if written:
+            self._has_spill = True
+            self.stats["spilled"] += len(records)
+        else:
+            self.stats["dropped"] += len(records)
+        self._next_spill_retry = time.monotonic() + self.retry_interval
+
+    async def _replay_spill(self) -> None:
+        pending = self._sending_path
+
+        def take() -> List[Dict[str, Any]]:
+            # 이전 재전송이 끝나지 못하고 남긴 .sending 파일이 있으면 그것부터 보낸다
+            if not os.path.exists(pending):
+                sources = [self.spill_path] if os.path.exists(self.spill_path) else orphan_spill_files(self.base_spill_path)
+                for source in sources:
+                    try:
+                        os.replace(source, pending)
+                        break
+                    except FileNotFoundError:
+                        # 다른 워커가 먼저 넘겨받음
+                        continue
+                else:
+                    return []
+            records = []
+            with open(pending, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+            self._has_spill = os.path.exists(self.spill_path) or bool(orphan_spill_files(self.base_spill_path))
+            return records
+
+        async with self._spill_lock:
+            try:
+                records = await asyncio.to_thread(take)
+            except OSError as e:
+                logger.error("❌ 디스크 로그 읽기 실패: %s", e)
+                return
+        if records:
+            logger.info("📝 디스크에 저장된 로그 %d건 재전송", len(records))
+        # 실패하거나 종료로 취소되면 보내지 못한 레코드를 디스크 로그로 되돌린 뒤 .sending 파일을 지운다
+        try:
+            await self._send_all(records)
+        except asyncio.CancelledError:
+            await self._finish_replay(records[self._delivered:])
+            raise
+        except Exception as e:
+            logger.warning("⚠️ 디스크 로그 재전송 실패: %s", e)
+            await self._finish_replay(records[self._delivered:])
+            return
+        await self._finish_replay([])
+
+    async def _finish_replay(self, unsent: List[Dict[str, Any]]) -> None:
+        await self._spill(unsent)
+        async with self._spill_lock:
+            try:
+                await asyncio.to_thread(os.remove, self._sending_path)
+            except OSError:
+                pass
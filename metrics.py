@@ -0,0 +1,209 @@
+"""
+채팅 파이프라인 단계별 지연 시간 지표 (Prometheus 텍스트 형식)
+
+모든 계열(series)은 모듈 로드 시 미리 만들어 두고, 측정 시에는 정수/실수 필드만 갱신한다.
+이벤트 루프 한 스레드에서만 갱신하므로 락이 필요 없고, 관측 한 번에 새 객체를 만들지 않는다.
+
+지표는 워커(프로세스)별로 집계된다.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# 초 단위 기본 버킷 (WebSocket 전송 ~ LLM 전체 응답까지 포괄)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_LE_INF = 'le="+Inf"'
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _series(name: str, labels: str, extra: str = "") -> str:
+    joined = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{joined}}}" if joined else name
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+    __slots__ = ("name", "help", "labels")
+
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = _format_labels(labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+    __slots__ = ("value",)
+
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None):
+        super().__init__(name, help, labels)
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{_series(self.name, self.labels)} {_number(self.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+    __slots__ = ()
+
+    def dec(self, amount: int = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 마지막 칸은 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        bucket = self.name + "_bucket"
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{_series(bucket, self.labels, le)} {cumulative}")
+        lines.append(f"{_series(bucket, self.labels, _LE_INF)} {self.count}")
+        lines.append(f"{_series(self.name + '_sum', self.labels)} {repr(self.sum)}")
+        lines.append(f"{_series(self.name + '_count', self.labels)} {self.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus 텍스트 노출 형식(0.0.4)으로 출력한다. 같은 이름의 계열은 HELP/TYPE을 한 번만 쓴다."""
+        families: Dict[str, List[_Metric]] = {}
+        for metric in self._metrics:
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, series in families.items():
+            lines.append(f"# HELP {name} {series[0].help}")
+            lines.append(f"# TYPE {name} {series[0].kind}")
+            for metric in series:
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, help: str, **labels: str) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, **labels: str) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels))
+
+
+def histogram(name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels: str) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+# 단계별 지연 시간
+_STAGE = "n8ngpt_stage_duration_seconds"
+_STAGE_HELP = "채팅 파이프라인 단계별 소요 시간"
+WS_GREETING = histogram(_STAGE, _STAGE_HELP, stage="ws_greeting")
+N8N_CHAT = histogram(_STAGE, _STAGE_HELP, stage="n8n_chat")
+OPENAI_TTFT = histogram(_STAGE, _STAGE_HELP, stage="openai_ttft")
+OPENAI_STREAM = histogram(_STAGE, _STAGE_HELP, stage="openai_stream")
+WS_SEND = histogram(_STAGE, _STAGE_HELP, stage="ws_send")
+DOWNLOAD_LINK = histogram(_STAGE, _STAGE_HELP, stage="download_link")
+LOG_SHIP = histogram(_STAGE, _STAGE_HELP, stage="log_to_n8n")
+
+ACTIVE_WEBSOCKETS = gauge("n8ngpt_active_websockets", "열려 있는 /ws 연결 수")
+# 취소된 턴 (client: cancel 프레임, disconnect: 연결 끊김)
+TURNS_CANCELLED: Dict[str, Counter] = {
+    reason: counter("n8ngpt_turns_cancelled_total", "취소된 턴 수", reason=reason) for reason in ("client", "disconnect")
+}
+# /ws 연결 결과 (new: 새 세션, resumed: 세션 재개, rejected: 연결 수 제한으로 거절)
+WS_SESSIONS: Dict[str, Counter] = {
+    result: counter("n8ngpt_ws_sessions_total", "/ws 연결 결과별 수", result=result) for result in ("new", "resumed", "rejected")
+}
+
+# 업스트림 이름: n8n 엔드포인트 + openai
+UPSTREAMS = ("chat", "search-pdf", "prompt", "log", "openai")
+UPSTREAM_INFLIGHT: Dict[str, Gauge] = {
+    name: gauge("n8ngpt_upstream_inflight", "진행 중인 업스트림 호출 수", upstream=name) for name in UPSTREAMS
+}
+# 업스트림 타임아웃 + WebSocket 수신 대기 타임아웃 + 대기열(admission) 타임아웃 + 턴 마감 시간 초과
+TIMEOUTS: Dict[str, Counter] = {
+    name: counter("n8ngpt_timeouts_total", "타임아웃 횟수", source=name) for name in UPSTREAMS + ("ws_receive", "admission", "deadline")
+}
+ERRORS: Dict[str, Counter] = {
+    name: counter("n8ngpt_errors_total", "오류 횟수", source=name) for name in UPSTREAMS + ("ws", "admission")
+}
+
+# OpenAI 입력 토큰 (공급자 프롬프트 캐시 적중 여부별) / 출력 토큰
+OPENAI_PROMPT_TOKENS: Dict[str, Counter] = {
+    kind: counter("n8ngpt_openai_prompt_tokens_total", "OpenAI 입력 토큰 수", cache=kind) for kind in ("cached", "uncached")
+}
+OPENAI_COMPLETION_TOKENS = counter("n8ngpt_openai_completion_tokens_total", "OpenAI 출력 토큰 수")
+
+# n8n 엔드포인트별 재시도 / 헤지 요청(보낸 수, 헤지 쪽이 먼저 응답한 수) / 서킷 상태(1이면 열림) / 서킷이 열려 거절한 호출
+N8N_ENDPOINTS = ("chat", "search-pdf", "prompt", "log")
+RETRIES: Dict[str, Counter] = {
+    name: counter("n8ngpt_upstream_retries_total", "업스트림 재시도 횟수", upstream=name) for name in N8N_ENDPOINTS
+}
+HEDGES: Dict[str, Counter] = {
+    name: counter("n8ngpt_upstream_hedges_total", "보낸 헤지 요청 수", upstream=name) for name in N8N_ENDPOINTS
+}
+HEDGE_WINS: Dict[str, Counter] = {
+    name: counter("n8ngpt_upstream_hedge_wins_total", "헤지 요청이 먼저 응답한 횟수", upstream=name) for name in N8N_ENDPOINTS
+}
+CIRCUIT_OPEN: Dict[str, Gauge] = {
+    name: gauge("n8ngpt_circuit_open", "서킷 브레이커 열림 여부", upstream=name) for name in N8N_ENDPOINTS
+}
+CIRCUIT_REJECTED: Dict[str, Counter] = {
+    name: counter("n8ngpt_circuit_rejected_total", "서킷이 열려 거절한 호출 수", upstream=name) for name in N8N_ENDPOINTS
+}
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,384 @@
+"""
+n8n 웹훅 호출용 공유 HTTP 클라이언트
+
+요청마다 httpx.AsyncClient를 새로 만들면 매번 TCP/TLS 핸드셰이크가 발생하므로,
+프로세스당 하나의 커넥션 풀을 FastAPI lifespan에서 열고 닫는다.
+
+모든 호출은 턴 마감 시간과 엔드포인트별 서킷 브레이커(resilience.py)를 거친다.
+멱등 조회(search-pdf, getchatbotprompt)는 fetch()로 호출해 재시도/헤지 요청을 적용한다.
+"""
+import asyncio
+import json as jsonlib
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+import metrics
+import settings
+from resilience import CircuitBreaker, LatencyWindow, budget
+
+logger = logging.getLogger(__name__)
+
+# 엔드포인트 이름 -> (경로, 응답 타임아웃)
+ENDPOINTS: Dict[str, tuple] = {
+    "chat": (settings.N8N_CHAT_PATH, settings.N8N_CHAT_TIMEOUT),
+    "search-pdf": (settings.N8N_SEARCH_PDF_PATH, settings.N8N_SEARCH_PDF_TIMEOUT),
+    "prompt": (settings.N8N_PROMPT_PATH, settings.N8N_PROMPT_TIMEOUT),
+    "log": (settings.N8N_LOG_PATH, settings.N8N_LOG_TIMEOUT),
+}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class N8NClient:
+    """
+    n8n 웹훅 전용 커넥션 풀
+
+    start()/aclose()는 lifespan에서 호출한다. lifespan 밖(스크립트, 테스트)에서
+    사용하면 첫 요청 시 풀이 지연 생성된다.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.N8N_BASE_URL,
+        *,
+        http2: bool = settings.N8N_HTTP2,
+        max_connections: int = settings.N8N_MAX_CONNECTIONS,
+        max_keepalive_connections: int = settings.N8N_MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.N8N_KEEPALIVE_EXPIRY,
+        connect_timeout: float = settings.N8N_CONNECT_TIMEOUT,
+        retry_attempts: int = settings.N8N_RETRY_ATTEMPTS,
+        retry_base_delay: float = settings.N8N_RETRY_BASE_DELAY,
+        retry_max_delay: float = settings.N8N_RETRY_MAX_DELAY,
+        hedge: bool = settings.N8N_HEDGE_ENABLED,
+    ):
+        self.base_url = base_url
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge = hedge
+        self.breakers = {name: CircuitBreaker(name) for name in ENDPOINTS}
+        self.latency = {name: LatencyWindow() for name in ENDPOINTS}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = self.http2
+        if http2 and not _http2_available():
+            logger.warning("⚠️ N8N_HTTP2 설정이 켜져 있지만 h2 패키지가 없어 HTTP/1.1로 연결합니다")
+            http2 = False
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            limits=self.limits,
+            timeout=httpx.Timeout(10.0, connect=self.connect_timeout),
+        )
+
+    async def start(self) -> None:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+            logger.info("🔗 n8n 커넥션 풀 생성: %s (max_connections=%s)", self.base_url, self.limits.max_connections)
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("🔗 n8n 커넥션 풀 종료")
+        self._client = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    def timeout_for(self, endpoint: str, timeout: Optional[float] = None) -> httpx.Timeout:
+        """
+        엔드포인트별 기본 타임아웃 (timeout을 주면 그 값을 우선 사용), 턴 마감까지 남은 시간을 넘지 않음
+        Raises:
+            DeadlineExceeded: 턴 마감 시간이 이미 지남
+        """
+        _, default_timeout = ENDPOINTS[endpoint]
+        limit = budget(timeout if timeout is not None else default_timeout, endpoint)
+        return httpx.Timeout(limit, connect=min(self.connect_timeout, limit))
+
+    def _record(self, endpoint: str, response: httpx.Response, elapsed: float) -> None:
+        breaker = self.breakers[endpoint]
+        if response.status_code >= 500:
+            breaker.record_failure()
+            return
+        breaker.record_success()
+        self.latency[endpoint].observe(elapsed)
+
+    async def post(
+        self,
+        endpoint: str,
+        *,
+        json: Any = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        등록된 n8n 엔드포인트로 POST 요청을 보낸다.
+
+        Args:
+            endpoint: ENDPOINTS에 등록된 이름 ("chat", "search-pdf", "prompt", "log")
+            json: 요청 본문
+            timeout: 엔드포인트 기본 타임아웃 대신 사용할 응답 타임아웃(초)
+        Returns:
+            httpx.Response: 응답 객체 (상태 코드 검사는 호출 측 책임)
+        Raises:
+            DeadlineExceeded: 턴 마감 시간이 지남 (호출하지 않음)
+            CircuitOpenError: 서킷이 열려 있음 (호출하지 않음)
+        """
+        path, _ = ENDPOINTS[endpoint]
+        request_timeout = self.timeout_for(endpoint, timeout)
+        breaker = self.breakers[endpoint]
+        probe = breaker.before_call()
+        inflight = metrics.UPSTREAM_INFLIGHT[endpoint]
+        inflight.inc()
+        start = time.perf_counter()
+        try:
+            response = await self.http.post(
+                path,
+                json=json,
+                timeout=request_timeout,
+                **kwargs,
+            )
+        except httpx.TimeoutException:
+            metrics.TIMEOUTS[endpoint].inc()
+            breaker.record_failure()
+            raise
+        except httpx.HTTPError:
+            metrics.ERRORS[endpoint].inc()
+            breaker.record_failure()
+            raise
+        finally:
+            inflight.dec()
+            breaker.release(probe)
+        self._record(endpoint, response, time.perf_counter() - start)
+        return response
+
+    async def fetch(self, endpoint: str, *, json: Any = None) -> httpx.Response:
+        """
+        멱등 조회용 POST: 연결 오류와 5xx 응답은 full jitter 백오프로 재시도하고,
+        헤지가 켜져 있으면 느린 요청에 같은 요청을 한 번 더 보내 먼저 온 정상 응답을 쓴다.
+
+        재시도 대기와 헤지를 포함한 전체 시간은 엔드포인트 타임아웃(턴 안이면 남은 시간까지)을 넘지 않는다.
+        타임아웃은 시간을 모두 쓴 것이므로 재시도하지 않는다.
+        Returns:
+            httpx.Response: 마지막 응답 (상태 코드 검사는 호출 측 책임)
+        Raises:
+            httpx.HTTPError: 모든 시도 실패, 서킷 열림(CircuitOpenError), 마감 초과(DeadlineExceeded)
+        """
+        _, default_timeout = ENDPOINTS[endpoint]
+        deadline = time.monotonic() + budget(default_timeout, endpoint)
+        response: Optional[httpx.Response] = None
+        error: Optional[httpx.HTTPError] = None
+        for attempt in range(self.retry_attempts):
+            if attempt:
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+                if time.monotonic() + delay >= deadline:
+                    break
+                metrics.RETRIES[endpoint].inc()
+                logger.info(
+                    "🔁 [%s] 재시도 %d/%d (%.2f초 후): %s",
+                    endpoint, attempt + 1, self.retry_attempts, delay,
+                    error if response is None else f"HTTP {response.status_code}",
+                )
+                await asyncio.sleep(delay)
+            try:
+                response = await self._hedged(endpoint, json, deadline - time.monotonic())
+            except httpx.TimeoutException:
+                raise
+            except httpx.TransportError as e:
+                response, error = None, e
+                continue
+            if response.status_code < 500:
+                return response
+        if response is not None:
+            return response
+        raise error
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """헤지 요청을 보낼 지연(최근 응답 시간 분위), 헤지를 하지 않으면 None"""
+        if not self.hedge:
+            return None
+        return self.latency[endpoint].quantile(settings.N8N_HEDGE_QUANTILE)
+
+    async def _hedged(self, endpoint: str, json: Any, timeout: float) -> httpx.Response:
+        delay = self.hedge_delay(endpoint)
+        if delay is None or delay >= timeout:
+            return await self.post(endpoint, json=json, timeout=timeout)
+
+        first = asyncio.ensure_future(self.post(endpoint, json=json, timeout=timeout))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            metrics.HEDGES[endpoint].inc()
+            second = asyncio.ensure_future(self.post(endpoint, json=json, timeout=timeout - delay))
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            metrics.HEDGE_WINS[endpoint].inc()
+                        return task.result()
+            # 둘 다 실패: 첫 요청의 결과(응답 또는 예외)를 따른다
+            return first.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for name, breaker in self.breakers.items():
+            window = self.latency[name]
+            p95 = window.quantile(0.95)
+            result[name] = {
+                "circuit": breaker.stats(),
+                "samples": len(window),
+                "p95": round(p95, 3) if p95 is not None else None,
+            }
+        return result
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        endpoint: str,
+        *,
+        json: Any = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ):
+        """
+        등록된 n8n 엔드포인트로 POST 요청을 보내고 응답 본문을 스트리밍으로 읽는다.
+
+        `async with n8n.stream(...) as response:` 형태로 사용한다. 타임아웃은 청크 사이 대기 시간에 적용된다.
+        """
+        path, _ = ENDPOINTS[endpoint]
+        request_timeout = self.timeout_for(endpoint, timeout)
+        breaker = self.breakers[endpoint]
+        probe = breaker.before_call()
+        inflight = metrics.UPSTREAM_INFLIGHT[endpoint]
+        inflight.inc()
+        try:
+            async with self.http.stream(
+                "POST",
+                path,
+                json=json,
+                timeout=request_timeout,
+                **kwargs,
+            ) as response:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                yield response
+        except httpx.TimeoutException:
+            metrics.TIMEOUTS[endpoint].inc()
+            breaker.record_failure()
+            raise
+        except httpx.HTTPError as e:
+            metrics.ERRORS[endpoint].inc()
+            # 상태 코드 오류(raise_for_status)는 응답 헤더를 받을 때 이미 반영함
+            if isinstance(e, httpx.TransportError):
+                breaker.record_failure()
+            raise
+        finally:
+            inflight.dec()
+            breaker.release(probe)
+
+
+# 스트리밍으로 취급하는 응답 Content-Type
+STREAMING_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq", "text/event-stream", "text/plain")
+
+
+def is_streaming_response(response: httpx.Response) -> bool:
+    """n8n 워크플로우가 청크/NDJSON/SSE로 응답하는지 여부 (단일 JSON 본문이면 False)"""
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in STREAMING_CONTENT_TYPES
+
+
+class N8NStreamError(httpx.HTTPError):
+    """
+    스트리밍 응답 중 워크플로우가 보낸 오류
+
+    다른 n8n 통신 오류와 같이 처리되도록 httpx.HTTPError를 상속한다 (전송 오류가 아니므로 서킷에는 반영하지 않음).
+    """
+
+
+def _text_from_event(event: Any) -> str:
+    """NDJSON/SSE 이벤트 하나에서 사용자에게 보낼 텍스트를 꺼낸다."""
+    if isinstance(event, str):
+        return event
+    if not isinstance(event, dict):
+        return ""
+    event_type = event.get("type")
+    if event_type == "error":
+        raise N8NStreamError(str(event.get("content") or event.get("message") or "n8n 스트리밍 오류"))
+    if event_type in ("begin", "end"):
+        return ""
+    for key in ("content", "text", "response", "output", "delta"):
+        value = event.get(key)
+        if isinstance(value, str):
+            return value
+    return ""
+
+
+async def iter_stream_text(response: httpx.Response) -> AsyncIterator[str]:
+    """
+    n8n 스트리밍 응답 본문을 텍스트 조각으로 변환한다.
+
+    - NDJSON: 줄마다 JSON 객체 ({"type": "item", "content": "..."} 등)
+    - SSE: "data: ..." 줄 (JSON 또는 텍스트, "[DONE]"은 무시)
+    - 그 밖의 청크 텍스트: 도착한 그대로 전달
+    """
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/plain":
+        async for chunk in response.aiter_text():
+            yield chunk
+        return
+
+    sse = content_type == "text/event-stream"
+    async for line in response.aiter_lines():
+        line = line.strip()
+        if not line:
+            continue
+        if sse:
+            if not line.startswith("data:"):
+                continue
+            line = line[5:].strip()
+            if line == "[DONE]":
+                continue
+        try:
+            event = jsonlib.loads(line)
+        except ValueError:
+            event = line
+        text = _text_from_event(event)
+        if text:
+            yield text
+
+
+# 프로세스 전역 n8n 클라이언트
+n8n = N8NClient()
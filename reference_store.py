@@ -0,0 +1,136 @@
+"""
+세션별 참조 문서 저장소
+
+/chat 으로 들어온 참조 문서를 세션 uuid별로 보관하고, /ws 핸들러가 자기 세션의 문서만 꺼내 간다.
+
+- 삽입/조회: dict 기반 O(1)
+- 세션당 문서 수 제한: 초과 시 오래된 문서부터 버림
+- TTL: 마지막 갱신 후 ttl초가 지난 세션은 제거
+- 전체 메모리 상한: 초과 시 가장 오래 갱신되지 않은 세션부터 제거 (LRU)
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+# uuid 없이 들어온 참조 문서를 담는 공용 세션 (uuid를 보내지 않는 기존 n8n 워크플로우 호환용)
+SHARED_SESSION = "_shared"
+
+
+def doc_size(doc: Dict[str, str]) -> int:
+    """문서 크기 근사치 (문자 수 기준)"""
+    return len(doc.get("source", "")) + len(doc.get("summary", "")) + 64
+
+
+class _Session:
+    __slots__ = ("documents", "size", "updated_at")
+
+    def __init__(self):
+        self.documents: List[Dict[str, str]] = []
+        self.size = 0
+        self.updated_at = time.monotonic()
+
+
+class ReferenceStore:
+    def __init__(
+        self,
+        *,
+        ttl: float = settings.REFERENCE_TTL,
+        max_docs_per_session: int = settings.REFERENCE_MAX_DOCS_PER_SESSION,
+        max_total_size: int = settings.REFERENCE_MAX_TOTAL_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_docs_per_session = max_docs_per_session
+        self.max_total_size = max_total_size
+        # 마지막 갱신 순서 = LRU 순서 (앞쪽이 가장 오래됨)
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._total_size = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def total_size(self) -> int:
+        return self._total_size
+
+    def _drop(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_size -= session.size
+        return session
+
+    def _evict(self, now: float) -> None:
+        # 1. TTL 만료 세션 제거 (앞쪽부터 만료되므로 만료되지 않은 세션을 만나면 중단)
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.updated_at < self.ttl:
+                break
+            self._drop(session_id)
+        # 2. 전체 크기 상한 초과 시 LRU 세션 제거
+        while self._total_size > self.max_total_size and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            self._drop(session_id)
+            logger.warning("⚠️ 참조 저장소 용량 초과로 세션 제거: %s", session_id)
+
+    def add(self, session_id: str, documents: List[Dict[str, str]]) -> int:
+        """
+        세션에 참조 문서를 추가한다.
+
+        Args:
+            session_id: 세션 uuid
+            documents: {'source': ..., 'summary': ...} 형태의 문서 목록
+        Returns:
+            int: 추가 후 해당 세션에 보관 중인 문서 수
+        """
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None or now - session.updated_at >= self.ttl:
+            self._drop(session_id)
+            session = _Session()
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+
+        for doc in documents:
+            size = doc_size(doc)
+            session.documents.append(doc)
+            session.size += size
+            self._total_size += size
+
+        # 세션당 문서 수 제한 (오래된 문서부터 버림)
+        overflow = len(session.documents) - self.max_docs_per_session
+        if overflow > 0:
+            removed = session.documents[:overflow]
+            del session.documents[:overflow]
+            removed_size = sum(doc_size(doc) for doc in removed)
+            session.size -= removed_size
+            self._total_size -= removed_size
+
+        session.updated_at = now
+        self._evict(now)
+        return len(session.documents)
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """세션의 문서 목록을 조회한다 (저장소에서 제거하지 않음)"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return []
+        if time.monotonic() - session.updated_at >= self.ttl:
+            self._drop(session_id)
+            return []
+        return list(session.documents)
+
+    def pop(self, session_id: str) -> List[Dict[str, str]]:
+        """세션의 문서 목록을 꺼내고 저장소에서 제거한다"""
+        session = self._drop(session_id)
+        if session is None or time.monotonic() - session.updated_at >= self.ttl:
+            return []
+        return session.documents
+
+    def clear(self) -> None:
+        self._sessions.clear()
+        self._total_size = 0
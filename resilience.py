@@ -0,0 +1,169 @@
+"""
+업스트림 호출 복원력: 턴 마감 시간, 서킷 브레이커, 헤지용 응답 시간 창
+
+- 마감 시간: 턴 작업이 시작할 때 set_deadline(TURN_DEADLINE)으로 마감 시각을 정해 두면(컨텍스트 변수)
+  그 턴에서 나가는 n8n/OpenAI 호출은 자기 타임아웃과 남은 시간 중 짧은 쪽만 기다린다.
+  남은 시간이 없으면 호출하지 않고 DeadlineExceeded를 올린다.
+- 서킷 브레이커: 엔드포인트별로 연속 실패(타임아웃, 연결 오류, 5xx)가 N8N_BREAKER_FAILURES번이면
+  N8N_BREAKER_RESET초 동안 호출하지 않고 CircuitOpenError로 바로 실패시킨다.
+  그 뒤 첫 호출 하나만 시험으로 보내 성공하면 닫고, 실패하면 다시 연다.
+- LatencyWindow: 최근 정상 응답 시간으로 헤지 요청을 보낼 지연(p95)을 계산한다.
+
+재시도와 헤지 자체는 n8n_client.N8NClient.fetch()에 있다.
+"""
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+import metrics
+import settings
+
+logger = logging.getLogger(__name__)
+
+# 헤지 지연을 계산하기 위한 최소 표본 수 / 보관할 최근 표본 수
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW_SIZE = 200
+
+# 현재 작업(턴)의 마감 시각 (time.monotonic 기준, None이면 마감 없음)
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+def set_deadline(seconds: float) -> None:
+    """현재 작업의 마감 시각을 지금부터 seconds초 뒤로 정한다 (0 이하면 마감 없음)."""
+    _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+
+def remaining() -> Optional[float]:
+    """마감까지 남은 시간(초), 마감이 없으면 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """턴 마감 시간이 지나 업스트림을 호출하지 않음"""
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """서킷이 열려 업스트림을 호출하지 않음"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} 서킷 열림 ({retry_after:.0f}초 후 재시도)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def budget(limit: float, name: str) -> float:
+    """
+    이번 호출이 기다릴 수 있는 시간(초): limit과 마감까지 남은 시간 중 짧은 쪽
+    Raises:
+        DeadlineExceeded: 남은 시간이 없음
+    """
+    left = remaining()
+    if left is not None and left < limit:
+        limit = left
+    if limit <= 0:
+        metrics.TIMEOUTS["deadline"].inc()
+        raise DeadlineExceeded(f"{name}: 턴 마감 시간 초과")
+    return limit
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failures: int = settings.N8N_BREAKER_FAILURES,
+        reset_after: float = settings.N8N_BREAKER_RESET,
+    ):
+        self.name = name
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_after - time.monotonic())
+
+    def before_call(self) -> bool:
+        """
+        호출 전에 확인한다. 끝나면 결과와 상관없이 release(반환값)를 호출해야 한다.
+        Returns:
+            bool: 반열림 상태의 시험 호출인지
+        Raises:
+            CircuitOpenError: 서킷이 열려 있음 (또는 다른 시험 호출이 진행 중)
+        """
+        if self.threshold <= 0 or self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        metrics.CIRCUIT_REJECTED[self.name].inc()
+        raise CircuitOpenError(self.name, self.retry_after())
+
+    def release(self, probe: bool) -> None:
+        # 시험 호출이 결과 없이 끝나면(취소 등) 다음 호출이 다시 시험한다
+        if probe:
+            self._probing = False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("🔌 [%s] 서킷 닫힘: 시험 호출 성공", self.name)
+            metrics.CIRCUIT_OPEN[self.name].set(0)
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        if self.threshold <= 0:
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    "🔌 [%s] 서킷 열림: 연속 실패 %d회, %.0f초 동안 호출하지 않습니다",
+                    self.name, self.failures, self.reset_after,
+                )
+                metrics.CIRCUIT_OPEN[self.name].set(1)
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retryAfter": round(self.retry_after(), 1) if self.state == self.OPEN else 0,
+        }
+
+
+class LatencyWindow:
+    """최근 정상 응답 시간 (헤지 지연 계산용)"""
+
+    def __init__(self, size: int = LATENCY_WINDOW_SIZE):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q 분위 응답 시간, 표본이 HEDGE_MIN_SAMPLES개 미만이면 None"""
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -0,0 +1,194 @@
+"""
+세션별 BM25 검색 인덱스
+
+/chat으로 들어온 참조 문서를 문단(passage) 단위로 나눠 세션별 역색인에 바로 추가하고,
+턴마다 사용자 질문과 관련 있는 상위 k개 문단만 골라 클라이언트와 프롬프트에 사용한다.
+
+- 토큰화: 한글/한자/가나는 글자 n-gram(기본 2), 영문·숫자는 단어 단위 (NFKC + 소문자)
+- 점수 컷오프: 최고 점수 대비 RETRIEVAL_SCORE_CUTOFF 비율 미만인 문단은 버린다.
+- 인덱스는 프로세스 메모리에만 있다. 다른 워커가 수집한 문서는 턴에서 꺼낼 때 인덱스에 추가한다.
+"""
+import math
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import settings
+
+_CJK_RUN = re.compile(r"[ᄀ-ᇿ㄰-㆏가-힣぀-ヿ一-鿿]+")
+_WORD = re.compile(r"[a-z0-9]+")
+_SPLIT = re.compile(r"(?<=[.!?。\n])\s+")
+
+
+def tokenize(text: str, ngram: int = settings.RETRIEVAL_NGRAM) -> List[str]:
+    """한국어는 글자 n-gram, 영문·숫자는 단어로 나눈다."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = _WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) <= ngram:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + ngram] for i in range(len(run) - ngram + 1))
+    return tokens
+
+
+def split_passages(text: str, max_chars: int = settings.RETRIEVAL_PASSAGE_CHARS) -> List[str]:
+    """문장 경계에서 max_chars 안팎의 문단으로 나눈다."""
+    if len(text) <= max_chars:
+        return [text]
+    passages = []
+    current = ""
+    for sentence in _SPLIT.split(text):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        while len(sentence) > max_chars:
+            passages.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+class BM25Index:
+    """문단 단위 증분 BM25 역색인"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # 문단 id -> (출처, 문서 안 순서, 본문)
+        self.passages: List[Tuple[str, int, str]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self.sources = set()
+        self.updated_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add(self, documents: List[Dict[str, str]]) -> int:
+        """아직 색인하지 않은 출처의 문서만 추가한다. Returns: 추가한 문단 수"""
+        added = 0
+        for doc in documents:
+            source = doc.get("source", "")
+            if source in self.sources:
+                continue
+            self.sources.add(source)
+            for order, passage in enumerate(split_passages(doc.get("summary", ""))):
+                passage_id = len(self.passages)
+                tokens = tokenize(passage)
+                self.passages.append((source, order, passage))
+                self.lengths.append(len(tokens))
+                self.total_length += len(tokens)
+                for token in tokens:
+                    postings = self.postings.setdefault(token, {})
+                    postings[passage_id] = postings.get(passage_id, 0) + 1
+                added += 1
+        self.updated_at = time.monotonic()
+        return added
+
+    def search(self, query: str, top_k: int, cutoff: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            List[Tuple[int, float]]: 점수 내림차순 (문단 id, 점수), 최고 점수 * cutoff 미만 제외
+        """
+        if not self.passages:
+            return []
+        count = len(self.passages)
+        avg_length = self.total_length / count or 1.0
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[passage_id] / avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        threshold = ranked[0][1] * cutoff
+        return [(passage_id, score) for passage_id, score in ranked if score >= threshold]
+
+
+class SessionRetriever:
+    """세션 uuid별 BM25 인덱스 (TTL + 세션 수 LRU 제한)"""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = settings.RETRIEVAL_ENABLED,
+        top_k: int = settings.RETRIEVAL_TOP_K,
+        cutoff: float = settings.RETRIEVAL_SCORE_CUTOFF,
+        ttl: float = settings.REFERENCE_TTL,
+        max_sessions: int = settings.RETRIEVAL_MAX_SESSIONS,
+    ):
+        self.enabled = enabled
+        self.top_k = top_k
+        self.cutoff = cutoff
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._indexes:
+            session_id, index = next(iter(self._indexes.items()))
+            if len(self._indexes) <= self.max_sessions and now - index.updated_at < self.ttl:
+                break
+            del self._indexes[session_id]
+
+    def add(self, session_id: str, documents: List[Dict[str, str]]) -> None:
+        """수집 시점에 세션 인덱스에 문서를 추가한다."""
+        if not self.enabled or not documents:
+            return
+        index = self._indexes.get(session_id)
+        if index is None:
+            index = self._indexes[session_id] = BM25Index()
+        else:
+            self._indexes.move_to_end(session_id)
+        index.add(documents)
+        self._evict()
+
+    def discard(self, session_id: str) -> None:
+        self._indexes.pop(session_id, None)
+
+    def select(self, session_id: str, documents: List[Dict[str, str]], query: str) -> List[Dict[str, str]]:
+        """
+        세션에서 꺼낸 문서 중 질문과 관련 있는 상위 k개 문단만 남긴다 (꺼낸 세션의 인덱스는 제거).
+
+        Args:
+            session_id: 세션 uuid
+            documents: 세션(+공용 세션)에서 꺼낸 문서 목록
+            query: 사용자 질문
+        Returns:
+            List[Dict[str, str]]: 관련도 순 문서 목록. 같은 문서의 문단은 원래 순서로 이어 붙인다.
+                일치하는 문단이 없으면 앞쪽 k개 문서를 그대로 반환한다.
+        """
+        if not self.enabled or not documents:
+            return documents
+        index = self._indexes.pop(session_id, None) or BM25Index()
+        # 다른 워커가 받은 문서나 공용 세션 문서는 지금 색인
+        index.add(documents)
+        available = {doc.get("source", "") for doc in documents}
+
+        selected: "OrderedDict[str, List[Tuple[int, str]]]" = OrderedDict()
+        for passage_id, _ in index.search(query, self.top_k * 4, self.cutoff):
+            source, order, passage = index.passages[passage_id]
+            if source not in available:
+                continue
+            selected.setdefault(source, []).append((order, passage))
+            if sum(len(parts) for parts in selected.values()) >= self.top_k:
+                break
+
+        if not selected:
+            return documents[:self.top_k]
+        return [
+            {"source": source, "summary": "\n".join(passage for _, passage in sorted(parts))}
+            for source, parts in selected.items()
+        ]
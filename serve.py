@@ -0,0 +1,57 @@
+"""
+운영 모드 실행 진입점
+
+    python serve.py
+
+- 워커 수: SERVER_WORKERS (0이면 CPU 코어 수)
+- 이벤트 루프/HTTP 파서: uvloop / httptools (uvicorn[standard]에 포함, 없으면 asyncio / h11)
+- 종료 신호를 받으면 각 워커가 /ws 연결을 정리한 뒤 종료한다 (drain.py, SHUTDOWN_DRAIN_TIMEOUT).
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+import settings
+from app_logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# 연결 정리가 끝난 뒤 uvicorn이 남은 요청(HTTP)을 기다리는 시간(초)
+GRACEFUL_SHUTDOWN_SECONDS = 5
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main() -> None:
+    setup_logging()
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    if workers > 1 and settings.STATE_BACKEND == "memory":
+        logger.warning("⚠️ 워커 %d개에 STATE_BACKEND=memory: /chat과 /ws가 다른 워커로 가면 참조 문서를 찾지 못합니다", workers)
+    logger.info("🚀 운영 모드 시작: 워커 %d개, 루프 %s, HTTP %s, 포트 %d", workers, loop, http, settings.PORT)
+
+    uvicorn.run(
+        "app:app",
+        host=settings.SERVER_HOST,
+        port=settings.PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        # 프로토콜 ping으로 응답 없는 연결을 WS_PING_INTERVAL + WS_PING_TIMEOUT 안에 정리
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+        # 진단 로그는 app_logging이 담당하고 접근 로그는 끔
+        log_config=None,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
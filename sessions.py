@@ -0,0 +1,242 @@
+"""
+WebSocket 세션 재개 + 연결 수 제한
+
+연결이 끊겼다가 다시 붙을 때마다 챗봇 설정을 다시 가져오고 인사말을 또 보내지 않도록,
+인사말 프레임에 세션 토큰(session)을 실어 보내고 클라이언트가 /ws?session=<토큰>으로 재연결하면
+같은 세션에 다시 붙인다. 세션은 워커 프로세스 메모리에만 있으므로 다른 워커로 붙으면 새 세션을 만든다.
+
+- 답변 도중 연결이 끊기면 턴은 계속 진행되고, 보내지 못한 프레임은 세션 버퍼(WS_RESUME_BUFFER_FRAMES)에 쌓였다가
+  재개 시 순서대로 전달된다. 버퍼가 넘치면 그 세션은 재개할 수 없다.
+- 끊긴 세션은 WS_RESUME_TTL초 동안 보관한다.
+- 연결 수는 워커 전체(WS_MAX_CONNECTIONS)와 uuid별(WS_MAX_CONNECTIONS_PER_UUID)로 제한한다.
+  uuid별 제한을 넘으면 같은 uuid의 가장 오래된 연결(대개 끊긴 탭)을 닫는다.
+- 클라이언트 하트비트 {"type": "ping"}에는 {"type": "pong"}으로 답한다 (턴으로 세지 않음).
+- 턴은 세션이 소유한 작업으로 실행된다. 기본은 도착 순서대로 하나씩, 파이프라인 모드는 동시에 실행한다.
+  {"type": "cancel"[, "turn": id]} 프레임이나 연결 끊김(재개 대기 WS_CANCEL_GRACE초 후)으로 취소하며,
+  취소하면 진행 중인 n8n/OpenAI 스트림도 닫힌다.
+"""
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Any, Coroutine, Deque, Dict, List, Optional
+
+from fastapi import WebSocket
+
+import metrics
+import settings
+
+logger = logging.getLogger(__name__)
+
+# 1013: Try Again Later
+CLOSE_TRY_AGAIN_LATER = 1013
+PONG_FRAME = {"type": "pong"}
+
+
+def is_heartbeat(raw_data: str) -> bool:
+    """클라이언트 하트비트 프레임인지 (JSON 파싱 없이 판별)"""
+    return raw_data.replace(" ", "") == '{"type":"ping"}'
+
+
+class SessionExpired(Exception):
+    """재개할 수 없는 세션"""
+
+
+class ClientSession:
+    """
+    연결과 분리된 대화 세션
+
+    답변 경로는 WebSocket 대신 이 객체에 send_text를 호출한다. 붙어 있는 연결이 있으면 바로 보내고,
+    없거나 전송에 실패하면 버퍼에 쌓아 두었다가 재개 시 보낸다.
+    """
+
+    def __init__(self, uuid: Optional[str], max_buffer: int = settings.WS_RESUME_BUFFER_FRAMES):
+        self.token = secrets.token_urlsafe(18)
+        self.uuid = uuid
+        self.turn = 0
+        self.websocket: Optional[WebSocket] = None
+        self.detached_at: Optional[float] = time.monotonic()
+        self.resumable = True
+        self.max_buffer = max_buffer
+        self._buffer: Deque[str] = deque()
+        # 턴 id -> 실행 중(또는 순서 대기 중)인 턴 작업
+        self.turns: Dict[int, asyncio.Task] = {}
+        self._last_turn: Optional[asyncio.Task] = None
+        self._cancel_timer: Optional[asyncio.TimerHandle] = None
+
+    async def send_text(self, text: str) -> None:
+        websocket = self.websocket
+        if websocket is not None:
+            try:
+                await websocket.send_text(text)
+                return
+            except Exception:
+                self.detach(websocket)
+        if not self.resumable:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            logger.info("⚠️ 세션 재개 버퍼가 가득 차 재개할 수 없습니다")
+            self.resumable = False
+            self._buffer.clear()
+            return
+        self._buffer.append(text)
+
+    async def attach(self, websocket: WebSocket) -> int:
+        """
+        연결을 붙이고 끊긴 동안 쌓인 프레임을 먼저 보낸다 (보내는 동안 생긴 프레임도 순서대로 이어 보냄).
+        Returns:
+            int: 다시 보낸 프레임 수
+        """
+        if not self.resumable:
+            raise SessionExpired(self.token)
+        self.websocket = None
+        replayed = 0
+        while self._buffer:
+            await websocket.send_text(self._buffer.popleft())
+            replayed += 1
+        self.websocket = websocket
+        self.detached_at = None
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+        return replayed
+
+    def detach(self, websocket: WebSocket) -> None:
+        if self.websocket is websocket:
+            self.websocket = None
+            self.detached_at = time.monotonic()
+
+    def start_turn(self, turn_id: int, coro: Coroutine[Any, Any, None], *, sequential: bool = True) -> asyncio.Task:
+        """
+        턴 작업을 시작한다.
+        Args:
+            sequential: True면 앞선 턴이 끝난 뒤 실행 (False면 파이프라인 모드로 바로 실행)
+        """
+        previous = self._last_turn if sequential else None
+
+        async def run() -> None:
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            await coro
+
+        task = asyncio.create_task(run())
+        self.turns[turn_id] = task
+        self._last_turn = task
+        task.add_done_callback(lambda done: self._finish_turn(turn_id, done, coro))
+        return task
+
+    def _finish_turn(self, turn_id: int, task: asyncio.Task, coro: Coroutine[Any, Any, None]) -> None:
+        self.turns.pop(turn_id, None)
+        # 시작 전에(앞선 턴 대기 중이거나 첫 실행 전) 취소된 턴의 코루틴도 닫는다 (이미 끝났으면 아무 일 없음)
+        coro.close()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("❌ 턴 %d 작업 오류: %s", turn_id, task.exception())
+
+    def cancel(self, turn_id: Optional[int] = None) -> int:
+        """
+        턴을 취소한다 (turn_id가 없으면 진행 중인 모든 턴).
+        Returns:
+            int: 취소한 턴 수
+        """
+        tasks = list(self.turns.values()) if turn_id is None else [self.turns[turn_id]] if turn_id in self.turns else []
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def cancel_later(self, delay: float) -> None:
+        """연결이 끊긴 세션의 턴을 delay초 뒤 취소한다 (그 안에 재개하면 취소하지 않음)."""
+        if not self.turns:
+            return
+        if delay <= 0:
+            self._cancel_detached()
+            return
+        if self._cancel_timer is None:
+            self._cancel_timer = asyncio.get_running_loop().call_later(delay, self._cancel_detached)
+
+    def _cancel_detached(self) -> None:
+        self._cancel_timer = None
+        if self.websocket is None:
+            cancelled = self.cancel()
+            metrics.TURNS_CANCELLED["disconnect"].inc(cancelled)
+            logger.info("🛑 연결이 끊긴 세션의 턴 %d개를 취소했습니다", cancelled)
+
+
+class SessionRegistry:
+    """워커 단위 세션 목록 + 연결 수 제한"""
+
+    def __init__(
+        self,
+        *,
+        ttl: float = settings.WS_RESUME_TTL,
+        max_connections: int = settings.WS_MAX_CONNECTIONS,
+        max_per_uuid: int = settings.WS_MAX_CONNECTIONS_PER_UUID,
+    ):
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self.max_per_uuid = max_per_uuid
+        self._sessions: "OrderedDict[str, ClientSession]" = OrderedDict()
+        # uuid -> 연결 목록 (오래된 순)
+        self._by_uuid: Dict[str, List[WebSocket]] = {}
+        self.connections = 0
+
+    def at_capacity(self) -> bool:
+        return 0 < self.max_connections <= self.connections
+
+    def connect(self, websocket: WebSocket, uuid: Optional[str]) -> Optional[WebSocket]:
+        """
+        연결을 등록한다.
+        Returns:
+            Optional[WebSocket]: uuid별 제한을 넘어 닫아야 할 가장 오래된 연결
+        """
+        self.connections += 1
+        if not uuid:
+            return None
+        sockets = self._by_uuid.setdefault(uuid, [])
+        sockets.append(websocket)
+        if 0 < self.max_per_uuid < len(sockets):
+            return sockets[0]
+        return None
+
+    def disconnect(self, websocket: WebSocket, uuid: Optional[str], session: Optional[ClientSession]) -> None:
+        self.connections -= 1
+        if uuid and uuid in self._by_uuid:
+            sockets = self._by_uuid[uuid]
+            if websocket in sockets:
+                sockets.remove(websocket)
+            if not sockets:
+                del self._by_uuid[uuid]
+        if session is not None:
+            session.detach(websocket)
+
+    def create(self, uuid: Optional[str]) -> ClientSession:
+        self._evict()
+        session = ClientSession(uuid)
+        self._sessions[session.token] = session
+        return session
+
+    def resume(self, token: Optional[str], uuid: Optional[str]) -> Optional[ClientSession]:
+        """토큰에 해당하는 세션 (만료됐거나 uuid가 다르면 None)"""
+        self._evict()
+        session = self._sessions.get(token) if token else None
+        if session is None or not session.resumable or (uuid and session.uuid and uuid != session.uuid):
+            return None
+        self._sessions.move_to_end(token)
+        return session
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [
+            token for token, session in self._sessions.items()
+            if not session.resumable or (session.detached_at is not None and now - session.detached_at > self.ttl)
+        ]
+        for token in expired:
+            del self._sessions[token]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "uuids": len(self._by_uuid),
+            "sessions": len(self._sessions),
+            "detached": sum(1 for session in self._sessions.values() if session.websocket is None),
+        }
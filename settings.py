@@ -0,0 +1,220 @@
+"""
+환경 변수 기반 설정값 모음
+
+배포 환경마다 달라지는 값은 모두 여기서 환경 변수(.env 포함)로 읽어 온다.
+"""
+import logging
+import os
+
+import dotenv
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("⚠️ 환경 변수 %s=%r 를 정수로 해석할 수 없어 기본값 %s 사용", name, value, default)
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("⚠️ 환경 변수 %s=%r 를 실수로 해석할 수 없어 기본값 %s 사용", name, value, default)
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# n8n 웹훅
+N8N_BASE_URL = _env_str("N8N_BASE_URL", "https://sunjea1149.app.n8n.cloud").rstrip("/")
+N8N_CHAT_PATH = _env_str("N8N_CHAT_PATH", "/webhook/1149")
+N8N_SEARCH_PDF_PATH = _env_str("N8N_SEARCH_PDF_PATH", "/webhook/search-pdf")
+N8N_PROMPT_PATH = _env_str("N8N_PROMPT_PATH", "/webhook/getchatbotprompt")
+N8N_LOG_PATH = _env_str("N8N_LOG_PATH", "/webhook/d8b35487-e81b-45c6-95ce-248852c5e3a3")
+
+# n8n 커넥션 풀
+N8N_HTTP2 = _env_bool("N8N_HTTP2", False)
+N8N_MAX_CONNECTIONS = _env_int("N8N_MAX_CONNECTIONS", 100)
+N8N_MAX_KEEPALIVE = _env_int("N8N_MAX_KEEPALIVE", 20)
+N8N_KEEPALIVE_EXPIRY = _env_float("N8N_KEEPALIVE_EXPIRY", 30.0)
+N8N_CONNECT_TIMEOUT = _env_float("N8N_CONNECT_TIMEOUT", 5.0)
+
+# n8n 엔드포인트별 응답 타임아웃 (초)
+N8N_CHAT_TIMEOUT = _env_float("N8N_CHAT_TIMEOUT", 60.0)
+N8N_SEARCH_PDF_TIMEOUT = _env_float("N8N_SEARCH_PDF_TIMEOUT", 10.0)
+N8N_PROMPT_TIMEOUT = _env_float("N8N_PROMPT_TIMEOUT", 10.0)
+N8N_LOG_TIMEOUT = _env_float("N8N_LOG_TIMEOUT", 10.0)
+
+# /webhook/1149 응답을 스트리밍으로 읽어 도착하는 대로 전달 (단일 JSON 응답은 기존과 동일하게 처리)
+N8N_STREAM_RESPONSE = _env_bool("N8N_STREAM_RESPONSE", True)
+
+# 챗봇 프롬프트 설정 캐시
+CHATBOT_CONFIG_TTL = _env_float("CHATBOT_CONFIG_TTL", 300.0)
+# 백그라운드 선제 갱신 주기(초), 0이면 TTL 만료 시에만 갱신
+CHATBOT_CONFIG_REFRESH_INTERVAL = _env_float("CHATBOT_CONFIG_REFRESH_INTERVAL", 240.0)
+
+# 관리자 엔드포인트 토큰 (비어 있으면 관리자 엔드포인트 비활성화)
+ADMIN_TOKEN = _env_str("ADMIN_TOKEN", "")
+
+# 세션별 참조 문서 저장소
+REFERENCE_TTL = _env_float("REFERENCE_TTL", 600.0)
+REFERENCE_MAX_DOCS_PER_SESSION = _env_int("REFERENCE_MAX_DOCS_PER_SESSION", 50)
+# 전체 보관 크기 상한 (문자 수 근사치)
+REFERENCE_MAX_TOTAL_SIZE = _env_int("REFERENCE_MAX_TOTAL_SIZE", 50_000_000)
+# uuid 없이 들어온(공용 세션) 참조 문서를 다음 턴의 사용자에게 합쳐 줄지 여부
+# (uuid를 넘기지 못하는 기존 워크플로우 호환용, 동시 사용자 간에 문서가 섞일 수 있어 기본은 끔)
+REFERENCE_SHARED_FALLBACK = _env_bool("REFERENCE_SHARED_FALLBACK", False)
+
+# 워커 간 공유 상태 백엔드: memory(단일 워커) | sqlite | redis
+STATE_BACKEND = _env_str("STATE_BACKEND", "memory")
+STATE_SQLITE_PATH = _env_str("STATE_SQLITE_PATH", "/tmp/n8ngpt-state.db")
+STATE_REDIS_URL = _env_str("STATE_REDIS_URL", "redis://localhost:6379/0")
+
+# 답변 엔진: n8n(웹훅 응답 전달) | openai(모델 토큰 직접 스트리밍)
+ANSWER_ENGINE = _env_str("ANSWER_ENGINE", "n8n").lower()
+
+# OpenAI (OPENAI_BASE_URL로 OpenAI 호환 서버 지정 가능)
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = _env_str("OPENAI_BASE_URL", "")
+OPENAI_TIMEOUT = _env_float("OPENAI_TIMEOUT", 60.0)
+
+# 스트리밍 프레임 병합 창 (시간(초) / UTF-8 바이트)
+STREAM_FRAME_WINDOW = _env_float("STREAM_FRAME_WINDOW", 0.02)
+STREAM_FRAME_MAX_BYTES = _env_int("STREAM_FRAME_MAX_BYTES", 256)
+
+# 대화 로그 백그라운드 전송
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
+# 한 번의 POST로 묶어 보낼 최대 레코드 수 (1이면 기존처럼 레코드 하나를 객체로 전송, 2 이상이면 JSON 배열로 전송)
+# 2 이상으로 올리려면 n8n 로깅 워크플로우가 배열 본문을 받도록 먼저 바꿔야 함
+LOG_BATCH_SIZE = _env_int("LOG_BATCH_SIZE", 1)
+LOG_BATCH_AGE = _env_float("LOG_BATCH_AGE", 1.0)
+# 큐가 가득 찼을 때 정책: drop_newest | drop_oldest | sample
+LOG_OVERFLOW_POLICY = _env_str("LOG_OVERFLOW_POLICY", "drop_oldest")
+LOG_SAMPLE_RATE = _env_float("LOG_SAMPLE_RATE", 0.1)
+# 디스크 로그 파일 경로 (워커마다 확장자 앞에 PID를 붙여 따로 씀: /tmp/n8ngpt-log-spill.<pid>.jsonl)
+LOG_SPILL_PATH = _env_str("LOG_SPILL_PATH", "/tmp/n8ngpt-log-spill.jsonl")
+LOG_SPILL_MAX_BYTES = _env_int("LOG_SPILL_MAX_BYTES", 50_000_000)
+LOG_SHUTDOWN_TIMEOUT = _env_float("LOG_SHUTDOWN_TIMEOUT", 5.0)
+
+# /download-link 캐시
+DOWNLOAD_LINK_CACHE_SIZE = _env_int("DOWNLOAD_LINK_CACHE_SIZE", 1000)
+DOWNLOAD_LINK_TTL = _env_float("DOWNLOAD_LINK_TTL", 600.0)
+DOWNLOAD_LINK_NEGATIVE_TTL = _env_float("DOWNLOAD_LINK_NEGATIVE_TTL", 30.0)
+# 서명된 URL 만료 시각보다 이 시간(초)만큼 먼저 캐시에서 제거
+DOWNLOAD_LINK_EXPIRY_MARGIN = _env_float("DOWNLOAD_LINK_EXPIRY_MARGIN", 60.0)
+
+# 반복 질문 답변 캐시 (선택 기능)
+ANSWER_CACHE_ENABLED = _env_bool("ANSWER_CACHE_ENABLED", False)
+ANSWER_CACHE_SIZE = _env_int("ANSWER_CACHE_SIZE", 500)
+ANSWER_CACHE_TTL = _env_float("ANSWER_CACHE_TTL", 3600.0)
+
+# 업스트림별 동시 실행 제한 / 대기열 크기
+ADMISSION_CHAT_CONCURRENCY = _env_int("ADMISSION_CHAT_CONCURRENCY", 20)
+ADMISSION_CHAT_QUEUE = _env_int("ADMISSION_CHAT_QUEUE", 100)
+ADMISSION_SEARCH_PDF_CONCURRENCY = _env_int("ADMISSION_SEARCH_PDF_CONCURRENCY", 10)
+ADMISSION_SEARCH_PDF_QUEUE = _env_int("ADMISSION_SEARCH_PDF_QUEUE", 100)
+ADMISSION_OPENAI_CONCURRENCY = _env_int("ADMISSION_OPENAI_CONCURRENCY", 20)
+ADMISSION_OPENAI_QUEUE = _env_int("ADMISSION_OPENAI_QUEUE", 100)
+# 대기열에서 차례를 기다리는 최대 시간(초)
+ADMISSION_MAX_WAIT = _env_float("ADMISSION_MAX_WAIT", 30.0)
+
+# 애플리케이션 진단 로그 (대화 로그 전송 LOG_*와 별개)
+APP_LOG_LEVEL = _env_str("APP_LOG_LEVEL", "INFO").upper()
+# text | json
+APP_LOG_FORMAT = _env_str("APP_LOG_FORMAT", "text").lower()
+# 턴 단위 샘플링 비율: 샘플링되지 않은 턴은 WARNING 이상만 남긴다
+APP_LOG_SAMPLE_RATE = _env_float("APP_LOG_SAMPLE_RATE", 1.0)
+# 로그 한 줄의 최대 길이(자)
+APP_LOG_MAX_CHARS = _env_int("APP_LOG_MAX_CHARS", 500)
+# 백그라운드 출력 스레드로 넘기는 큐 크기 (가득 차면 버림)
+APP_LOG_QUEUE_SIZE = _env_int("APP_LOG_QUEUE_SIZE", 10000)
+
+# /chat 참조 문서 수집 제한
+INGEST_MAX_BODY_BYTES = _env_int("INGEST_MAX_BODY_BYTES", 10_000_000)
+INGEST_MAX_DOCS = _env_int("INGEST_MAX_DOCS", 500)
+INGEST_MAX_SUMMARY_CHARS = _env_int("INGEST_MAX_SUMMARY_CHARS", 4000)
+
+# OpenAI 프롬프트 토큰 예산
+# 입력 토큰 상한 (모델 컨텍스트 - max-tokens 와 비교해 작은 값 사용, 0이면 모델 컨텍스트 기준만 사용)
+PROMPT_MAX_INPUT_TOKENS = _env_int("PROMPT_MAX_INPUT_TOKENS", 16000)
+# trainingData 최대 토큰 (0이면 제한 없음)
+PROMPT_TRAINING_DATA_MAX_TOKENS = _env_int("PROMPT_TRAINING_DATA_MAX_TOKENS", 6000)
+# 남은 예산이 이보다 작으면 참고 문서를 잘라 넣지 않고 버림
+PROMPT_MIN_REFERENCE_TOKENS = _env_int("PROMPT_MIN_REFERENCE_TOKENS", 64)
+
+# 세션별 참조 문서 검색 (BM25)
+RETRIEVAL_ENABLED = _env_bool("RETRIEVAL_ENABLED", True)
+RETRIEVAL_TOP_K = _env_int("RETRIEVAL_TOP_K", 8)
+# 최고 점수 대비 이 비율 미만인 문단은 버림
+RETRIEVAL_SCORE_CUTOFF = _env_float("RETRIEVAL_SCORE_CUTOFF", 0.2)
+# 한국어 글자 n-gram 크기
+RETRIEVAL_NGRAM = _env_int("RETRIEVAL_NGRAM", 2)
+RETRIEVAL_PASSAGE_CHARS = _env_int("RETRIEVAL_PASSAGE_CHARS", 600)
+RETRIEVAL_MAX_SESSIONS = _env_int("RETRIEVAL_MAX_SESSIONS", 1000)
+
+# 프롬프트 캐시 친화 배치: 지시사항 + trainingData를 고정 앞부분으로, 참고 문서와 질문을 뒤로
+PROMPT_CACHE_LAYOUT = _env_bool("PROMPT_CACHE_LAYOUT", False)
+# 스트림 마지막에 사용량(usage)을 요청 (캐시 토큰 집계용)
+OPENAI_STREAM_USAGE = _env_bool("OPENAI_STREAM_USAGE", True)
+
+# 운영 모드(serve.py) 실행 설정: 워커 수(0이면 CPU 코어 수), 바인드 주소/포트
+SERVER_WORKERS = _env_int("SERVER_WORKERS", 1)
+SERVER_HOST = _env_str("SERVER_HOST", "0.0.0.0")
+PORT = _env_int("PORT", 8000)
+# 종료 신호(SIGTERM) 후 진행 중인 턴이 끝나기를 기다리는 최대 시간(초, 0이면 바로 종료)
+# 이 시간 + LOG_SHUTDOWN_TIMEOUT이 docker stop 기본 유예 시간(10초) 안에 들어가도록 잡음
+# 더 길게 기다리려면 유예 시간도 함께 늘려야 함 (docker run --stop-timeout, terminationGracePeriodSeconds)
+SHUTDOWN_DRAIN_TIMEOUT = _env_float("SHUTDOWN_DRAIN_TIMEOUT", 4.0)
+# 재연결 안내 프레임에 담는 재연결 권장 대기 시간(밀리초)
+RECONNECT_RETRY_MS = _env_int("RECONNECT_RETRY_MS", 1000)
+
+# /ws 연결: 메시지(하트비트 포함) 수신 대기 시간(초), 프로토콜 ping 주기/응답 대기(초, serve.py)
+WS_RECEIVE_TIMEOUT = _env_float("WS_RECEIVE_TIMEOUT", 300.0)
+WS_PING_INTERVAL = _env_float("WS_PING_INTERVAL", 15.0)
+WS_PING_TIMEOUT = _env_float("WS_PING_TIMEOUT", 10.0)
+# 워커당 최대 연결 수 / uuid별 최대 연결 수 (0이면 제한 없음)
+WS_MAX_CONNECTIONS = _env_int("WS_MAX_CONNECTIONS", 1000)
+WS_MAX_CONNECTIONS_PER_UUID = _env_int("WS_MAX_CONNECTIONS_PER_UUID", 5)
+# 끊긴 세션 보관 시간(초) / 끊긴 동안 보관할 최대 프레임 수
+WS_RESUME_TTL = _env_float("WS_RESUME_TTL", 120.0)
+WS_RESUME_BUFFER_FRAMES = _env_int("WS_RESUME_BUFFER_FRAMES", 2000)
+# 연결이 비정상적으로 끊긴 뒤 진행 중인 턴을 취소하기까지 재개를 기다리는 시간(초)
+WS_CANCEL_GRACE = _env_float("WS_CANCEL_GRACE", 10.0)
+# 한 연결에서 진행 중이거나 순서를 기다리는 최대 턴 수. 파이프라인 모드(/ws?pipeline=1)에서는 동시에 진행할 최대 턴 수
+# (1 이하면 파이프라인 모드 비활성화, 순차 모드에서는 답변 중 다음 질문을 받지 않음)
+WS_PIPELINE_MAX_TURNS = _env_int("WS_PIPELINE_MAX_TURNS", 4)
+
+# 턴 마감 시간(초): 한 턴 안의 n8n/OpenAI 호출은 각자의 타임아웃과 남은 시간 중 짧은 쪽만 기다림 (0이면 마감 없음)
+TURN_DEADLINE = _env_float("TURN_DEADLINE", 90.0)
+# 멱등 조회(search-pdf, getchatbotprompt) 재시도: 최대 시도 횟수, full jitter 백오프 기준/최대 대기(초)
+N8N_RETRY_ATTEMPTS = _env_int("N8N_RETRY_ATTEMPTS", 3)
+N8N_RETRY_BASE_DELAY = _env_float("N8N_RETRY_BASE_DELAY", 0.2)
+N8N_RETRY_MAX_DELAY = _env_float("N8N_RETRY_MAX_DELAY", 2.0)
+# 멱등 조회 헤지 요청: 첫 요청이 최근 응답 시간의 N8N_HEDGE_QUANTILE 분위를 넘기면 같은 요청을 한 번 더 보냄
+N8N_HEDGE_ENABLED = _env_bool("N8N_HEDGE_ENABLED", False)
+N8N_HEDGE_QUANTILE = _env_float("N8N_HEDGE_QUANTILE", 0.95)
+# 서킷 브레이커: 엔드포인트별 연속 실패 횟수(0이면 비활성화)와 열린 뒤 시험 호출까지의 시간(초)
+N8N_BREAKER_FAILURES = _env_int("N8N_BREAKER_FAILURES", 5)
+N8N_BREAKER_RESET = _env_float("N8N_BREAKER_RESET", 30.0)
@@ -0,0 +1,310 @@
+"""
+워커 간 공유 상태 백엔드
+
+uvicorn 워커가 여러 개일 때 /chat(참조 문서 수신)과 /ws(답변)가 서로 다른 워커에서 처리될 수 있으므로,
+워커 사이에 공유해야 하는 상태(세션별 참조 문서)는 이 인터페이스를 통해 읽고 쓴다.
+챗봇 설정, 답변, 다운로드 링크 캐시는 워커마다 따로 두는 프로세스 내 캐시다 (공유하지 않음).
+
+- memory: 프로세스 내 저장 (단일 워커 전용, 기본값)
+- sqlite: WAL 모드 SQLite 파일 (같은 컨테이너/호스트의 여러 워커)
+- redis: Redis 프로토콜 저장소 (여러 컨테이너, `redis` 패키지 필요)
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import settings
+from reference_store import ReferenceStore, doc_size
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """공유 상태 백엔드 인터페이스"""
+
+    name = "base"
+
+    # 세션별 참조 문서
+    @abstractmethod
+    async def add_references(self, session_id: str, documents: List[Dict[str, str]]) -> int:
+        """세션에 참조 문서를 추가하고, 추가 후 세션에 보관 중인 문서 수를 반환한다."""
+
+    @abstractmethod
+    async def get_references(self, session_id: str) -> List[Dict[str, str]]:
+        """세션의 참조 문서를 조회한다 (제거하지 않음)."""
+
+    @abstractmethod
+    async def pop_references(self, session_id: str) -> List[Dict[str, str]]:
+        """세션의 참조 문서를 꺼내고 제거한다."""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """프로세스 내 상태 (단일 워커 전용)"""
+
+    name = "memory"
+
+    def __init__(self, reference_store: Optional[ReferenceStore] = None):
+        self.references = reference_store if reference_store is not None else ReferenceStore()
+
+    async def add_references(self, session_id, documents):
+        return self.references.add(session_id, documents)
+
+    async def get_references(self, session_id):
+        return self.references.get(session_id)
+
+    async def pop_references(self, session_id):
+        return self.references.pop(session_id)
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    WAL 모드 SQLite 파일 기반 상태
+
+    같은 파일을 여러 워커 프로세스가 동시에 열어 사용한다. 모든 쿼리는 전용 스레드 하나에서
+    실행되므로 이벤트 루프를 막지 않는다.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str = settings.STATE_SQLITE_PATH,
+        *,
+        ttl: float = settings.REFERENCE_TTL,
+        max_docs_per_session: int = settings.REFERENCE_MAX_DOCS_PER_SESSION,
+        max_total_size: int = settings.REFERENCE_MAX_TOTAL_SIZE,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_docs_per_session = max_docs_per_session
+        self.max_total_size = max_total_size
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            # 전체 문서 크기는 reference_meta에 누계로 두고 트리거로 문서 추가/삭제와 같은 트랜잭션에서 갱신
+            # (이미 있던 파일이면 처음 한 번만 SUM으로 채움, 여러 워커가 동시에 만들어도 한 번만 실행되도록 트랜잭션으로 묶음)
+            conn.executescript(
+                """
+                BEGIN IMMEDIATE;
+                CREATE TABLE IF NOT EXISTS reference_docs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    doc TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_reference_docs_session ON reference_docs (session_id, id);
+                CREATE TABLE IF NOT EXISTS reference_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_reference_sessions_updated ON reference_sessions (updated_at);
+                CREATE TABLE IF NOT EXISTS reference_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO reference_meta (key, value)
+                    SELECT 'total_size', COALESCE(SUM(size), 0) FROM reference_docs;
+                CREATE TRIGGER IF NOT EXISTS reference_docs_total_insert AFTER INSERT ON reference_docs BEGIN
+                    UPDATE reference_meta SET value = value + NEW.size WHERE key = 'total_size';
+                END;
+                CREATE TRIGGER IF NOT EXISTS reference_docs_total_delete AFTER DELETE ON reference_docs BEGIN
+                    UPDATE reference_meta SET value = value - OLD.size WHERE key = 'total_size';
+                END;
+                COMMIT;
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect()))
+
+    def _delete_session(self, conn: sqlite3.Connection, session_id: str) -> None:
+        conn.execute("DELETE FROM reference_docs WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM reference_sessions WHERE session_id = ?", (session_id,))
+
+    def _total_size(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM reference_meta WHERE key = 'total_size'").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        # 1. TTL 만료 세션 제거
+        expired = conn.execute(
+            "SELECT session_id FROM reference_sessions WHERE updated_at <= ?", (now - self.ttl,)
+        ).fetchall()
+        for (session_id,) in expired:
+            self._delete_session(conn, session_id)
+        # 2. 전체 크기 상한 초과 시 가장 오래 갱신되지 않은 세션부터 제거
+        while self._total_size(conn) > self.max_total_size:
+            rows = conn.execute(
+                "SELECT session_id FROM reference_sessions ORDER BY updated_at LIMIT 2"
+            ).fetchall()
+            if len(rows) < 2:
+                break
+            session_id = rows[0][0]
+            self._delete_session(conn, session_id)
+            logger.warning("⚠️ 참조 저장소 용량 초과로 세션 제거: %s", session_id)
+
+    async def add_references(self, session_id, documents):
+        def op(conn: sqlite3.Connection) -> int:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT updated_at FROM reference_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and now - row[0] >= self.ttl:
+                    self._delete_session(conn, session_id)
+                conn.executemany(
+                    "INSERT INTO reference_docs (session_id, doc, size, created_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (session_id, json.dumps(doc, ensure_ascii=False), doc_size(doc), now)
+                        for doc in documents
+                    ],
+                )
+                # 세션당 문서 수 제한 (오래된 문서부터 버림)
+                conn.execute(
+                    """
+                    DELETE FROM reference_docs WHERE session_id = ? AND id NOT IN (
+                        SELECT id FROM reference_docs WHERE session_id = ? ORDER BY id DESC LIMIT ?
+                    )
+                    """,
+                    (session_id, session_id, self.max_docs_per_session),
+                )
+                conn.execute(
+                    "INSERT INTO reference_sessions (session_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (session_id, now),
+                )
+                self._evict(conn, now)
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM reference_docs WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                conn.execute("COMMIT")
+                return count
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return await self._run(op)
+
+    def _select_docs(self, conn: sqlite3.Connection, session_id: str) -> List[Dict[str, str]]:
+        row = conn.execute(
+            "SELECT updated_at FROM reference_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[0] >= self.ttl:
+            return []
+        rows = conn.execute(
+            "SELECT doc FROM reference_docs WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        return [json.loads(doc) for (doc,) in rows]
+
+    async def get_references(self, session_id):
+        return await self._run(lambda conn: self._select_docs(conn, session_id))
+
+    async def pop_references(self, session_id):
+        def op(conn: sqlite3.Connection) -> List[Dict[str, str]]:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                docs = self._select_docs(conn, session_id)
+                self._delete_session(conn, session_id)
+                conn.execute("COMMIT")
+                return docs
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return await self._run(op)
+
+    async def close(self):
+        def op(conn: sqlite3.Connection) -> None:
+            conn.close()
+            self._conn = None
+
+        if self._conn is not None:
+            await self._run(op)
+        self._executor.shutdown(wait=False)
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Redis 프로토콜 저장소 기반 상태
+
+    세션별 참조 문서는 리스트(RPUSH + LTRIM)로 보관하고 키 TTL로 만료시킨다.
+    전체 메모리 상한은 서버의 maxmemory / allkeys-lru 정책으로 관리한다.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = settings.STATE_REDIS_URL,
+        *,
+        ttl: float = settings.REFERENCE_TTL,
+        max_docs_per_session: int = settings.REFERENCE_MAX_DOCS_PER_SESSION,
+        prefix: str = "n8ngpt:",
+    ):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis 를 사용하려면 redis 패키지를 설치하세요 (pip install redis)") from e
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.max_docs_per_session = max_docs_per_session
+        self.prefix = prefix
+
+    def _ref_key(self, session_id: str) -> str:
+        return f"{self.prefix}refs:{session_id}"
+
+    async def add_references(self, session_id, documents):
+        key = self._ref_key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if documents:
+                pipe.rpush(key, *[json.dumps(doc, ensure_ascii=False) for doc in documents])
+            pipe.ltrim(key, -self.max_docs_per_session, -1)
+            pipe.expire(key, max(1, int(self.ttl)))
+            pipe.llen(key)
+            results = await pipe.execute()
+        return int(results[-1])
+
+    async def get_references(self, session_id):
+        docs = await self._redis.lrange(self._ref_key(session_id), 0, -1)
+        return [json.loads(doc) for doc in docs]
+
+    async def pop_references(self, session_id):
+        key = self._ref_key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            docs, _ = await pipe.execute()
+        return [json.loads(doc) for doc in docs]
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_state_backend(kind: str = settings.STATE_BACKEND) -> StateBackend:
+    """STATE_BACKEND 설정값에 맞는 상태 백엔드를 생성한다."""
+    kind = kind.lower()
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend()
+    if kind == "redis":
+        return RedisStateBackend()
+    raise ValueError(f"지원하지 않는 STATE_BACKEND: {kind} (memory, sqlite, redis 중 선택)")
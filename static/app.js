@@ -48,6 +48,12 @@ let reconnectAttempts = 0;
 let reconnectTimer = null;
 const MAX_RECONNECT_ATTEMPTS = 5;
 const RECONNECT_DELAY = 1000; // 1초
+let reconnectHintDelay = null; // 서버 재시작 안내(reconnect 프레임)로 받은 재연결 대기 시간
+let sessionToken = null; // 인사말로 받은 세션 토큰 (재연결 시 설정 조회·인사말 없이 이어 받기)
+let heartbeatTimer = null;
+let lastServerFrameAt = 0;
+const HEARTBEAT_INTERVAL = 25000; // 25초마다 ping
+const HEARTBEAT_TIMEOUT = 10000; // ping 후 10초 안에 아무 프레임도 없으면 끊긴 것으로 보고 재연결
 const WEBSOCKET_URL = 'wss://port-0-nicen8n-demo-maqzdlvl8104ba24.sel4.cloudtype.app/ws';
 
 // WebSocket 연결 함수
@@ -70,11 +76,16 @@ function connectWebSocket() {
             }
         }
 
-        socket = new WebSocket(WEBSOCKET_URL);
+        const params = new URLSearchParams({ uuid: userUUID });
+        if (sessionToken) {
+            params.set('session', sessionToken);
+        }
+        socket = new WebSocket(`${WEBSOCKET_URL}?${params}`);
         
         socket.onopen = () => {
             console.log("🔌 WebSocket 연결이 열렸습니다.");
             reconnectAttempts = 0; // 재연결 성공 시 카운터 초기화
+            startHeartbeat();
             if (window.showToast) {
                 showToast("연결되었습니다.", true);
             }
@@ -94,7 +105,18 @@ function connectWebSocket() {
         
         socket.onclose = (event) => {
             console.log(`🔌 WebSocket 연결이 닫혔습니다. (코드: ${event.code}, 이유: ${event.reason || '알 수 없음'})`);
+            stopHeartbeat();
             
+            // 서버 재시작 안내를 받았으면 시도 횟수에 포함하지 않고 안내된 시간 후 재연결
+            if (reconnectHintDelay !== null) {
+                const delay = reconnectHintDelay;
+                reconnectHintDelay = null;
+                console.log(`서버 재시작으로 ${delay/1000}초 후 재연결합니다.`);
+                reconnectTimer = setTimeout(connectWebSocket, delay);
+                hideTypingIndicator();
+                return;
+            }
+
             // 정상 종료(1000)가 아닌 경우에만 재연결 시도
             if (event.code !== 1000 && reconnectAttempts < MAX_RECONNECT_ATTEMPTS) {
                 const delay = Math.min(RECONNECT_DELAY * Math.pow(2, reconnectAttempts), 30000); // 최대 30초까지
@@ -128,8 +150,11 @@ function connectWebSocket() {
             }
         };
         
-        // 메시지 핸들러 연결
-        socket.onmessage = handleWebSocketMessage;
+        // 메시지 핸들러 연결 (재연결한 소켓에도 같은 핸들러 사용)
+        socket.onmessage = (event) => {
+            lastServerFrameAt = Date.now();
+            onSocketMessage(event);
+        };
         
     } catch (error) {
         console.error("WebSocket 연결 중 오류 발생:", error);
@@ -139,6 +164,30 @@ function connectWebSocket() {
     }
 }
 
+// 하트비트: 주기적으로 ping을 보내고, 응답이 없으면 소켓을 닫아 재연결
+function startHeartbeat() {
+    stopHeartbeat();
+    lastServerFrameAt = Date.now();
+    heartbeatTimer = setInterval(() => {
+        if (!socket || socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        if (Date.now() - lastServerFrameAt > HEARTBEAT_INTERVAL + HEARTBEAT_TIMEOUT) {
+            console.warn("하트비트 응답 없음, 재연결합니다.");
+            socket.close(4000, "heartbeat timeout");
+            return;
+        }
+        socket.send(JSON.stringify({ type: 'ping' }));
+    }, HEARTBEAT_INTERVAL);
+}
+
+function stopHeartbeat() {
+    if (heartbeatTimer) {
+        clearInterval(heartbeatTimer);
+        heartbeatTimer = null;
+    }
+}
+
 // WebSocket 메시지 처리 함수
 function handleWebSocketMessage(event) {
     try {
@@ -169,6 +218,8 @@ if (typeof WebSocket !== 'undefined') {
 
 // 페이지 언로드 시 WebSocket 연결 종료 및 리소스 정리
 function cleanup() {
+    stopHeartbeat();
+
     // 재연결 타이머 정리
     if (reconnectTimer) {
         clearTimeout(reconnectTimer);
@@ -217,14 +268,27 @@ function addMessageWithTypingEffect(message, type = 'bot', saveToHistory = true)
 }
 
 // WebSocket 메시지 처리
-socket.onmessage = async (event) => {
+async function onSocketMessage(event) {
   try {
     const trimmedData = event.data.trim();
     if (trimmedData.startsWith('{') && trimmedData.endsWith('}')) {
       const data = JSON.parse(trimmedData);
       console.log("파싱된 메시지 타입:", data.type || 'unknown');
       
+      if (data.type === 'pong') {
+        return;
+      }
+
+      if (data.type === 'resumed') {
+        // 세션 재개: 인사말 없이 끊긴 동안 못 받은 프레임이 이어서 도착
+        console.log("세션 재개됨");
+        return;
+      }
+
       // 인사말 메시지 처리
+      if (data.type === 'greeting' && data.session) {
+        sessionToken = data.session;
+      }
       if (data.type === 'greeting' && data.message) {
         console.log("인사말 메시지 수신:", data.message);
         
@@ -261,6 +325,7 @@ socket.onmessage = async (event) => {
         hideTypingIndicator();
         const { html, boldOpen } = parseMessage(data.content, true, isBoldOpen);
         isBoldOpen = boldOpen;
+        appendStreamingMessage(data.content);
 
         if (streamingChatId === chatManager.currentChatId) {
           if (!currentBotElement) {
@@ -303,7 +368,7 @@ socket.onmessage = async (event) => {
         if (streamingChatId && chatManager.chats[streamingChatId] && streamingMessageIndex !== null) {
           const chat = chatManager.chats[streamingChatId];
           if (chat.messages[streamingMessageIndex]) {
-            chat.messages[streamingMessageIndex].content = currentBotElement?.innerText || '';
+            chat.messages[streamingMessageIndex].content = currentBotElement?.innerText || chat.messages[streamingMessageIndex].content;
             chat.updatedAt = new Date().toISOString();
             chatManager.saveToLocalStorage();
           }
@@ -321,6 +386,54 @@ socket.onmessage = async (event) => {
         return;
       }
 
+      if (data.type === 'reconnect') {
+        // 서버 재시작 예정: 진행 중인 답변은 끝까지 받고, 연결이 닫히면 바로 재연결
+        console.log(`서버 재시작 안내 (${data.retryAfterMs}ms 후 재연결)`);
+        reconnectHintDelay = Number(data.retryAfterMs) || RECONNECT_DELAY;
+        return;
+      }
+
+      if (data.type === 'queued') {
+        console.log(`대기열 ${data.upstream}: ${data.position}번째`);
+        showToast(`요청이 많아 대기 중입니다 (${data.position}번째)`);
+        return;
+      }
+
+      if (data.type === 'signal' && data.signal === 'cancelled') {
+        // 턴 취소: 받은 부분까지만 저장하고 입력을 다시 받음
+        console.log("답변 취소됨");
+        hideTypingIndicator();
+        if (streamingChatId && chatManager.chats[streamingChatId] && streamingMessageIndex !== null) {
+          const chat = chatManager.chats[streamingChatId];
+          if (chat.messages[streamingMessageIndex]) {
+            chat.messages[streamingMessageIndex].content = currentBotElement?.innerText || chat.messages[streamingMessageIndex].content;
+            chatManager.saveToLocalStorage();
+          }
+        }
+        currentBotElement = null;
+        currentBotWrapper = null;
+        streamingChatId = null;
+        streamingMessageIndex = null;
+        isProcessing = false;
+        isBoldOpen = false;
+        updateInputControls();
+        return;
+      }
+
+      if (data.type === 'error') {
+        console.error("서버 오류:", data.code || '', data.message);
+        hideTypingIndicator();
+        showToast(data.message || '응답 생성 중 오류가 발생했습니다.');
+        currentBotElement = null;
+        currentBotWrapper = null;
+        streamingChatId = null;
+        streamingMessageIndex = null;
+        isProcessing = false;
+        isBoldOpen = false;
+        updateInputControls();
+        return;
+      }
+
       if (data.type === 'reference_complete') {
         console.log(`참조 완료: ${data.content}`);
         if (data.references && Array.isArray(data.references)) {
@@ -358,14 +471,7 @@ socket.onmessage = async (event) => {
     const { html, boldOpen } = parseMessage(trimmedData, true, isBoldOpen);
     isBoldOpen = boldOpen;
 
-    if (streamingChatId && chatManager.chats[streamingChatId]) {
-      const chatData = chatManager.chats[streamingChatId];
-      if (streamingMessageIndex === null) {
-        chatData.messages = chatData.messages || [];
-        chatData.messages.push({ role: 'bot', content: '', references: [] });
-        streamingMessageIndex = chatData.messages.length - 1;
-      }
-    }
+    appendStreamingMessage(trimmedData);
 
     if (streamingChatId === chatManager.currentChatId) {
       if (!currentBotElement) {
@@ -381,7 +487,19 @@ socket.onmessage = async (event) => {
   } catch (e) {
     console.error("WebSocket 메시지 처리 오류:", e);
   }
-};
+}
+
+// 스트리밍 중인 답변을 대화 기록에 누적 (턴의 첫 조각에서 기록 항목을 만든다)
+function appendStreamingMessage(chunk) {
+  if (!streamingChatId || !chatManager.chats[streamingChatId]) return;
+  const chatData = chatManager.chats[streamingChatId];
+  chatData.messages = chatData.messages || [];
+  if (streamingMessageIndex === null) {
+    chatData.messages.push({ role: 'bot', content: '', references: [] });
+    streamingMessageIndex = chatData.messages.length - 1;
+  }
+  chatData.messages[streamingMessageIndex].content += chunk;
+}
 
 // 스크롤 동기화 함수
 function setupScrollSync() {
@@ -654,6 +772,10 @@ input.addEventListener('keydown', function (e) {
       inputForm.dispatchEvent(new Event('submit'));
     }
   }
+  // 답변 중 Esc: 진행 중인 턴 취소
+  if (e.key === 'Escape' && isProcessing && socket && socket.readyState === WebSocket.OPEN) {
+    socket.send(JSON.stringify({ type: 'cancel' }));
+  }
 });
 
 // 폼 제출 이벤트
@@ -1131,11 +1253,17 @@ function processReferences() {
 function flushStreamingBotMessage() {
   if (currentBotElement && chatManager.currentChatId) {
     chatManager.chats[chatManager.currentChatId].messages = chatManager.chats[chatManager.currentChatId].messages || [];
-    chatManager.chats[chatManager.currentChatId].messages.push({
-      role: 'bot',
-      content: currentBotElement.innerText || '',
-      references: []
-    });
+    const streamed = chatManager.chats[chatManager.currentChatId].messages[streamingMessageIndex];
+    if (streamingChatId === chatManager.currentChatId && streamed) {
+      // 이미 기록된 스트리밍 항목은 화면에 보인 내용으로 갱신만 한다
+      streamed.content = currentBotElement.innerText || streamed.content;
+    } else {
+      chatManager.chats[chatManager.currentChatId].messages.push({
+        role: 'bot',
+        content: currentBotElement.innerText || '',
+        references: []
+      });
+    }
     chatManager.chats[chatManager.currentChatId].updatedAt = new Date().toISOString();
     chatManager.saveToLocalStorage();
     currentBotElement = null;
@@ -0,0 +1,146 @@
+"""
+정적 파일 메모리 서빙 (사전 압축 + 콘텐츠 해시 URL)
+
+시작 시 static 디렉터리의 파일을 한 번 읽어 메모리에 올리고, 요청마다 디스크나 템플릿 엔진을 거치지 않는다.
+
+- 각 파일의 gzip(+ brotli 패키지가 있으면 br) 압축본을 미리 만들어 Accept-Encoding에 맞춰 보낸다.
+- index.html 안의 /static/<파일> 참조는 /static/<이름>.<해시><확장자>로 바꾼다.
+  해시 URL은 내용이 바뀌면 URL도 바뀌므로 1년 immutable 캐시로 내보낸다.
+- 해시 없는 URL과 index.html은 ETag로 재검증(no-cache)하며, If-None-Match가 같으면 304를 보낸다.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 미설치 환경
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# 이보다 작거나 이미 압축된 형식이면 압축본을 만들지 않음
+MIN_COMPRESS_BYTES = 256
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+_STATIC_REF = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+
+class Asset:
+    __slots__ = ("body", "media_type", "etag", "encoded")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        # 인코딩 -> 압축본 (원본보다 작을 때만)
+        self.encoded: Dict[str, bytes] = {}
+        if len(body) < MIN_COMPRESS_BYTES or not media_type.startswith(COMPRESSIBLE):
+            return
+        candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates["br"] = brotli.compress(body, quality=11)
+        self.encoded = {name: data for name, data in candidates.items() if len(data) < len(body)}
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+
+class StaticAssets:
+    """static 디렉터리 메모리 캐시"""
+
+    def __init__(self, directory: Path, index: str = "index.html"):
+        self.directory = directory
+        self.index_name = index
+        # URL 경로(/static 뒤) -> (파일, 해시 URL 여부)
+        self._assets: Dict[str, tuple] = {}
+        # 원래 경로 -> 해시 경로
+        self.hashed: Dict[str, str] = {}
+        self.index: Optional[Asset] = None
+
+    def load(self) -> None:
+        self._assets.clear()
+        self.hashed.clear()
+        if not self.directory.is_dir():
+            logger.warning("⚠️ 정적 파일 디렉터리가 없습니다: %s", self.directory)
+            return
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.directory).as_posix()
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type == "application/javascript":
+                media_type += "; charset=utf-8"
+            asset = Asset(path.read_bytes(), media_type)
+            digest = asset.etag.strip('"')[:10]
+            hashed = str(Path(name).with_suffix(f".{digest}{path.suffix}").as_posix())
+            self._assets[name] = (asset, False)
+            self._assets[hashed] = (asset, True)
+            self.hashed[name] = hashed
+
+        index = self._assets.get(self.index_name)
+        if index is not None:
+            html = index[0].body.decode("utf-8")
+            html = _STATIC_REF.sub(
+                lambda m: f"{m.group(1)}/static/{self.hashed.get(m.group(2), m.group(2))}{m.group(1)}", html
+            )
+            self.index = Asset(html.encode("utf-8"), "text/html; charset=utf-8")
+        logger.info(
+            "📦 정적 파일 %d개 로드 (압축: %s)", len(self.hashed), "br, gzip" if brotli is not None else "gzip"
+        )
+
+    def url(self, name: str) -> str:
+        return "/static/" + self.hashed.get(name, name)
+
+    def response(self, request: Request, path: str) -> Response:
+        entry = self._assets.get(path)
+        if entry is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+        asset, immutable = entry
+        return self._respond(request, asset, IMMUTABLE if immutable else REVALIDATE)
+
+    def index_response(self, request: Request) -> Response:
+        if self.index is None:
+            return Response("index.html not found", status_code=404, media_type="text/plain")
+        return self._respond(request, self.index, REVALIDATE)
+
+    @staticmethod
+    def _respond(request: Request, asset: Asset, cache_control: str) -> Response:
+        body = asset.body
+        headers = {"ETag": asset.etag, "Cache-Control": cache_control}
+        if asset.encoded:
+            headers["Vary"] = "Accept-Encoding"
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding in ("br", "gzip"):
+            if encoding in asset.encoded and encoding in accepted:
+                body = asset.encoded[encoding]
+                headers["Content-Encoding"] = encoding
+                # 인코딩마다 바이트가 다르므로 강한 ETag도 구분
+                headers["ETag"] = f'{asset.etag[:-1]}-{encoding}"'
+                break
+
+        if_none_match = request.headers.get("if-none-match", "")
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or headers["ETag"] in tags:
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(body, headers=headers, media_type=asset.media_type)
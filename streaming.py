@@ -0,0 +1,95 @@
+"""
+스트리밍 응답 프레임 병합
+
+모델 토큰마다 WebSocket 프레임을 하나씩 보내면 send/JSON 인코딩/브라우저 리렌더링이 토큰 수만큼 발생한다.
+coalesce()는 조각들을 시간(window)·바이트(max_bytes) 창 단위로 묶어 프레임 수를 줄인다.
+
+- 첫 조각은 바로 내보낸다 (첫 토큰 지연 최소화).
+- 이후 조각은 window초 또는 max_bytes 바이트가 찰 때까지 모아서 내보낸다.
+- 소비 측(소켓 전송)이 느리면 그동안 쌓인 조각이 다음 프레임에 함께 묶이므로 자연스럽게 프레임이 커진다.
+"""
+import asyncio
+from typing import AsyncIterator
+
+import settings
+
+_DONE = object()
+
+
+async def coalesce(
+    source: AsyncIterator[str],
+    *,
+    window: float = settings.STREAM_FRAME_WINDOW,
+    max_bytes: int = settings.STREAM_FRAME_MAX_BYTES,
+) -> AsyncIterator[str]:
+    """
+    문자열 조각 스트림을 프레임 단위로 병합한다.
+
+    Args:
+        source: 문자열 조각을 내보내는 비동기 이터레이터
+        window: 한 프레임에 조각을 모으는 최대 시간(초)
+        max_bytes: 한 프레임의 최대 크기(UTF-8 바이트, 넘으면 즉시 전송)
+    Yields:
+        str: 병합된 프레임 내용
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async for piece in source:
+                if piece:
+                    queue.put_nowait(piece)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(_DONE)
+
+    task = asyncio.create_task(pump())
+    first = True
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+
+            if first:
+                first = False
+                yield item
+                continue
+
+            buffer = [item]
+            size = len(item.encode("utf-8"))
+            deadline = loop.time() + window
+            end = None
+            while size < max_bytes:
+                # 이미 도착한 조각은 기다리지 않고 바로 모은다
+                if queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is _DONE or isinstance(item, Exception):
+                    end = item
+                    break
+                buffer.append(item)
+                size += len(item.encode("utf-8"))
+
+            yield "".join(buffer)
+            if end is _DONE:
+                return
+            if end is not None:
+                raise end
+    finally:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
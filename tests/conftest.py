@@ -0,0 +1,48 @@
+"""
+테스트 공통 설정
+
+앱 모듈은 저장소 루트에 평평하게 놓여 있으므로 루트를 import 경로에 넣는다.
+settings는 import 시점에 환경 변수를 읽으므로, 테스트용 값(가짜 OpenAI 서버 주소 등)은 여기서 먼저 넣는다.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+FAKE_OPENAI_PORT = _free_port()
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_OPENAI_PORT}/v1"
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    """tests/fake_openai.py를 백그라운드 스레드의 uvicorn으로 띄우고 모듈을 돌려준다."""
+    import uvicorn
+
+    from tests import fake_openai as module
+
+    server = uvicorn.Server(uvicorn.Config(module.app, host="127.0.0.1", port=FAKE_OPENAI_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("가짜 OpenAI 서버가 시작되지 않았습니다")
+        time.sleep(0.01)
+    yield module
+    server.should_exit = True
+    thread.join(timeout=5)
@@ -0,0 +1,58 @@
+"""
+테스트용 OpenAI 호환 Chat Completions 스트림 서버
+
+conftest의 fake_openai 픽스처가 uvicorn으로 띄우고, OPENAI_BASE_URL이 이 서버를 가리킨다.
+"""
+import asyncio
+import json
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+PIECES = ["안녕", "하세요", ", 테스트 ", "답변입니다."]
+ANSWER = "".join(PIECES)
+PIECE_INTERVAL = 0.005
+
+# 받은 요청 본문 (테스트가 확인)
+REQUESTS = []
+
+
+def _chunk(model: str, delta: dict, finish_reason=None, usage=None) -> bytes:
+    data = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        data["usage"] = usage
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    REQUESTS.append(body)
+    model = body.get("model", "gpt-4o-mini")
+    if model == "error":
+        return JSONResponse({"error": {"message": "boom", "type": "server_error"}}, status_code=500)
+
+    async def generate():
+        for piece in PIECES:
+            yield _chunk(model, {"content": piece})
+            await asyncio.sleep(PIECE_INTERVAL)
+        yield _chunk(model, {}, "stop")
+        if body.get("stream_options", {}).get("include_usage"):
+            # 실제 API처럼 choices가 빈 마지막 청크에 사용량을 싣는다
+            usage = {"prompt_tokens": 120, "completion_tokens": len(PIECES), "prompt_tokens_details": {"cached_tokens": 64}}
+            data = json.loads(_chunk(model, {}, usage=usage)[len(b"data: "):])
+            data["choices"] = []
+            yield f"data: {json.dumps(data)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+app = Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from admission import FairLimiter, QueueFullError, QueueTimeoutError
+
+
+def test_acquires_immediately_under_concurrency():
+    async def main():
+        limiter = FairLimiter("test", concurrency=2, max_queue=0, max_wait=1)
+        await limiter.acquire("a")
+        await limiter.acquire("b")
+        assert limiter.active == 2
+        limiter.release()
+        limiter.release()
+        assert limiter.stats()["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_round_robin_between_users():
+    async def main():
+        limiter = FairLimiter("test", concurrency=1, max_queue=10, max_wait=5)
+        order = []
+
+        async def turn(key, tag):
+            async with limiter.slot(key):
+                order.append(tag)
+                await asyncio.sleep(0)
+
+        await limiter.acquire("holder")
+        tasks = [asyncio.create_task(turn("a", f"a{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(turn("b", "b0")))
+        await asyncio.sleep(0.01)
+        assert limiter.waiting == 4
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    # 사용자 a가 먼저 세 개를 넣어도 b의 요청이 a의 두 번째 요청보다 먼저 처리된다
+    assert asyncio.run(main()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_reports_queue_positions():
+    async def main():
+        limiter = FairLimiter("test", concurrency=1, max_queue=10, max_wait=5)
+        positions = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        await limiter.acquire("holder")
+        first = asyncio.create_task(limiter.acquire("a"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(limiter.acquire("b", on_queued))
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await first
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await second
+        limiter.release()
+        return positions
+
+    assert asyncio.run(main()) == [2, 1]
+
+
+def test_full_queue_fails_fast():
+    async def main():
+        limiter = FairLimiter("test", concurrency=1, max_queue=1, max_wait=5)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError):
+            await limiter.acquire("c")
+        assert limiter.rejected == 1
+        waiter.cancel()
+
+    asyncio.run(main())
+
+
+def test_wait_timeout():
+    async def main():
+        limiter = FairLimiter("test", concurrency=1, max_queue=5, max_wait=0.02)
+        await limiter.acquire("a")
+        with pytest.raises(QueueTimeoutError):
+            await limiter.acquire("b")
+        assert limiter.waiting == 0
+        assert limiter.timeouts == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue_and_slot_is_not_leaked():
+    async def main():
+        limiter = FairLimiter("test", concurrency=1, max_queue=5, max_wait=5)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.active == 0
+        # 취소된 대기자에게 자리가 넘어가지 않았으므로 바로 다시 받을 수 있다
+        await asyncio.wait_for(limiter.acquire("c"), 0.1)
+        assert limiter.active == 1
+
+    asyncio.run(main())
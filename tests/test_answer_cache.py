@@ -0,0 +1,39 @@
+from answer_cache import AnswerCache, config_version, normalize_question, references_fingerprint
+
+CHATBOT = {"instructionData": "지시", "trainingData": "학습", "gpt-model": "gpt-4o-mini", "temperature": 0.7}
+REFS = [{"source": "a.pdf", "content": "A"}, {"source": "b.pdf", "content": "B"}]
+
+
+def test_normalize_question():
+    assert normalize_question("  휴가는   며칠인가요?? ") == "휴가는 며칠인가요"
+    assert normalize_question("ＶＰＮ 접속!") == "vpn 접속"
+
+
+def test_config_version_tracks_answer_fields_only():
+    version = config_version(CHATBOT)
+    assert config_version(dict(CHATBOT, aiGreeting="다른 인사")) == version
+    assert config_version(dict(CHATBOT, trainingData="바뀐 학습")) != version
+
+
+def test_references_fingerprint_ignores_order():
+    assert references_fingerprint(REFS) == references_fingerprint(list(reversed(REFS)))
+    assert references_fingerprint(REFS) != references_fingerprint(REFS[:1])
+    assert references_fingerprint([]) == "-"
+
+
+def test_key_separates_engine_references_and_config():
+    cache = AnswerCache(enabled=True, maxsize=10, ttl=60)
+    key = cache.key("질문?", REFS, CHATBOT, "openai")
+    assert cache.key("질문", REFS, CHATBOT, "openai") == key
+    assert cache.key("질문", REFS, CHATBOT, "n8n") != key
+    assert cache.key("질문", REFS[:1], CHATBOT, "openai") != key
+    assert cache.key("질문", REFS, dict(CHATBOT, temperature=0.1), "openai") != key
+
+
+def test_put_get_skips_empty_answers():
+    cache = AnswerCache(enabled=True, maxsize=10, ttl=60)
+    cache.put("k", "답변", REFS)
+    cache.put("empty", "  ", [])
+    assert cache.get("k") == ("답변", REFS)
+    assert cache.get("empty") is None
+    assert cache.stores == 1
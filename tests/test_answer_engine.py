@@ -0,0 +1,184 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from openai import AsyncOpenAI
+
+import settings
+from answer_engine import (
+    ENGINE_N8N, ENGINE_OPENAI, UsageTracker, completion_params, create_openai_client, parse_usage, resolve_engine,
+    stream_openai_answer,
+)
+from resilience import DeadlineExceeded, set_deadline
+
+MESSAGES = [{"role": "system", "content": "지시"}, {"role": "user", "content": "질문입니다"}]
+
+
+async def _answer(client, model="gpt-4o-mini", **kwargs):
+    pieces = []
+    async for piece in stream_openai_answer(
+        client, model=model, messages=MESSAGES, temperature=0.5, max_tokens=100, **kwargs,
+    ):
+        pieces.append(piece)
+    return pieces
+
+
+def test_streams_text_from_base_url(fake_openai):
+    async def main():
+        client = create_openai_client()
+        try:
+            return await _answer(client)
+        finally:
+            await client.close()
+
+    calls = len(fake_openai.REQUESTS)
+    pieces = asyncio.run(main())
+    assert pieces == fake_openai.PIECES
+    # OPENAI_BASE_URL이 가짜 서버를 가리킨다
+    assert len(fake_openai.REQUESTS) == calls + 1
+    request = fake_openai.REQUESTS[-1]
+    assert request["stream"] is True
+    assert request["messages"] == MESSAGES
+    assert request["max_tokens"] == 100
+
+
+def test_stopping_early_closes_upstream_stream(fake_openai):
+    async def main():
+        client = create_openai_client()
+        try:
+            stream = stream_openai_answer(client, model="gpt-4o-mini", messages=MESSAGES, temperature=0.5, max_tokens=100)
+            first = await stream.__anext__()
+            await stream.aclose()
+            # 닫힌 뒤에도 같은 클라이언트로 다음 요청을 보낼 수 있어야 한다
+            rest = await _answer(client)
+        finally:
+            await client.close()
+        return first, rest
+
+    first, rest = asyncio.run(main())
+    assert first == fake_openai.PIECES[0]
+    assert rest == fake_openai.PIECES
+
+
+def test_cancelled_consumer_releases_stream(fake_openai):
+    async def main():
+        client = create_openai_client()
+        got_first = asyncio.Event()
+
+        async def consume():
+            async for _ in stream_openai_answer(client, model="gpt-4o-mini", messages=MESSAGES, temperature=0.5, max_tokens=100):
+                got_first.set()
+                await asyncio.sleep(1)
+
+        try:
+            task = asyncio.create_task(consume())
+            await asyncio.wait_for(got_first.wait(), 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await _answer(client)
+        finally:
+            await client.close()
+
+    assert asyncio.run(main()) == fake_openai.PIECES
+
+
+def test_upstream_error_is_raised(fake_openai):
+    async def main():
+        client = AsyncOpenAI(api_key="test", base_url=settings.OPENAI_BASE_URL, max_retries=0)
+        try:
+            await _answer(client, model="error")
+        finally:
+            await client.close()
+
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(main())
+
+
+def test_connection_error_is_raised():
+    async def main():
+        # 아무도 듣지 않는 포트
+        client = AsyncOpenAI(api_key="test", base_url="http://127.0.0.1:9/v1", max_retries=0)
+        try:
+            await _answer(client)
+        finally:
+            await client.close()
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(main())
+
+
+def test_completion_params_for_gpt5():
+    assert completion_params("gpt-5-mini", 0.3, 500) == {"temperature": 1.0, "max_completion_tokens": 500}
+    assert completion_params("gpt-4o", 0.3, 500) == {"temperature": 0.3, "max_tokens": 500}
+
+
+def test_resolve_engine_prefers_chatbot_setting():
+    assert resolve_engine({"answer-engine": "OpenAI"}) == ENGINE_OPENAI
+    assert resolve_engine({"answer-engine": "n8n"}) == ENGINE_N8N
+    assert resolve_engine({"answer-engine": "unknown"}) == settings.ANSWER_ENGINE
+    assert resolve_engine({}) == settings.ANSWER_ENGINE
+
+
+def test_expired_deadline_skips_call():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    async def main():
+        client = AsyncOpenAI(
+            api_key="test", base_url="http://openai.test/v1", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        set_deadline(0.0001)
+        await asyncio.sleep(0.01)
+        try:
+            await _answer(client)
+        finally:
+            await client.close()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert calls == []
+
+
+def test_stream_usage_is_requested_and_collected(fake_openai, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_STREAM_USAGE", True)
+
+    async def main():
+        client = create_openai_client()
+        usage = {}
+        try:
+            pieces = await _answer(client, usage=usage)
+        finally:
+            await client.close()
+        return pieces, usage
+
+    pieces, usage = asyncio.run(main())
+    assert pieces == fake_openai.PIECES
+    assert fake_openai.REQUESTS[-1]["stream_options"] == {"include_usage": True}
+    assert usage == {"prompt_tokens": 120, "cached_tokens": 64, "completion_tokens": len(fake_openai.PIECES)}
+
+
+def test_parse_usage_accepts_dict_and_missing_details():
+    assert parse_usage({"prompt_tokens": 10, "completion_tokens": 3, "prompt_tokens_details": {"cached_tokens": 8}}) == {
+        "prompt_tokens": 10, "cached_tokens": 8, "completion_tokens": 3,
+    }
+    assert parse_usage({"prompt_tokens": 1}) == {"prompt_tokens": 1, "cached_tokens": 0, "completion_tokens": 0}
+
+
+def test_usage_tracker_reports_cached_ratio_per_version():
+    tracker = UsageTracker(max_versions=2)
+    tracker.record("v1", "cache", {"prompt_tokens": 100, "cached_tokens": 80, "completion_tokens": 5}, 0.2)
+    tracker.record("v1", "cache", {"prompt_tokens": 100, "cached_tokens": 0, "completion_tokens": 5}, None)
+    [stats] = tracker.stats()
+    assert stats["turns"] == 2
+    assert stats["uncached_tokens"] == 120
+    assert stats["cached_ratio"] == 0.4
+    assert stats["avg_ttft_ms"] == 200.0
+    tracker.record("v2", "cache", {}, None)
+    tracker.record("v3", "cache", {}, None)
+    assert [s["config_version"] for s in tracker.stats()] == ["v2", "v3"]
@@ -0,0 +1,385 @@
+"""/chat 수집과 /ws 턴 처리 (n8n은 httpx.MockTransport, OpenAI는 tests/fake_openai.py)"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app as app_module
+import metrics
+import settings
+from admission import FairLimiter
+from answer_cache import AnswerCache
+from answer_engine import create_openai_client
+from cache import StaleWhileRevalidate
+from drain import ConnectionDrainer
+from log_shipper import LogShipper
+from n8n_client import n8n
+from reference_store import SHARED_SESSION
+from resilience import CircuitBreaker
+from sessions import SessionRegistry
+from state import MemoryStateBackend
+
+CHATBOT = {"aiGreeting": "테스트 인사", "trainingData": "", "instructionData": "", "gpt-model": "gpt-4o-mini"}
+
+
+class FakeN8N:
+    """경로별로 응답을 바꿀 수 있는 가짜 n8n 웹훅"""
+
+    def __init__(self):
+        self.config = dict(CHATBOT)
+        self.chat = lambda body: httpx.Response(200, json={"response": "n8n 답변"})
+        self.calls = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content) if request.content else {}
+        self.calls.append((request.url.path, body))
+        if request.url.path == settings.N8N_PROMPT_PATH:
+            return httpx.Response(200, json=[self.config])
+        if request.url.path == settings.N8N_CHAT_PATH:
+            return self.chat(body)
+        return httpx.Response(200, json={})
+
+    def paths(self, path):
+        return [body for called, body in self.calls if called == path]
+
+    def logs(self):
+        """로깅 웹훅으로 받은 레코드 (배치 전송이면 펼친다)"""
+        records = []
+        for body in self.paths(settings.N8N_LOG_PATH):
+            records.extend(body if isinstance(body, list) else [body])
+        return records
+
+
+@pytest.fixture
+def fake_n8n(monkeypatch, tmp_path):
+    fake = FakeN8N()
+    n8n._client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(fake.handler))
+    monkeypatch.setattr(n8n, "breakers", {name: CircuitBreaker(name) for name in n8n.breakers})
+    # 테스트마다 챗봇 설정을 새로 읽도록 캐시를 바꿔 끼운다
+    monkeypatch.setattr(app_module, "chatbot_config", StaleWhileRevalidate(
+        app_module.load_chatbot_prompt, ttl=60, fallback=lambda: dict(app_module.DEFAULT_CHATBOT_PROMPT), name="chatbot-config",
+    ))
+    monkeypatch.setattr(app_module, "state", MemoryStateBackend())
+    # TestClient마다 이벤트 루프가 달라지므로 커넥션 풀도 테스트마다 새로 만든다
+    monkeypatch.setattr(app_module, "client", create_openai_client())
+    monkeypatch.setattr(app_module, "log_shipper", LogShipper(app_module.send_log_batch, spill_path=str(tmp_path / "spill.jsonl")))
+    # 앞선 TestClient 종료(lifespan)가 정리 상태로 바꿔 두므로 새로 만든다
+    monkeypatch.setattr(app_module, "drainer", ConnectionDrainer())
+    monkeypatch.setattr(app_module, "sessions", SessionRegistry())
+    return fake
+
+
+@pytest.fixture
+def client(fake_n8n):
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def _ndjson(*pieces):
+    body = "".join(json.dumps({"type": "item", "content": piece}, ensure_ascii=False) + "\n" for piece in pieces)
+    return httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=body.encode())
+
+
+def _turn(ws, chat_input, uuid="u1"):
+    ws.send_text(json.dumps({"chatInput": chat_input, "uuid": uuid}))
+
+
+def _receive_until_done(ws):
+    frames = []
+    while True:
+        frame = ws.receive_json()
+        frames.append(frame)
+        if isinstance(frame, dict) and frame.get("type") in ("signal", "error"):
+            return frames
+
+
+def test_format_references_matches_prompt_format():
+    references = [{"title": "a.pdf", "content": "요약"}, {}]
+    assert app_module.format_references(references) == "\n\n[문서1] a.pdf\n내용: 요약\n\n[문서2] 문서 2\n내용: 내용 없음"
+    assert app_module.format_references([]) == ""
+
+
+def test_chat_stores_references_per_session(client):
+    response = client.post("/chat?uuid=u1", json=[{"source": "docs/a.pdf", "summary": "요약"}])
+    assert response.json()["uuid"] == "u1"
+    assert client.post("/chat", json={"uuid": "u2", "documents": [{"source": "b.pdf"}]}).json()["uuid"] == "u2"
+
+
+def test_chat_accepts_ndjson_upload(client):
+    body = b'{"uuid": "u1"}\n{"source": "docs/a.pdf", "summary": "one"}\n{"source": "a.pdf"}\n'
+    response = client.post("/chat", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.json() == {"status": "1개의 참조 데이터가 저장되었습니다.", "uuid": "u1", "stored": 1}
+
+
+def test_chat_rejects_invalid_body(client):
+    response = client.post("/chat", content=b"{", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_n8n_json_answer_and_references(client, fake_n8n):
+    client.post("/chat?uuid=u1", json=[{"source": "a.pdf", "summary": "요약"}])
+    fake_n8n.chat = lambda body: httpx.Response(200, json={"response": f"답: {body['chatInput']}"})
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["message"] == "테스트 인사"
+        _turn(ws, "질문")
+        assert ws.receive_json() == "답: 질문"
+        references = ws.receive_json()
+        assert references["type"] == "references"
+        assert references["content"] == [{"title": "a.pdf", "content": "요약", "source": "a.pdf"}]
+    assert fake_n8n.paths(settings.N8N_CHAT_PATH) == [{"chatInput": "질문", "uuid": "u1"}]
+
+
+def test_n8n_stream_is_relayed_as_text_frames(client, fake_n8n):
+    client.post("/chat?uuid=u1", json=[{"source": "a.pdf", "summary": "요약"}])
+    fake_n8n.chat = lambda body: _ndjson("스트림 ", "답변")
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        frames = _receive_until_done(ws)
+    text = "".join(f["content"] for f in frames if f["type"] == "text")
+    assert text == "스트림 답변"
+    assert frames[-1]["signal"] == "done"
+    assert [f["count"] for f in frames if f["type"] == "references"] == [1]
+
+
+def test_references_do_not_leak_between_sessions(client, fake_n8n):
+    client.post("/chat?uuid=other", json=[{"source": "secret.pdf", "summary": "남의 문서"}])
+    fake_n8n.chat = lambda body: _ndjson("답변")
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문", uuid="u1")
+        frames = _receive_until_done(ws)
+    assert frames[-1]["references"] == []
+
+
+def test_shared_session_references_need_explicit_fallback(client, fake_n8n, monkeypatch):
+    fake_n8n.chat = lambda body: _ndjson("답변")
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        # uuid 없이 들어온 문서는 기본값에서는 아무에게도 전달되지 않는다
+        assert client.post("/chat", json=[{"source": "a.pdf", "summary": "요약"}]).json()["uuid"] == SHARED_SESSION
+        _turn(ws, "질문", uuid="u1")
+        assert _receive_until_done(ws)[-1]["references"] == []
+
+        monkeypatch.setattr(settings, "REFERENCE_SHARED_FALLBACK", True)
+        _turn(ws, "질문", uuid="u1")
+        assert [ref["source"] for ref in _receive_until_done(ws)[-1]["references"]] == ["a.pdf"]
+
+
+def test_n8n_failure_sends_error_frame(client, fake_n8n):
+    fake_n8n.chat = lambda body: httpx.Response(500)
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        frame = ws.receive_json()
+    assert frame["type"] == "error"
+    assert "통신" in frame["message"]
+
+
+def test_n8n_stream_error_event_sends_error_frame(client, fake_n8n):
+    stream = '{"type": "item", "content": "부분"}\n{"type": "error", "content": "워크플로우 실패"}\n'
+    fake_n8n.chat = lambda body: httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=stream.encode())
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        frames = _receive_until_done(ws)
+    # 다른 n8n 통신 오류와 같은 안내를 보낸다
+    assert frames[-1] == {"type": "error", "message": "서버와의 통신 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.", "turn": 1}
+
+
+def test_open_circuit_fails_fast_with_error_frame(client, fake_n8n):
+    n8n.breakers["chat"] = CircuitBreaker("chat", failures=1, reset_after=60)
+    fake_n8n.chat = lambda body: httpx.Response(500)
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        first = ws.receive_json()
+        _turn(ws, "다시 질문")
+        second = ws.receive_json()
+    assert first["type"] == second["type"] == "error"
+    # 서킷이 열린 뒤에는 n8n을 호출하지 않는다
+    assert len(fake_n8n.paths(settings.N8N_CHAT_PATH)) == 1
+
+
+def test_invalid_json_sends_error_frame(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_text("not json")
+        assert ws.receive_json() == {"type": "error", "message": "잘못된 요청 형식입니다."}
+        ws.send_text("[1, 2]")
+        assert ws.receive_json() == {"type": "error", "message": "잘못된 요청 형식입니다."}
+
+
+def test_queued_turns_are_capped_per_connection(client, fake_n8n, monkeypatch):
+    monkeypatch.setattr(settings, "WS_PIPELINE_MAX_TURNS", 1)
+
+    async def slow_stream():
+        yield json.dumps({"type": "item", "content": "첫 조각"}).encode() + b"\n"
+        await asyncio.sleep(10)
+
+    fake_n8n.chat = lambda body: httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=slow_stream())
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        assert ws.receive_json()["turn"] == 1
+        # 순차 모드에서도 진행 중 + 대기 중인 턴 수를 넘으면 바로 거절
+        _turn(ws, "다음 질문")
+        assert ws.receive_json()["code"] == "busy"
+        ws.send_text(json.dumps({"type": "cancel"}))
+        assert ws.receive_json() == {"type": "signal", "signal": "cancelled", "turn": 1}
+
+
+def test_openai_engine_streams_from_base_url(fake_n8n, fake_openai):
+    # 챗봇 설정은 lifespan 시작 시 읽으므로 클라이언트를 만들기 전에 바꾼다
+    fake_n8n.config["answer-engine"] = "openai"
+    with TestClient(app_module.app) as client:
+        client.post("/chat?uuid=u1", json=[{"source": "a.pdf", "summary": "요약"}])
+        with client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            _turn(ws, "질문")
+            frames = _receive_until_done(ws)
+    assert "".join(f["content"] for f in frames if f["type"] == "text") == fake_openai.ANSWER
+    assert frames[-1] == {"type": "signal", "signal": "done", "turn": 1, "references": [{"title": "a.pdf", "content": "요약", "source": "a.pdf"}]}
+    messages = fake_openai.REQUESTS[-1]["messages"]
+    assert "질문" in messages[1]["content"] and "요약" in messages[1]["content"]
+    # 로그는 종료 시 남은 큐까지 전송된다
+    [record] = fake_n8n.logs()
+    assert (record["uuid"], record["type"], record["message"]) == ("u1", "bot", fake_openai.ANSWER)
+    # 기본값(LOG_BATCH_SIZE=1)은 기존 워크플로우처럼 레코드 하나를 객체로 보낸다
+    assert fake_n8n.paths(settings.N8N_LOG_PATH) == [record]
+
+
+def test_rejected_openai_turn_keeps_session_references(fake_n8n, fake_openai, monkeypatch):
+    monkeypatch.setitem(app_module.limiters, "openai", FairLimiter("openai", concurrency=0, max_queue=0, max_wait=0))
+    fake_n8n.config["answer-engine"] = "openai"
+    with TestClient(app_module.app) as client:
+        client.post("/chat?uuid=u1", json=[{"source": "a.pdf", "summary": "요약"}])
+        with client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            _turn(ws, "질문")
+            frame = ws.receive_json()
+    assert frame["code"] == "busy"
+    # 대기열에서 거절된 턴은 참조 문서를 가져가지 않는다
+    assert len(asyncio.run(app_module.state.get_references("u1"))) == 1
+
+
+def test_repeated_question_is_replayed_from_answer_cache(fake_n8n, fake_openai, monkeypatch):
+    monkeypatch.setattr(app_module, "answer_cache", AnswerCache(enabled=True, maxsize=10, ttl=60))
+    fake_n8n.config["answer-engine"] = "openai"
+    with TestClient(app_module.app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            answers = []
+            for chat_input in ("휴가는 며칠?", "휴가는  며칠"):
+                _turn(ws, chat_input)
+                frames = _receive_until_done(ws)
+                answers.append("".join(f["content"] for f in frames if f["type"] == "text"))
+    assert answers == [fake_openai.ANSWER] * 2
+    asked = [r for r in fake_openai.REQUESTS if "휴가" in r["messages"][-1]["content"]]
+    assert len(asked) == 1
+    # 캐시에서 재생한 답변도 로그로 남는다
+    logs = fake_n8n.logs()
+    assert [record["message"] for record in logs] == [fake_openai.ANSWER] * 2
+    assert [record.get("cached", False) for record in logs] == [False, True]
+
+
+def test_n8n_engine_does_not_use_answer_cache(client, fake_n8n, monkeypatch):
+    monkeypatch.setattr(app_module, "answer_cache", AnswerCache(enabled=True, maxsize=10, ttl=60))
+    fake_n8n.chat = lambda body: _ndjson("답변")
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        for _ in range(2):
+            _turn(ws, "휴가는 며칠?")
+            _receive_until_done(ws)
+    # n8n 답변의 참조 문서는 워크플로우 실행 중에 도착하므로 캐시하지 않는다
+    assert len(fake_n8n.paths(settings.N8N_CHAT_PATH)) == 2
+    assert app_module.answer_cache.stats()["size"] == 0
+
+
+def test_metrics_endpoint_counts_turns(client, fake_n8n):
+    fake_n8n.chat = lambda body: _ndjson("답변")
+    before = metrics.N8N_CHAT.count
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        _receive_until_done(ws)
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    assert metrics.N8N_CHAT.count == before + 1
+    assert f'n8ngpt_stage_duration_seconds_count{{stage="n8n_chat"}} {before + 1}' in response.text
+
+
+def test_index_and_static_assets_are_served_from_memory(client):
+    index = client.get("/")
+    assert index.headers["content-type"].startswith("text/html")
+    hashed = app_module.assets.url("app.js")
+    assert hashed in index.text
+    assert client.get(hashed).headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert client.get("/", headers={"if-none-match": index.headers["etag"]}).status_code == 304
+    assert client.get("/health").json()
+
+
+def test_ws_refuses_new_connections_while_draining(client, monkeypatch):
+    app_module.drainer.draining = True
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["type"] == "reconnect"
+        with pytest.raises(WebSocketDisconnect) as info:
+            ws.receive_json()
+    assert info.value.code == 1012
+
+
+def test_ws_resume_skips_greeting_and_keeps_turn_count(client, fake_n8n):
+    fake_n8n.chat = lambda body: _ndjson("답변")
+    with client.websocket_connect("/ws?uuid=u1") as ws:
+        greeting = ws.receive_json()
+        _turn(ws, "첫 질문")
+        _receive_until_done(ws)
+    with client.websocket_connect(f"/ws?uuid=u1&session={greeting['session']}") as ws:
+        assert ws.receive_json() == {"type": "resumed", "session": greeting["session"]}
+        ws.send_text('{"type": "ping"}')
+        assert ws.receive_json() == {"type": "pong"}
+    # 하트비트는 챗봇 설정 조회나 n8n 호출을 일으키지 않는다
+    assert len(fake_n8n.paths(settings.N8N_CHAT_PATH)) == 1
+    assert app_module.sessions.resume(greeting["session"], "u1").turn == 1
+
+
+def test_ws_unknown_session_token_starts_new_session(client):
+    with client.websocket_connect("/ws?session=unknown") as ws:
+        greeting = ws.receive_json()
+    assert greeting["type"] == "greeting"
+    assert greeting["session"] != "unknown"
+
+
+def test_ws_connection_cap_closes_with_1013(client, monkeypatch):
+    monkeypatch.setattr(app_module, "sessions", SessionRegistry(max_connections=1))
+    with client.websocket_connect("/ws") as first:
+        first.receive_json()
+        with client.websocket_connect("/ws") as second:
+            assert second.receive_json()["type"] == "error"
+            with pytest.raises(WebSocketDisconnect) as info:
+                second.receive_json()
+    assert info.value.code == 1013
+
+
+def test_ws_cancel_stops_streaming_turn(client, fake_n8n):
+    async def slow_stream():
+        yield json.dumps({"type": "item", "content": "첫 조각"}).encode() + b"\n"
+        await asyncio.sleep(10)
+        yield json.dumps({"type": "item", "content": "오지 않는 조각"}).encode() + b"\n"
+
+    fake_n8n.chat = lambda body: httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=slow_stream())
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        _turn(ws, "질문")
+        assert ws.receive_json() == {"type": "text", "content": "첫 조각", "turn": 1}
+        ws.send_text(json.dumps({"type": "cancel", "turn": 1}))
+        assert ws.receive_json() == {"type": "signal", "signal": "cancelled", "turn": 1}
+        # 취소 뒤에도 같은 연결로 다음 턴을 진행할 수 있다
+        fake_n8n.chat = lambda body: _ndjson("다음 답변")
+        _turn(ws, "다음 질문")
+        frames = _receive_until_done(ws)
+    assert frames[0] == {"type": "text", "content": "다음 답변", "turn": 2}
+    assert frames[-1]["signal"] == "done"
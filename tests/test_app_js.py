@@ -0,0 +1,124 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+APP_JS = Path(__file__).resolve().parent.parent / "static" / "app.js"
+NODE = shutil.which("node")
+
+# 최소한의 DOM/브라우저 대역을 깔고 app.js를 vm에서 돌린 뒤, 프레임을 차례로 넣고 대화 기록을 출력한다
+HARNESS = r"""
+const fs = require('fs');
+const vm = require('vm');
+const [appPath, framesJson] = process.argv.slice(1);
+
+class FakeElement {
+  constructor() {
+    this.innerHTML = '';
+    this.value = '';
+    this.children = [];
+    this.dataset = {};
+    this.style = {};
+    this.classList = { add() {}, remove() {}, toggle() {}, contains() { return false; } };
+    this.scrollHeight = 0;
+    this.scrollTop = 0;
+    this.clientHeight = 0;
+  }
+  get innerText() { return this.innerHTML.replace(/<br>/g, '\n').replace(/<[^>]*>/g, ''); }
+  appendChild(child) { this.children.push(child); return child; }
+  remove() {}
+  addEventListener() {}
+  removeEventListener() {}
+  querySelector() { return null; }
+  querySelectorAll() { return []; }
+  setAttribute() {}
+  focus() {}
+  scrollTo() {}
+}
+
+const elements = {};
+const storage = {};
+const document = {
+  getElementById(id) { return (elements[id] = elements[id] || new FakeElement()); },
+  createElement() { return new FakeElement(); },
+  querySelector() { return null; },
+  querySelectorAll() { return []; },
+  addEventListener() {},
+  body: new FakeElement(),
+};
+const context = {
+  document,
+  console: { log() {}, error() {}, warn() {} },
+  localStorage: {
+    getItem(key) { return key in storage ? storage[key] : null; },
+    setItem(key, value) { storage[key] = String(value); },
+    removeItem(key) { delete storage[key]; },
+  },
+  crypto: { randomUUID: () => 'test-uuid' },
+  setTimeout: () => 0,
+  clearTimeout() {},
+  setInterval: () => 0,
+  clearInterval() {},
+  Date, JSON, Object, Array, Number, String, Math, Promise,
+};
+context.window = context;
+context.window.addEventListener = () => {};
+vm.createContext(context);
+
+const source = fs.readFileSync(appPath, 'utf8') + `
+globalThis.__app = {
+  onSocketMessage,
+  chatManager,
+  startTurn() { streamingChatId = chatManager.currentChatId; streamingMessageIndex = null; },
+};`;
+vm.runInContext(source, context);
+
+(async () => {
+  const app = context.__app;
+  app.startTurn();
+  for (const frame of JSON.parse(framesJson)) {
+    await app.onSocketMessage({ data: typeof frame === 'string' ? frame : JSON.stringify(frame) });
+  }
+  const chat = app.chatManager.chats[app.chatManager.currentChatId];
+  const saved = JSON.parse(storage.chatSessions).chats[app.chatManager.currentChatId];
+  process.stdout.write(JSON.stringify({ messages: chat.messages, saved: saved.messages }));
+})();
+"""
+
+REFERENCES = {"type": "references", "count": 1, "content": [{"id": "r1", "title": "규정", "content": "본문"}]}
+
+
+def _run(frames):
+    result = subprocess.run(
+        [NODE, "-e", HARNESS, str(APP_JS), json.dumps(frames, ensure_ascii=False)],
+        capture_output=True,
+        text=True,
+        timeout=30,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+pytestmark = pytest.mark.skipif(NODE is None, reason="node가 없으면 app.js를 실행할 수 없다")
+
+
+def test_streamed_text_frames_end_up_in_history():
+    history = _run([
+        {"type": "text", "content": "안녕"},
+        {"type": "text", "content": "하세요"},
+        REFERENCES,
+        {"type": "signal", "signal": "done"},
+    ])
+    assert len(history["messages"]) == 1
+    message = history["messages"][0]
+    assert message["role"] == "bot"
+    assert message["content"] == "안녕하세요"
+    assert [ref["id"] for ref in message["references"]] == ["r1"]
+    assert history["saved"] == history["messages"]
+
+
+def test_bare_string_frames_still_end_up_in_history():
+    history = _run(["첫 조각", {"type": "signal", "signal": "done"}])
+    assert [message["content"] for message in history["messages"]] == ["첫 조각"]
@@ -0,0 +1,65 @@
+import contextvars
+import json
+import logging
+import queue
+
+import app_logging
+import settings
+from app_logging import JsonFormatter, _ContextFilter, _NonBlockingQueueHandler, begin_turn, truncate
+
+
+def _record(msg, *args, level=logging.INFO):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+def test_truncate():
+    assert truncate("짧은 글", 10) == "짧은 글"
+    assert truncate("가" * 12, 10) == "가" * 10 + "…(+2자)"
+    assert truncate(12345, 0) == "12345"
+
+
+def test_unsampled_turn_keeps_only_warnings(monkeypatch):
+    monkeypatch.setattr(settings, "APP_LOG_SAMPLE_RATE", 0.0)
+
+    def run():
+        assert begin_turn("abcdef123456", 3) == "abcdef12:3"
+        log_filter = _ContextFilter()
+        info, warning = _record("info"), _record("warn", level=logging.WARNING)
+        return log_filter.filter(info), log_filter.filter(warning), warning.cid
+
+    # 상관 ID와 샘플링 여부는 턴(컨텍스트)마다 따로 정해진다
+    assert contextvars.copy_context().run(run) == (False, True, "abcdef12:3")
+
+
+def test_sampled_turn_keeps_info(monkeypatch):
+    monkeypatch.setattr(settings, "APP_LOG_SAMPLE_RATE", 1.0)
+
+    def run():
+        begin_turn("u", 1)
+        return _ContextFilter().filter(_record("info"))
+
+    assert contextvars.copy_context().run(run)
+
+
+def test_queue_handler_drops_when_full_and_freezes_mutable_args():
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    items = ["a"]
+    handler.handle(_record("목록: %s", items))
+    items.append("b")
+    handler.handle(_record("두 번째"))
+    assert handler.dropped == 1
+    queued = handler.queue.get_nowait()
+    # 변할 수 있는 인자는 큐에 넣을 때 문자열로 고정한다
+    assert queued.getMessage() == "목록: ['a']"
+
+
+def test_json_formatter():
+    record = _record("값 %d", 7)
+    record.cid = "u:1"
+    entry = json.loads(JsonFormatter(max_chars=100).format(record))
+    assert (entry["level"], entry["cid"], entry["msg"]) == ("INFO", "u:1", "값 7")
+
+
+def test_dropped_count_without_setup(monkeypatch):
+    monkeypatch.setattr(app_logging, "_handler", None)
+    assert app_logging.dropped_count() == 0
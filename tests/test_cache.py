@@ -0,0 +1,204 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import MISSING, SingleFlight, StaleWhileRevalidate, TTLCache
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    ttl_cache = TTLCache(maxsize=10, ttl=5)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2, ttl=1)
+    assert ttl_cache.get("a") == 1
+    now[0] += 2
+    assert ttl_cache.get("b") is MISSING
+    assert ttl_cache.get("a") == 1
+    now[0] += 5
+    assert ttl_cache.get("a") is MISSING
+    assert len(ttl_cache) == 0
+    assert (ttl_cache.hits, ttl_cache.misses) == (2, 2)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is MISSING
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def test_ttl_cache_stores_none_and_skips_zero_ttl():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("none", None)
+    assert ttl_cache.get("none") is None
+    ttl_cache.set("none", "x", ttl=0)
+    assert ttl_cache.get("none") is MISSING
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["value"] * 5
+    assert calls == [1]
+    assert not flight.inflight("key")
+
+
+def test_single_flight_shares_errors_and_retries_afterwards():
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flight.do("key", fail)
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+
+
+def test_single_flight_survives_cancelled_waiter():
+    async def load():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.do("key", load))
+        second = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "value"
+
+
+class Loader:
+    """호출 횟수를 세고, values를 차례로 돌려주거나 예외를 올리는 가짜 로더"""
+
+    def __init__(self, *values, delay=0.0):
+        self.values = list(values)
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_concurrent_first_gets_share_one_load():
+    loader = Loader("v1", delay=0.01)
+
+    async def main():
+        swr = StaleWhileRevalidate(loader, ttl=60)
+        return await asyncio.gather(*(swr.get() for _ in range(5)))
+
+    assert asyncio.run(main()) == ["v1"] * 5
+    assert loader.calls == 1
+
+
+def test_stale_value_is_served_while_refreshing(monkeypatch):
+    now = [100.0]
+    # 이벤트 루프 시계는 그대로 두고 캐시가 보는 시각만 바꾼다
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    loader = Loader("v1", "v2", delay=0.01)
+
+    async def main():
+        swr = StaleWhileRevalidate(loader, ttl=5)
+        assert await swr.get() == "v1"
+        now[0] += 1
+        assert await swr.get() == "v1"
+        assert loader.calls == 1
+        now[0] += 5
+        # 만료되면 이전 값을 바로 돌려주고 갱신은 한 번만 백그라운드에서
+        stale = [await swr.get(), await swr.get()]
+        await asyncio.sleep(0.05)
+        return stale, await swr.get()
+
+    stale, fresh = asyncio.run(main())
+    assert stale == ["v1", "v1"]
+    assert fresh == "v2"
+    assert loader.calls == 2
+
+
+def test_failed_refresh_keeps_last_good_value():
+    loader = Loader("v1", RuntimeError("n8n down"))
+
+    async def main():
+        swr = StaleWhileRevalidate(loader, ttl=60)
+        await swr.get()
+        swr.invalidate()
+        await asyncio.sleep(0.01)
+        return await swr.get()
+
+    assert asyncio.run(main()) == "v1"
+    assert loader.calls == 2
+
+
+def test_fallback_until_retry_after():
+    loader = Loader(RuntimeError("n8n down"), "v1")
+
+    async def main():
+        swr = StaleWhileRevalidate(loader, ttl=60, fallback=lambda: "default", retry_after=0.05)
+        first = await swr.get()
+        # retry_after 동안은 로더를 다시 부르지 않는다
+        second = await swr.get()
+        calls = loader.calls
+        await asyncio.sleep(0.06)
+        return first, second, calls, await swr.get()
+
+    assert asyncio.run(main()) == ("default", "default", 1, "v1")
+
+
+def test_failure_without_fallback_raises():
+    async def main():
+        swr = StaleWhileRevalidate(Loader(RuntimeError("n8n down")), ttl=60)
+        await swr.get()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+
+
+def test_periodic_refresh_and_stop():
+    loader = Loader("v1", "v2", "v3", "v4")
+
+    async def main():
+        swr = StaleWhileRevalidate(loader, ttl=60)
+        swr.start(interval=0.1)
+        await asyncio.sleep(0.15)
+        await swr.stop()
+        calls = loader.calls
+        await asyncio.sleep(0.1)
+        return await swr.get(), calls
+
+    value, calls = asyncio.run(main())
+    assert calls == 2
+    assert value == "v2"
+    assert loader.calls == 2
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from download_links import DownloadLinkResolver, signed_url_expiry
+from n8n_client import n8n
+from resilience import CircuitBreaker
+
+
+def test_s3_and_gcs_v4_expiry():
+    start = 1704067200  # 2024-01-01T00:00:00Z
+    assert signed_url_expiry("https://b.s3.amazonaws.com/a.pdf?X-Amz-Date=20240101T000000Z&X-Amz-Expires=600") == start + 600
+    assert signed_url_expiry("https://storage.googleapis.com/a.pdf?x-goog-date=20240101T000000Z&x-goog-expires=60") == start + 60
+
+
+def test_epoch_and_sas_expiry():
+    assert signed_url_expiry("https://cdn.example.com/a.pdf?Expires=1704067200&Signature=x") == 1704067200
+    assert signed_url_expiry("https://x.blob.core.windows.net/a.pdf?sv=1&se=2024-01-01T00:00:00Z") == 1704067200
+
+
+def test_unsigned_or_malformed_urls_have_no_expiry():
+    assert signed_url_expiry("https://example.com/a.pdf") is None
+    assert signed_url_expiry("https://example.com/a.pdf?X-Amz-Date=bad&X-Amz-Expires=600") is None
+    assert signed_url_expiry("https://example.com/a.pdf?X-Amz-Date=20240101T000000Z&X-Amz-Expires=soon") is None
+
+
+@pytest.fixture
+def search_pdf(monkeypatch):
+    """search-pdf 웹훅 응답을 테스트가 정하는 가짜 n8n (호출된 파일명을 기록)"""
+    calls = []
+    responses = {}
+
+    async def handler(request):
+        filename = httpx.Response(200, content=request.content).json()["filename"]
+        calls.append(filename)
+        await asyncio.sleep(0.01)
+        return responses.get(filename, httpx.Response(200, json={"download_url": f"https://files.test/{filename}"}))
+
+    n8n._client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(handler))
+    # 재시도와 앞선 테스트의 서킷 상태 없이 호출 횟수만 본다
+    monkeypatch.setattr(n8n, "retry_attempts", 1)
+    monkeypatch.setattr(n8n, "breakers", {name: CircuitBreaker(name) for name in n8n.breakers})
+    return calls, responses
+
+
+def test_concurrent_lookups_share_one_call(search_pdf):
+    calls, _ = search_pdf
+
+    async def main():
+        resolver = DownloadLinkResolver(maxsize=10, ttl=60, negative_ttl=5, expiry_margin=30)
+        urls = await asyncio.gather(*(resolver.resolve("a.pdf") for _ in range(5)))
+        return urls + [await resolver.resolve("a.pdf")]
+
+    assert asyncio.run(main()) == ["https://files.test/a.pdf"] * 6
+    assert calls == ["a.pdf"]
+
+
+def test_missing_link_is_cached_briefly(search_pdf):
+    calls, responses = search_pdf
+    responses["none.pdf"] = httpx.Response(200, json={})
+
+    async def main():
+        resolver = DownloadLinkResolver(maxsize=10, ttl=60, negative_ttl=0.05, expiry_margin=30)
+        first = await resolver.resolve("none.pdf")
+        second = await resolver.resolve("none.pdf")
+        await asyncio.sleep(0.1)
+        await resolver.resolve("none.pdf")
+        return first, second
+
+    assert asyncio.run(main()) == (None, None)
+    assert calls == ["none.pdf", "none.pdf"]
+
+
+def test_link_expiring_soon_is_not_cached(search_pdf):
+    calls, responses = search_pdf
+    soon = int(time.time()) + 10
+    responses["soon.pdf"] = httpx.Response(200, json={"download_url": f"https://cdn.test/soon.pdf?Expires={soon}"})
+
+    async def main():
+        resolver = DownloadLinkResolver(maxsize=10, ttl=60, negative_ttl=5, expiry_margin=30)
+        await resolver.resolve("soon.pdf")
+        await resolver.resolve("soon.pdf")
+
+    asyncio.run(main())
+    # 서명 만료까지 남은 시간이 여유(30초)보다 짧으므로 캐시하지 않는다
+    assert calls == ["soon.pdf", "soon.pdf"]
+
+
+def test_upstream_errors_are_not_cached(search_pdf):
+    calls, responses = search_pdf
+    responses["err.pdf"] = httpx.Response(500)
+
+    async def main():
+        resolver = DownloadLinkResolver(maxsize=10, ttl=60, negative_ttl=5, expiry_margin=30)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await resolver.resolve("err.pdf")
+
+    asyncio.run(main())
+    assert calls == ["err.pdf", "err.pdf"]
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from drain import CLOSE_SERVICE_RESTART, ConnectionDrainer
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+def test_idle_connections_are_closed_immediately():
+    async def main():
+        drainer = ConnectionDrainer(timeout=1.0, retry_after_ms=500)
+        websocket = FakeWebSocket()
+        drainer.register(websocket)
+        await drainer.drain()
+        return drainer, websocket
+
+    drainer, websocket = asyncio.run(main())
+    assert drainer.draining
+    assert websocket.sent == [{"type": "reconnect", "reason": "shutdown", "retryAfterMs": 500}]
+    assert websocket.closed == CLOSE_SERVICE_RESTART
+
+
+def test_busy_connection_is_closed_after_its_last_turn():
+    async def main():
+        drainer = ConnectionDrainer(timeout=1.0)
+        busy, idle = FakeWebSocket(), FakeWebSocket()
+        drainer.register(busy)
+        drainer.register(idle)
+        # 파이프라인 모드: 한 연결에 턴 두 개
+        drainer.begin_turn(busy)
+        drainer.begin_turn(busy)
+        task = asyncio.create_task(drainer.drain())
+        await asyncio.sleep(0.05)
+        drainer.end_turn(busy)
+        await asyncio.sleep(0.01)
+        waiting = not task.done() and busy.closed is None
+        drainer.end_turn(busy)
+        await asyncio.wait_for(task, 1.0)
+        await asyncio.sleep(0)
+        return waiting, busy, idle
+
+    waiting, busy, idle = asyncio.run(main())
+    assert waiting
+    assert busy.sent[0]["type"] == "reconnect"
+    assert busy.closed == CLOSE_SERVICE_RESTART
+    assert idle.closed == CLOSE_SERVICE_RESTART
+
+
+def test_drain_gives_up_after_timeout():
+    async def main():
+        drainer = ConnectionDrainer(timeout=0.05)
+        websocket = FakeWebSocket()
+        drainer.register(websocket)
+        drainer.begin_turn(websocket)
+        await asyncio.wait_for(drainer.drain(), 1.0)
+        return drainer
+
+    assert asyncio.run(main()).busy == 1
+
+
+def test_unregister_during_turn_releases_drain():
+    async def main():
+        drainer = ConnectionDrainer(timeout=1.0)
+        websocket = FakeWebSocket()
+        drainer.register(websocket)
+        drainer.begin_turn(websocket)
+        task = asyncio.create_task(drainer.drain())
+        await asyncio.sleep(0)
+        drainer.unregister(websocket)
+        await asyncio.wait_for(task, 1.0)
+        return drainer
+
+    assert asyncio.run(main()).busy == 0
+
+
+def test_end_turn_outside_drain_keeps_connection():
+    async def main():
+        drainer = ConnectionDrainer(timeout=1.0)
+        websocket = FakeWebSocket()
+        drainer.register(websocket)
+        drainer.begin_turn(websocket)
+        drainer.end_turn(websocket)
+        # 짝이 맞지 않는 end_turn은 무시
+        drainer.end_turn(websocket)
+        await asyncio.sleep(0)
+        return drainer, websocket
+
+    drainer, websocket = asyncio.run(main())
+    assert drainer.busy == 0
+    assert websocket.closed is None
@@ -0,0 +1,64 @@
+import contextvars
+import json
+
+import frames
+from frames import EncodedFrame, ReferenceFrames, encode_frame
+
+REFERENCES = [{"title": "휴가 규정", "content": "연차는 \"15일\"", "source": "휴가.pdf"}]
+
+
+def test_encode_frame_is_compact_utf8_json():
+    encoded = encode_frame({"type": "text", "content": "안녕"})
+    assert encoded == '{"type":"text","content":"안녕"}'
+    assert encode_frame("문자열") == '"문자열"'
+
+
+def test_encoded_frame_is_not_encoded_again():
+    frame = EncodedFrame('{"already":true}')
+    assert encode_frame(frame) is frame
+
+
+def test_reference_frames_match_regular_encoding():
+    references = ReferenceFrames(REFERENCES)
+    assert json.loads(references.references_frame()) == {"type": "references", "content": REFERENCES, "count": 1}
+    assert json.loads(references.done_frame()) == {"type": "signal", "signal": "done", "references": REFERENCES}
+    assert len(references) == 1 and references
+
+
+def test_empty_reference_frames():
+    references = ReferenceFrames([])
+    assert not references
+    assert json.loads(references.done_frame())["references"] == []
+
+
+def test_fallback_encoder_matches(monkeypatch):
+    expected = encode_frame({"type": "references", "content": REFERENCES})
+    monkeypatch.setattr(frames, "dumps_bytes", lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode())
+    assert encode_frame({"type": "references", "content": REFERENCES}) == expected
+
+
+def test_frames_sent_from_a_turn_carry_its_id():
+    def in_turn():
+        frames.current_turn.set(3)
+        return (
+            encode_frame({"type": "text", "content": "가"}),
+            encode_frame("문자열 답변"),
+            ReferenceFrames(REFERENCES).done_frame(),
+        )
+
+    text, plain, done = contextvars.copy_context().run(in_turn)
+    assert json.loads(text) == {"type": "text", "content": "가", "turn": 3}
+    # 순차 모드에서는 문자열 답변을 그대로 보낸다
+    assert json.loads(plain) == "문자열 답변"
+    assert json.loads(done) == {"type": "signal", "signal": "done", "turn": 3, "references": REFERENCES}
+    # 턴 밖에서는 turn이 붙지 않는다
+    assert "turn" not in json.loads(encode_frame({"type": "pong"}))
+
+
+def test_pipelined_string_answer_becomes_text_frame():
+    def in_turn():
+        frames.current_turn.set(2)
+        frames.pipelined.set(True)
+        return encode_frame("답변")
+
+    assert json.loads(contextvars.copy_context().run(in_turn)) == {"type": "text", "content": "답변", "turn": 2}
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from ingest import DocumentCollector, IngestError, iter_ndjson_documents, parse_json_body
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _run(*chunks, collector=None, max_bytes=1_000_000):
+    collector = collector or DocumentCollector()
+
+    async def main():
+        return [batch async for batch in iter_ndjson_documents(_chunks(*chunks), collector, max_bytes=max_bytes)]
+
+    return asyncio.run(main()), collector
+
+
+def test_ndjson_lines_split_across_chunks():
+    batches, collector = _run(
+        b'{"uuid": "s1"}\n{"source": "a/1.pdf", "sum',
+        b'mary": "one"}\n{"source": "2.pdf", "summary": "two"}',
+    )
+    assert batches == [[{"source": "1.pdf", "summary": "one"}], [{"source": "2.pdf", "summary": "two"}]]
+    assert collector.session_id == "s1"
+
+
+def test_json_seq_record_separators():
+    batches, _ = _run(b'\x1e{"source": "1.pdf", "summary": "one"}\n\x1e{"source": "2.pdf", "summary": "two"}\n')
+    assert batches == [[{"source": "1.pdf", "summary": "one"}, {"source": "2.pdf", "summary": "two"}]]
+
+
+def test_blank_lines_and_crlf_are_ignored():
+    batches, _ = _run(b'\r\n{"source": "1.pdf", "summary": "one"}\r\n\r\n')
+    assert batches == [[{"source": "1.pdf", "summary": "one"}]]
+
+
+def test_long_line_in_many_chunks():
+    summary = "가" * 100_000
+    line = ('{"source": "big.pdf", "summary": "%s"}\n' % summary).encode()
+    chunks = [line[i:i + 1000] for i in range(0, len(line), 1000)]
+    collector = DocumentCollector(max_summary_chars=200_000)
+    batches, _ = _run(*chunks, collector=collector)
+    assert batches == [[{"source": "big.pdf", "summary": summary}]]
+
+
+def test_duplicates_and_limits():
+    collector = DocumentCollector(max_docs=2, max_summary_chars=3)
+    batches, _ = _run(
+        b'{"source": "1.pdf", "summary": "abcdef"}\n{"source": "x/1.pdf"}\n'
+        b'{"summary": "no source"}\n{"source": "3.pdf"}\n',
+        collector=collector,
+    )
+    assert batches == [[{"source": "1.pdf", "summary": "abc"}, {"source": "문서 3", "summary": "no "}]]
+    assert (collector.accepted, collector.duplicates, collector.skipped) == (2, 1, 1)
+
+
+def test_invalid_line_is_rejected():
+    with pytest.raises(IngestError) as info:
+        _run(b'{"source": "1.pdf"}\nnot json\n')
+    assert info.value.status_code == 400
+
+
+def test_body_size_limit():
+    with pytest.raises(IngestError) as info:
+        _run(b'{"source": "1.pdf"}\n' * 10, max_bytes=50)
+    assert info.value.status_code == 413
+
+
+def test_parse_json_body_accepts_list_and_object():
+    assert parse_json_body(b'[{"source": "1.pdf", "summary": "s"}]', DocumentCollector()) == [{"source": "1.pdf", "summary": "s"}]
+    collector = DocumentCollector()
+    assert parse_json_body(b'{"uuid": "s1", "documents": [{"source": "2.pdf"}]}', collector) == [{"source": "2.pdf", "summary": ""}]
+    assert collector.session_id == "s1"
+    with pytest.raises(IngestError):
+        parse_json_body(b"{", DocumentCollector())
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+
+from log_shipper import LogShipper, orphan_spill_files, process_spill_path
+
+# 살아 있지 않은 프로세스 번호 (pid_max보다 큼)
+DEAD_PID = 2 ** 22 + 1
+
+
+class Sink:
+    """전송된 배치를 모으고, fail이 켜져 있으면 실패하는 가짜 로깅 웹훅"""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+
+    async def __call__(self, batch):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("n8n down")
+        self.batches.append([r["n"] for r in batch])
+
+    @property
+    def records(self):
+        return [n for batch in self.batches for n in batch]
+
+
+def _shipper(sink, tmp_path, **kwargs):
+    options = dict(max_queue=100, batch_size=3, batch_age=0.02, spill_path=str(tmp_path / "spill.jsonl"), retry_interval=0)
+    options.update(kwargs)
+    return LogShipper(sink, **options)
+
+
+def _spill_path(tmp_path):
+    return tmp_path / os.path.basename(process_spill_path(str(tmp_path / "spill.jsonl")))
+
+
+def _spilled(tmp_path):
+    path = _spill_path(tmp_path)
+    if not path.exists():
+        return []
+    return [json.loads(line)["n"] for line in path.read_text().splitlines()]
+
+
+def test_batches_by_size_and_age(tmp_path):
+    sink = Sink()
+
+    async def main():
+        shipper = _shipper(sink, tmp_path)
+        shipper.start()
+        for n in range(4):
+            shipper.submit({"n": n})
+        await asyncio.sleep(0.1)
+        await shipper.stop()
+        return shipper
+
+    shipper = asyncio.run(main())
+    # 세 건은 개수로, 마지막 한 건은 대기 시간으로 전송
+    assert sink.batches == [[0, 1, 2], [3]]
+    assert shipper.stats["sent"] == 4
+
+
+def test_submit_never_waits_on_slow_sink(tmp_path):
+    sink = Sink(delay=0.2)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path)
+        shipper.start()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for n in range(10):
+            shipper.submit({"n": n})
+        elapsed = loop.time() - start
+        await shipper.stop(timeout=5)
+        return elapsed
+
+    assert asyncio.run(main()) < 0.05
+    assert sorted(sink.records) == list(range(10))
+
+
+def test_drop_newest_and_drop_oldest(tmp_path):
+    async def main(policy):
+        shipper = _shipper(Sink(), tmp_path, max_queue=2, overflow_policy=policy)
+        results = [shipper.submit({"n": n}) for n in range(3)]
+        return results, [shipper.queue.get_nowait()["n"] for _ in range(2)], shipper.stats["dropped"]
+
+    assert asyncio.run(main("drop_newest")) == ([True, True, False], [0, 1], 1)
+    assert asyncio.run(main("drop_oldest")) == ([True, True, True], [1, 2], 1)
+
+
+def test_sample_policy_thins_a_backed_up_queue(tmp_path):
+    async def main():
+        shipper = _shipper(Sink(), tmp_path, max_queue=10, overflow_policy="sample", sample_rate=0.0)
+        accepted = [shipper.submit({"n": n}) for n in range(8)]
+        return accepted, shipper.stats["sampled_out"]
+
+    accepted, sampled_out = asyncio.run(main())
+    # 큐가 절반(5건) 찬 뒤로는 sample_rate=0이므로 모두 제외
+    assert accepted == [True] * 5 + [False] * 3
+    assert sampled_out == 3
+
+
+def test_failed_batches_are_spilled_and_replayed(tmp_path):
+    sink = Sink(fail=True)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, batch_size=2)
+        shipper.start()
+        for n in range(2):
+            shipper.submit({"n": n})
+        await asyncio.sleep(0.1)
+        spilled = _spilled(tmp_path)
+        # n8n 회복 후 다음 배치가 성공하면 디스크 로그도 재전송
+        sink.fail = False
+        shipper.submit({"n": 2})
+        await asyncio.sleep(0.1)
+        await shipper.stop()
+        return spilled, shipper.stats
+
+    spilled, stats = asyncio.run(main())
+    assert spilled == [0, 1]
+    assert sorted(sink.records) == [0, 1, 2]
+    assert stats["failed_batches"] == 1
+    assert not _spill_path(tmp_path).exists()
+
+
+def test_spill_file_from_previous_run_is_replayed(tmp_path):
+    (tmp_path / "spill.jsonl").write_text('{"n": 0}\nnot json\n{"n": 1}\n')
+    sink = Sink()
+
+    async def main():
+        shipper = _shipper(sink, tmp_path)
+        shipper.start()
+        shipper.submit({"n": 2})
+        await asyncio.sleep(0.1)
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert sink.records == [2, 0, 1]
+
+
+def test_files_left_by_dead_workers_are_claimed_and_replayed(tmp_path):
+    # 재전송 도중 죽은 워커의 .sending 파일, 죽은 워커의 디스크 로그, PID 없는 이전 형식 파일
+    (tmp_path / f"spill.{DEAD_PID}.jsonl.sending").write_text('{"n": 0}\n')
+    (tmp_path / f"spill.{DEAD_PID + 1}.jsonl").write_text('{"n": 1}\n')
+    (tmp_path / "spill.jsonl").write_text('{"n": 2}\n')
+    sink = Sink()
+
+    async def main():
+        shipper = _shipper(sink, tmp_path)
+        shipper.start()
+        # 재전송은 정상 전송 뒤 한 번에 파일 하나씩
+        for n in range(10, 14):
+            shipper.submit({"n": n})
+            await asyncio.sleep(0.05)
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert sorted(sink.records) == [0, 1, 2, 10, 11, 12, 13]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_files_are_per_process(tmp_path):
+    base = str(tmp_path / "spill.jsonl")
+    assert process_spill_path(base, 42) == str(tmp_path / "spill.42.jsonl")
+    (tmp_path / f"spill.{os.getpid()}.jsonl").write_text("")
+    (tmp_path / f"spill.{DEAD_PID}.jsonl").write_text("")
+    (tmp_path / "other.jsonl").write_text("")
+    # 자기 자신과 살아 있는 프로세스의 파일은 넘겨받지 않는다
+    assert orphan_spill_files(base) == [str(tmp_path / f"spill.{DEAD_PID}.jsonl")]
+
+
+def test_failed_replay_keeps_records_on_disk(tmp_path):
+    (tmp_path / f"spill.{DEAD_PID}.jsonl").write_text('{"n": 0}\n{"n": 1}\n')
+    sink = Sink()
+
+    async def reject_replayed(batch):
+        if any(r["n"] < 10 for r in batch):
+            raise RuntimeError("n8n down")
+        await sink(batch)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path)
+        shipper._send_batch = reject_replayed
+        shipper.start()
+        shipper.submit({"n": 10})
+        await asyncio.sleep(0.1)
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert sink.records == [10]
+    assert _spilled(tmp_path) == [0, 1]
+    # 넘겨받은 파일과 .sending 파일은 남지 않는다
+    assert [path.name for path in tmp_path.iterdir()] == [_spill_path(tmp_path).name]
+
+
+def test_stop_flushes_queued_records(tmp_path):
+    sink = Sink()
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, batch_age=10)
+        shipper.start()
+        for n in range(2):
+            shipper.submit({"n": n})
+        await asyncio.sleep(0.01)
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert sink.records == [0, 1]
+
+
+def test_stop_spills_what_it_cannot_send(tmp_path):
+    sink = Sink(fail=True)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, batch_age=10)
+        for n in range(2):
+            shipper.submit({"n": n})
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert _spilled(tmp_path) == [0, 1]
+
+
+def test_stop_timeout_spills_only_unsent_batches(tmp_path):
+    sink = Sink()
+
+    async def hang_after_first_batch(batch):
+        if sink.batches:
+            await asyncio.sleep(10)
+        await sink(batch)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, batch_size=2, batch_age=10)
+        shipper._send_batch = hang_after_first_batch
+        for n in range(5):
+            shipper.submit({"n": n})
+        await shipper.stop(timeout=0.1)
+
+    asyncio.run(main())
+    # 첫 배치는 전송됐으므로 타임아웃 뒤에는 나머지만 디스크에 남긴다
+    assert sink.records == [0, 1]
+    assert _spilled(tmp_path) == [2, 3, 4]
+
+
+def test_partially_failed_replay_keeps_only_unsent_records(tmp_path):
+    (tmp_path / f"spill.{DEAD_PID}.jsonl").write_text("".join(f'{{"n": {n}}}\n' for n in range(4)))
+    sink = Sink()
+
+    async def reject_second_replay_batch(batch):
+        if batch[0]["n"] == 2:
+            raise RuntimeError("n8n down")
+        await sink(batch)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, batch_size=2)
+        shipper._send_batch = reject_second_replay_batch
+        shipper.start()
+        shipper.submit({"n": 10})
+        await asyncio.sleep(0.1)
+        await shipper.stop()
+
+    asyncio.run(main())
+    assert sink.records == [10, 0, 1]
+    assert _spilled(tmp_path) == [2, 3]
+
+
+def test_spill_size_limit_drops_records(tmp_path):
+    sink = Sink(fail=True)
+
+    async def main():
+        shipper = _shipper(sink, tmp_path, spill_max_bytes=20)
+        for n in range(5):
+            shipper.submit({"n": n})
+        await shipper.stop()
+        return shipper.stats
+
+    stats = asyncio.run(main())
+    assert _spilled(tmp_path) == []
+    assert stats["dropped"] == 5
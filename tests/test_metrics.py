@@ -0,0 +1,53 @@
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("stage_seconds", "도움말", {"stage": "x"}, buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.samples() == [
+        'stage_seconds_bucket{stage="x",le="0.1"} 2',
+        'stage_seconds_bucket{stage="x",le="1"} 3',
+        'stage_seconds_bucket{stage="x",le="+Inf"} 4',
+        'stage_seconds_sum{stage="x"} 3.65',
+        'stage_seconds_count{stage="x"} 4',
+    ]
+
+
+def test_counter_and_gauge():
+    counter = Counter("calls_total", "호출 수")
+    counter.inc()
+    counter.inc(2)
+    gauge = Gauge("inflight", "진행 중", {"upstream": "chat"})
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert counter.samples() == ["calls_total 3"]
+    assert gauge.samples() == ['inflight{upstream="chat"} 1']
+    gauge.set(0.5)
+    assert gauge.samples() == ['inflight{upstream="chat"} 0.5']
+
+
+def test_registry_writes_help_and_type_once_per_family():
+    registry = Registry()
+    for stage in ("a", "b"):
+        registry.register(Counter("stage_total", "단계", {"stage": stage}))
+    registry.register(Gauge("open", "열린 연결"))
+    assert registry.render() == (
+        "# HELP stage_total 단계\n"
+        "# TYPE stage_total counter\n"
+        'stage_total{stage="a"} 0\n'
+        'stage_total{stage="b"} 0\n'
+        "# HELP open 열린 연결\n"
+        "# TYPE open gauge\n"
+        "open 0\n"
+    )
+
+
+def test_module_registry_exposes_pipeline_stages():
+    text = metrics.render()
+    assert "# TYPE n8ngpt_stage_duration_seconds histogram" in text
+    assert text.count("# HELP n8ngpt_stage_duration_seconds") == 1
+    for stage in ("ws_greeting", "n8n_chat", "openai_ttft", "openai_stream", "ws_send", "download_link", "log_to_n8n"):
+        assert f'n8ngpt_stage_duration_seconds_count{{stage="{stage}"}}' in text
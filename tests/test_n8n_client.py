@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+import n8n_client
+import settings
+from n8n_client import N8NClient, N8NStreamError, is_streaming_response, iter_stream_text
+
+
+def _client(handler):
+    client = N8NClient("http://n8n.test")
+    client._client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_post_uses_endpoint_path_and_timeout():
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"ok": True})
+
+    async def main():
+        client = _client(handler)
+        await client.post("chat", json={"chatInput": "질문"})
+        await client.post("prompt", timeout=1.5)
+        await client.aclose()
+
+    asyncio.run(main())
+    chat, prompt = requests
+    assert chat.url.path == settings.N8N_CHAT_PATH
+    assert chat.extensions["timeout"]["read"] == settings.N8N_CHAT_TIMEOUT
+    assert chat.extensions["timeout"]["connect"] == settings.N8N_CONNECT_TIMEOUT
+    assert prompt.url.path == settings.N8N_PROMPT_PATH
+    assert prompt.extensions["timeout"]["read"] == 1.5
+
+
+def test_unknown_endpoint_is_rejected():
+    with pytest.raises(KeyError):
+        N8NClient("http://n8n.test").timeout_for("nope")
+
+
+def test_pool_is_shared_and_recreated_after_close(monkeypatch):
+    monkeypatch.setattr(n8n_client, "_http2_available", lambda: False)
+
+    async def main():
+        client = N8NClient("http://n8n.test", http2=True, max_connections=7)
+        await client.start()
+        first = client.http
+        # 같은 풀을 계속 쓴다
+        assert client.http is first
+        await client.start()
+        assert client.http is first
+        await client.aclose()
+        assert first.is_closed
+        # lifespan 밖에서는 첫 사용 시 새 풀을 만든다
+        second = client.http
+        await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert second is not first
+    assert str(first.base_url) == "http://n8n.test"
+
+
+def _stream_text(content_type, body):
+    async def handler(request):
+        return httpx.Response(200, headers={"content-type": content_type}, content=body)
+
+    async def main():
+        async with _client(handler).stream("chat", json={}) as response:
+            return is_streaming_response(response), [text async for text in iter_stream_text(response)]
+
+    return asyncio.run(main())
+
+
+def test_ndjson_items():
+    body = b'{"type": "begin"}\n{"type": "item", "content": "\xec\x95\x88"}\n\n{"type": "item", "content": "\xeb\x85\x95"}\n{"type": "end"}\n'
+    assert _stream_text("application/x-ndjson", body) == (True, ["안", "녕"])
+
+
+def test_sse_events():
+    body = b'event: message\ndata: {"text": "a"}\n\ndata: plain\n\ndata: [DONE]\n\n'
+    assert _stream_text("text/event-stream; charset=utf-8", body) == (True, ["a", "plain"])
+
+
+def test_plain_text_chunks():
+    assert _stream_text("text/plain", "그대로 전달".encode()) == (True, ["그대로 전달"])
+
+
+def test_json_body_is_not_streaming():
+    streaming, _ = _stream_text("application/json", b'{"response": "x"}')
+    assert not streaming
+
+
+def test_error_event_raises():
+    with pytest.raises(N8NStreamError, match="워크플로우 실패"):
+        _stream_text("application/x-ndjson", '{"type": "item", "content": "a"}\n{"type": "error", "content": "워크플로우 실패"}\n'.encode())
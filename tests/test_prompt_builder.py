@@ -0,0 +1,81 @@
+from prompt_builder import PromptBuilder, Tokenizer, estimate_tokens, input_budget
+
+CHATBOT = {
+    "instructionData": "친절하게 답변하세요.",
+    "trainingData": "학습 데이터 문장입니다. " * 50,
+    "gpt-model": "gpt-4o-mini",
+    "max-tokens": 1000,
+    "config-version": "v1",
+}
+
+
+def _references(count, chars=400):
+    return [{"title": f"문서{i}", "content": "참고 내용 " * (chars // 6), "source": f"{i}.pdf"} for i in range(count)]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("가나다") == 3
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("a, b") == 3
+
+
+def test_truncate_without_tiktoken_fits_budget():
+    tokenizer = Tokenizer()
+    # 인코딩 None = tiktoken 없음
+    tokenizer._encodings["gpt-4o-mini"] = None
+    text = "한국어 문장입니다. " * 100
+    trimmed = tokenizer.truncate(text, 50, "gpt-4o-mini")
+    assert tokenizer.count(trimmed, "gpt-4o-mini") <= 50
+    assert text.startswith(trimmed)
+    assert tokenizer.truncate(text, 0, "gpt-4o-mini") == ""
+
+
+def test_input_budget_uses_smaller_limit():
+    assert input_budget("gpt-4", 2000, 16000) == 8192 - 2000
+    assert input_budget("gpt-4o-mini", 2000, 16000) == 16000
+    assert input_budget("gpt-4o-mini", 2000, 0) == 128_000 - 2000
+
+
+def test_everything_fits_in_large_budget():
+    built = PromptBuilder(max_input_tokens=100_000, training_max_tokens=0).build(CHATBOT, "질문", _references(3))
+    assert built.references == _references(3)
+    assert built.report["references_dropped"] == 0
+    assert built.report["total"] <= built.report["budget"]
+    assert "[문서3]" in built.user
+
+
+def test_references_are_trimmed_then_dropped():
+    builder = PromptBuilder(max_input_tokens=1200, training_max_tokens=0, min_reference_tokens=32)
+    references = _references(10)
+    built = builder.build(CHATBOT, "질문", references)
+    report = built.report
+    assert report["total"] <= report["budget"] == 1200
+    assert 0 < report["references_used"] < len(references)
+    assert report["references_trimmed"] == 1
+    assert report["references_dropped"] == len(references) - report["references_used"]
+    assert built.references == references[:report["references_used"]]
+
+
+def test_training_data_is_trimmed_to_its_limit():
+    builder = PromptBuilder(max_input_tokens=100_000, training_max_tokens=40)
+    built = builder.build(CHATBOT, "질문", [])
+    assert built.report["training_trimmed"]
+    assert built.report["training"] <= 40 + builder.tokenizer.count("# 학습 데이터\n\n\n", "gpt-4o-mini")
+
+
+def test_compiled_prompt_is_reused_per_version():
+    builder = PromptBuilder()
+    builder.build(CHATBOT, "첫 질문", [])
+    builder.build(CHATBOT, "두 번째 질문", [])
+    assert builder.compiles == 1
+    builder.build(dict(CHATBOT, **{"config-version": "v2"}), "질문", [])
+    assert builder.compiles == 2
+
+
+def test_cache_layout_keeps_same_prefix_across_turns():
+    builder = PromptBuilder(cache_layout=True)
+    first = builder.build(CHATBOT, "첫 질문", _references(1))
+    second = builder.build(CHATBOT, "다른 질문", _references(2))
+    assert first.system == second.system
+    assert first.user != second.user
+    assert "학습 데이터 문장" in first.system
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import reference_store
+from reference_store import ReferenceStore
+
+
+def _doc(source, summary="요약"):
+    return {"source": source, "summary": summary}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(reference_store, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_sessions_are_kept_apart():
+    store = ReferenceStore(ttl=60, max_docs_per_session=10, max_total_size=1_000_000)
+    store.add("u1", [_doc("a.pdf")])
+    store.add("u2", [_doc("b.pdf")])
+    assert store.get("u1") == [_doc("a.pdf")]
+    assert store.pop("u2") == [_doc("b.pdf")]
+    assert store.pop("u2") == []
+    assert len(store) == 1
+
+
+def test_per_session_limit_drops_oldest_documents():
+    store = ReferenceStore(ttl=60, max_docs_per_session=2, max_total_size=1_000_000)
+    assert store.add("u1", [_doc("1.pdf"), _doc("2.pdf")]) == 2
+    assert store.add("u1", [_doc("3.pdf")]) == 2
+    assert [d["source"] for d in store.get("u1")] == ["2.pdf", "3.pdf"]
+    assert store.total_size == sum(len(d["source"]) + len(d["summary"]) + 64 for d in store.get("u1"))
+
+
+def test_expired_sessions_are_dropped(clock):
+    store = ReferenceStore(ttl=10, max_docs_per_session=10, max_total_size=1_000_000)
+    store.add("old", [_doc("a.pdf")])
+    clock[0] += 5
+    store.add("new", [_doc("b.pdf")])
+    clock[0] += 6
+    assert store.get("old") == []
+    assert store.pop("new") == [_doc("b.pdf")]
+    # 만료된 세션에 다시 추가하면 새 세션으로 시작
+    store.add("old", [_doc("c.pdf")])
+    assert store.get("old") == [_doc("c.pdf")]
+
+
+def test_total_size_evicts_least_recently_updated_session():
+    big = _doc("big.pdf", "x" * 100)
+    store = ReferenceStore(ttl=60, max_docs_per_session=10, max_total_size=450)
+    store.add("a", [big])
+    store.add("b", [big])
+    # a가 다시 갱신되어 가장 오래된 세션은 b
+    store.add("a", [_doc("small.pdf", "")])
+    store.add("c", [big])
+    assert store.get("b") == []
+    assert store.get("a") and store.get("c")
+    assert store.total_size <= 450
+
+
+def test_single_session_over_limit_is_kept():
+    store = ReferenceStore(ttl=60, max_docs_per_session=10, max_total_size=10)
+    store.add("only", [_doc("a.pdf")])
+    assert store.get("only") == [_doc("a.pdf")]
@@ -0,0 +1,185 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from n8n_client import N8NClient
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyWindow, budget, set_deadline
+
+
+def _client(handler, **kwargs):
+    client = N8NClient("http://n8n.test", **kwargs)
+    client._client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_breaker_opens_after_failures_and_probes_once(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("chat", failures=2, reset_after=10)
+    for _ in range(2):
+        breaker.release(breaker.before_call())
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] += 10
+    probe = breaker.before_call()
+    assert probe and breaker.state == CircuitBreaker.HALF_OPEN
+    # 시험 호출이 끝나기 전의 다른 호출은 거절
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.release(probe)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("chat", failures=1, reset_after=10)
+    breaker.record_failure()
+    now[0] += 10
+    probe = breaker.before_call()
+    breaker.record_failure()
+    breaker.release(probe)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == 10
+
+
+def test_latency_window_needs_samples():
+    window = LatencyWindow()
+    for _ in range(10):
+        window.observe(0.1)
+    assert window.quantile(0.95) is None
+    for i in range(10):
+        window.observe(0.2 + i)
+    assert window.quantile(0.95) == pytest.approx(9.2)
+
+
+def test_budget_is_capped_by_deadline():
+    async def main():
+        assert budget(10, "test") == 10
+        set_deadline(1)
+        assert budget(10, "test") <= 1
+        set_deadline(0.0001)
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            budget(10, "test")
+
+    asyncio.run(main())
+
+
+def test_fetch_retries_server_errors():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(502 if len(calls) < 3 else 200, json={})
+
+    async def main():
+        return await _client(handler, retry_attempts=3, retry_base_delay=0.001).fetch("search-pdf", json={})
+
+    assert asyncio.run(main()).status_code == 200
+    assert len(calls) == 3
+
+
+def test_fetch_returns_last_error_response_after_retries():
+    async def handler(request):
+        return httpx.Response(503)
+
+    async def main():
+        return await _client(handler, retry_attempts=2, retry_base_delay=0.001).fetch("prompt")
+
+    assert asyncio.run(main()).status_code == 503
+
+
+def test_fetch_retries_connection_errors_then_raises():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("refused", request=request)
+
+    async def main():
+        await _client(handler, retry_attempts=3, retry_base_delay=0.001).fetch("prompt")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(main())
+    assert len(calls) == 3
+
+
+def test_fetch_does_not_retry_timeouts():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    async def main():
+        await _client(handler, retry_attempts=3, retry_base_delay=0.001).fetch("prompt")
+
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_open_circuit_rejects_without_calling():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    async def main():
+        client = _client(handler)
+        client.breakers["chat"] = CircuitBreaker("chat", failures=2, reset_after=60)
+        for _ in range(2):
+            await client.post("chat", json={})
+        with pytest.raises(CircuitOpenError):
+            await client.post("chat", json={})
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_hedge_uses_faster_second_request():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(2 if len(calls) == 1 else 0.001)
+        return httpx.Response(200, json={"order": len(calls)})
+
+    async def main():
+        client = _client(handler, hedge=True)
+        for _ in range(30):
+            client.latency["search-pdf"].observe(0.01)
+        start = time.perf_counter()
+        response = await client.fetch("search-pdf", json={})
+        return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(main())
+    assert response.json() == {"order": 2}
+    assert elapsed < 1
+    assert len(calls) == 2
+
+
+def test_fetch_after_deadline_does_not_call():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(200)
+
+    async def main():
+        set_deadline(0.0001)
+        await asyncio.sleep(0.01)
+        await _client(handler).fetch("prompt")
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert calls == []
@@ -0,0 +1,60 @@
+from retrieval import BM25Index, SessionRetriever, split_passages, tokenize
+
+DOCUMENTS = [
+    {"source": "휴가.pdf", "summary": "연차 휴가는 입사 1년 후 15일이 부여됩니다."},
+    {"source": "급여.pdf", "summary": "급여는 매월 25일에 지급됩니다."},
+    {"source": "보안.pdf", "summary": "VPN 접속은 OTP 인증이 필요합니다."},
+]
+
+
+def test_tokenize_uses_bigrams_for_korean_and_words_for_latin():
+    assert tokenize("연차휴가 VPN-접속") == ["vpn", "연차", "차휴", "휴가", "접속"]
+
+
+def test_split_passages_respects_max_chars():
+    text = "첫 문장입니다. 두 번째 문장입니다. 세 번째 문장입니다."
+    passages = split_passages(text, max_chars=20)
+    assert all(len(p) <= 20 for p in passages)
+    assert " ".join(passages) == text
+
+
+def test_bm25_ranks_matching_document_first():
+    index = BM25Index()
+    assert index.add(DOCUMENTS) == 3
+    # 같은 출처는 다시 색인하지 않는다
+    assert index.add(DOCUMENTS[:1]) == 0
+    ranked = index.search("연차 휴가 며칠", top_k=3)
+    assert index.passages[ranked[0][0]][0] == "휴가.pdf"
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+
+
+def test_bm25_cutoff_drops_weak_matches():
+    index = BM25Index()
+    index.add(DOCUMENTS)
+    ranked = index.search("급여 지급일 휴가", top_k=3, cutoff=0.0)
+    cut = index.search("급여 지급일 휴가", top_k=3, cutoff=0.99)
+    assert len(cut) < len(ranked)
+    assert index.search("없는단어", top_k=3) == []
+
+
+def test_session_retriever_selects_relevant_documents():
+    retriever = SessionRetriever(enabled=True, top_k=1, cutoff=0.2, ttl=60, max_sessions=10)
+    retriever.add("s1", DOCUMENTS)
+    assert retriever.select("s1", DOCUMENTS, "VPN 접속 방법") == [DOCUMENTS[2]]
+
+
+def test_session_retriever_falls_back_to_first_documents():
+    retriever = SessionRetriever(enabled=True, top_k=2, cutoff=0.2, ttl=60, max_sessions=10)
+    assert retriever.select("s1", DOCUMENTS, "zzz") == DOCUMENTS[:2]
+
+
+def test_session_retriever_disabled_returns_everything():
+    retriever = SessionRetriever(enabled=False, top_k=1, cutoff=0.2, ttl=60, max_sessions=10)
+    assert retriever.select("s1", DOCUMENTS, "VPN") == DOCUMENTS
+
+
+def test_session_retriever_limits_sessions():
+    retriever = SessionRetriever(enabled=True, top_k=1, cutoff=0.2, ttl=60, max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        retriever.add(session_id, DOCUMENTS)
+    assert list(retriever._indexes) == ["b", "c"]
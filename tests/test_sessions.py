@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from sessions import ClientSession, SessionExpired, SessionRegistry, is_heartbeat
+
+
+class FakeWebSocket:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(text)
+
+
+def test_is_heartbeat():
+    assert is_heartbeat('{"type":"ping"}')
+    assert is_heartbeat('{"type": "ping"}')
+    assert not is_heartbeat('{"type": "pong"}')
+    assert not is_heartbeat('{"chatInput": "ping"}')
+
+
+def test_frames_are_buffered_while_detached_and_replayed_in_order():
+    async def main():
+        session = ClientSession("u1")
+        first = FakeWebSocket()
+        await session.attach(first)
+        await session.send_text("1")
+        session.detach(first)
+        await session.send_text("2")
+        await session.send_text("3")
+        second = FakeWebSocket()
+        replayed = await session.attach(second)
+        await session.send_text("4")
+        return first, second, replayed
+
+    first, second, replayed = asyncio.run(main())
+    assert first.sent == ["1"]
+    assert second.sent == ["2", "3", "4"]
+    assert replayed == 2
+
+
+def test_failed_send_detaches_and_buffers():
+    async def main():
+        session = ClientSession("u1")
+        await session.attach(FakeWebSocket(fail=True))
+        await session.send_text("lost")
+        return session
+
+    session = asyncio.run(main())
+    assert session.websocket is None
+    assert session.detached_at is not None
+    replacement = FakeWebSocket()
+    asyncio.run(session.attach(replacement))
+    assert replacement.sent == ["lost"]
+
+
+def test_buffer_overflow_makes_session_unresumable():
+    async def main():
+        session = ClientSession("u1", max_buffer=2)
+        for text in ("1", "2", "3"):
+            await session.send_text(text)
+        return session
+
+    session = asyncio.run(main())
+    assert not session.resumable
+    with pytest.raises(SessionExpired):
+        asyncio.run(session.attach(FakeWebSocket()))
+
+
+def test_resume_checks_token_uuid_and_ttl(monkeypatch):
+    registry = SessionRegistry(ttl=10, max_connections=0, max_per_uuid=0)
+    session = registry.create("u1")
+    assert registry.resume(session.token, "u1") is session
+    assert registry.resume(session.token, None) is session
+    assert registry.resume(session.token, "u2") is None
+    assert registry.resume("unknown", "u1") is None
+    assert registry.resume(None, "u1") is None
+
+    detached_at = session.detached_at
+    monkeypatch.setattr("sessions.time.monotonic", lambda: detached_at + 11)
+    assert registry.resume(session.token, "u1") is None
+    assert registry.stats()["sessions"] == 0
+
+
+def test_connection_limits():
+    registry = SessionRegistry(ttl=10, max_connections=3, max_per_uuid=2)
+    a, b, c = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    assert registry.connect(a, "u1") is None
+    assert registry.connect(b, "u1") is None
+    # uuid별 제한을 넘으면 가장 오래된 연결을 돌려준다
+    assert registry.connect(c, "u1") is a
+    assert registry.at_capacity()
+    registry.disconnect(a, "u1", None)
+    assert not registry.at_capacity()
+    assert registry.stats() == {"connections": 2, "uuids": 1, "sessions": 0, "detached": 0}
+
+
+def test_turns_run_in_order_and_can_be_cancelled():
+    async def main():
+        session = ClientSession("u1")
+        order = []
+
+        async def turn(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        first = session.start_turn(1, turn("first", 0.05))
+        second = session.start_turn(2, turn("second", 0))
+        never_started = turn("third", 0)
+        third = session.start_turn(3, never_started)
+        assert session.cancel(3) == 1
+        assert session.cancel(99) == 0
+        await asyncio.wait([first, second, third])
+        return order, third, never_started, session
+
+    order, third, never_started, session = asyncio.run(main())
+    assert order == ["first", "second"]
+    assert third.cancelled()
+    # 시작 전에 취소된 턴의 코루틴도 닫힌다
+    assert never_started.cr_frame is None
+    assert session.turns == {}
+
+
+def test_pipelined_turns_run_concurrently():
+    async def main():
+        session = ClientSession("u1")
+        order = []
+
+        async def turn(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        tasks = [session.start_turn(1, turn("slow", 0.05), sequential=False), session.start_turn(2, turn("fast", 0), sequential=False)]
+        await asyncio.wait(tasks)
+        return order
+
+    assert asyncio.run(main()) == ["fast", "slow"]
+
+
+def test_detached_turns_are_cancelled_after_grace_unless_resumed():
+    async def main():
+        session = ClientSession("u1")
+        websocket = FakeWebSocket()
+        await session.attach(websocket)
+        resumed_task = session.start_turn(1, asyncio.sleep(1))
+        session.detach(websocket)
+        session.cancel_later(0.02)
+        # 유예 시간 안에 재개하면 취소하지 않는다
+        await session.attach(FakeWebSocket())
+        await asyncio.sleep(0.05)
+        kept = not resumed_task.done()
+
+        session.detach(session.websocket)
+        session.cancel_later(0.02)
+        await asyncio.sleep(0.05)
+        return kept, resumed_task
+
+    kept, task = asyncio.run(main())
+    assert kept
+    assert task.cancelled()
@@ -0,0 +1,161 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from reference_store import ReferenceStore
+from state import MemoryStateBackend, SQLiteStateBackend, create_state_backend
+
+DOCS = [{"source": "1.pdf", "summary": "one"}, {"source": "2.pdf", "summary": "two"}]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    return SQLiteStateBackend(str(tmp_path / "state.db"))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(**limits):
+        if request.param == "memory":
+            return MemoryStateBackend(ReferenceStore(**limits))
+        return SQLiteStateBackend(str(tmp_path / "state.db"), **limits)
+    return make
+
+
+def _sqlite(tmp_path, **limits):
+    return SQLiteStateBackend(str(tmp_path / "state.db"), **limits)
+
+
+def test_add_get_pop(backend):
+    async def main():
+        try:
+            assert await backend.add_references("s1", DOCS[:1]) == 1
+            assert await backend.add_references("s1", DOCS[1:]) == 2
+            assert await backend.get_references("s1") == DOCS
+            assert await backend.pop_references("s1") == DOCS
+            assert await backend.pop_references("s1") == []
+            assert await backend.get_references("missing") == []
+        finally:
+            await backend.close()
+
+    asyncio.run(main())
+
+
+def test_sessions_are_separate(backend):
+    async def main():
+        try:
+            await backend.add_references("a", DOCS[:1])
+            await backend.add_references("b", DOCS[1:])
+            return await backend.pop_references("a"), await backend.pop_references("b")
+        finally:
+            await backend.close()
+
+    assert asyncio.run(main()) == (DOCS[:1], DOCS[1:])
+
+
+def test_per_session_limit_keeps_newest(make_backend):
+    async def main():
+        backend = make_backend(ttl=60, max_docs_per_session=2, max_total_size=1_000_000)
+        try:
+            docs = [{"source": f"{i}.pdf", "summary": str(i)} for i in range(3)]
+            assert await backend.add_references("s1", docs) == 2
+            return await backend.get_references("s1")
+        finally:
+            await backend.close()
+
+    assert asyncio.run(main()) == [{"source": "1.pdf", "summary": "1"}, {"source": "2.pdf", "summary": "2"}]
+
+
+def test_sqlite_total_size_evicts_oldest_session(tmp_path):
+    async def main():
+        backend = _sqlite(tmp_path, ttl=60, max_docs_per_session=10, max_total_size=30)
+        try:
+            big = [{"source": "big.pdf", "summary": "x" * 15}]
+            await backend.add_references("old", big)
+            await backend.add_references("new", big)
+            return await backend.get_references("old"), await backend.get_references("new")
+        finally:
+            await backend.close()
+
+    assert asyncio.run(main()) == ([], [{"source": "big.pdf", "summary": "x" * 15}])
+
+
+def test_sqlite_total_size_is_kept_in_step_with_documents(tmp_path):
+    async def main():
+        backend = _sqlite(tmp_path, ttl=60, max_docs_per_session=1, max_total_size=1_000_000)
+        try:
+            await backend.add_references("a", DOCS)
+            await backend.add_references("b", DOCS[:1])
+            await backend.pop_references("b")
+
+            def sizes(conn):
+                actual = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reference_docs").fetchone()[0]
+                return backend._total_size(conn), actual
+
+            return await backend._run(sizes)
+        finally:
+            await backend.close()
+
+    # 세션당 제한으로 버린 문서와 꺼낸 세션도 누계에 반영된다
+    total, actual = asyncio.run(main())
+    assert total == actual > 0
+
+
+def test_sqlite_total_size_is_seeded_from_an_existing_file(tmp_path):
+    path = tmp_path / "state.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE reference_docs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, doc TEXT NOT NULL,
+            size INTEGER NOT NULL, created_at REAL NOT NULL
+        );
+        INSERT INTO reference_docs (session_id, doc, size, created_at) VALUES ('old', '{}', 40, 0);
+        """
+    )
+    conn.close()
+
+    async def main():
+        backend = _sqlite(tmp_path, ttl=60)
+        try:
+            return await backend._run(backend._total_size)
+        finally:
+            await backend.close()
+
+    assert asyncio.run(main()) == 40
+
+
+def test_expired_session_is_empty(make_backend):
+    async def main():
+        backend = make_backend(ttl=0.05, max_docs_per_session=10, max_total_size=1_000_000)
+        try:
+            await backend.add_references("s1", DOCS)
+            await asyncio.sleep(0.1)
+            return await backend.pop_references("s1")
+        finally:
+            await backend.close()
+
+    assert asyncio.run(main()) == []
+
+
+def test_sqlite_is_shared_between_instances(tmp_path):
+    async def main():
+        path = str(tmp_path / "shared.db")
+        writer, reader = SQLiteStateBackend(path), SQLiteStateBackend(path)
+        try:
+            await writer.add_references("s1", DOCS)
+            return await reader.pop_references("s1"), await writer.get_references("s1")
+        finally:
+            await writer.close()
+            await reader.close()
+
+    assert asyncio.run(main()) == (DOCS, [])
+
+
+def test_create_state_backend_rejects_unknown_kind():
+    assert isinstance(create_state_backend("memory"), MemoryStateBackend)
+    with pytest.raises(ValueError):
+        create_state_backend("nope")
@@ -0,0 +1,85 @@
+import gzip
+
+from starlette.requests import Request
+
+import static_assets
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets
+
+SCRIPT = b"console.log('hello');\n" * 40
+
+
+def _request(method="GET", **headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": method, "headers": raw})
+
+
+def _assets(tmp_path):
+    (tmp_path / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "index.html").write_text('<script src="/static/app.js"></script><img src="/static/missing.png">')
+    assets = StaticAssets(tmp_path)
+    assets.load()
+    return assets
+
+
+def test_index_references_hashed_urls(tmp_path):
+    assets = _assets(tmp_path)
+    hashed = assets.url("app.js")
+    assert hashed.startswith("/static/app.") and hashed.endswith(".js") and hashed != "/static/app.js"
+    html = assets.index_response(_request()).body.decode()
+    assert f'src="{hashed}"' in html
+    # 없는 파일 참조는 그대로 둔다
+    assert 'src="/static/missing.png"' in html
+
+
+def test_hashed_url_is_immutable_and_plain_url_revalidates(tmp_path):
+    assets = _assets(tmp_path)
+    hashed = assets.response(_request(), assets.hashed["app.js"])
+    plain = assets.response(_request(), "app.js")
+    assert hashed.headers["cache-control"] == IMMUTABLE
+    assert plain.headers["cache-control"] == REVALIDATE
+    assert hashed.body == plain.body == SCRIPT
+    assert assets.response(_request(), "nope.js").status_code == 404
+
+
+def test_encoding_negotiation(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_assets, "brotli", None)
+    assets = _assets(tmp_path)
+    identity = assets.response(_request(), "app.js")
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Accept-Encoding"
+
+    encoded = assets.response(_request(accept_encoding="br, gzip;q=0.8"), "app.js")
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(encoded.body) == SCRIPT
+    assert encoded.headers["etag"] != identity.headers["etag"]
+
+    refused = assets.response(_request(accept_encoding="gzip;q=0"), "app.js")
+    assert "content-encoding" not in refused.headers
+
+
+def test_if_none_match_returns_304(tmp_path):
+    assets = _assets(tmp_path)
+    etag = assets.response(_request(), "app.js").headers["etag"]
+    response = assets.response(_request(if_none_match=f'"other", W/{etag}'), "app.js")
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+    # 인코딩별 ETag는 다른 표현으로 본다
+    assert assets.response(_request(accept_encoding="gzip", if_none_match=etag), "app.js").status_code == 200
+
+
+def test_head_sends_length_without_body(tmp_path):
+    assets = _assets(tmp_path)
+    response = assets.response(_request("HEAD"), "app.js")
+    assert response.status_code == 200
+    assert response.body == b""
+    assert response.headers["content-length"] == str(len(SCRIPT))
+
+
+def test_small_files_are_not_compressed(tmp_path):
+    (tmp_path / "tiny.css").write_text("body{}")
+    assets = StaticAssets(tmp_path)
+    assets.load()
+    response = assets.response(_request(accept_encoding="gzip"), "tiny.css")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
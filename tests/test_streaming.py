@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from streaming import coalesce
+
+
+async def _pieces(items, delay=0.0, error=None, closed=None):
+    try:
+        for item in items:
+            if delay:
+                await asyncio.sleep(delay)
+            yield item
+        if error is not None:
+            raise error
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+async def _collect(source, **kwargs):
+    return [frame async for frame in coalesce(source, **kwargs)]
+
+
+def test_first_piece_is_sent_alone_and_rest_are_merged():
+    frames = asyncio.run(_collect(_pieces(["a", "b", "c", "d"]), window=0.05, max_bytes=1024))
+    assert frames == ["a", "bcd"]
+
+
+def test_max_bytes_splits_frames():
+    frames = asyncio.run(_collect(_pieces(["x"] + ["가"] * 4), window=1.0, max_bytes=6))
+    # 한글 1자 = UTF-8 3바이트
+    assert frames == ["x", "가가", "가가"]
+
+
+def test_window_flushes_slow_pieces_separately():
+    frames = asyncio.run(_collect(_pieces(["a", "b", "c"], delay=0.05), window=0.01, max_bytes=1024))
+    assert frames == ["a", "b", "c"]
+
+
+def test_empty_pieces_are_skipped():
+    frames = asyncio.run(_collect(_pieces(["", "a", "", "b"]), window=0.05, max_bytes=1024))
+    assert "".join(frames) == "ab"
+    assert "" not in frames
+
+
+def test_source_error_is_raised_after_pending_text():
+    async def main():
+        frames = []
+        with pytest.raises(RuntimeError, match="upstream"):
+            async for frame in coalesce(_pieces(["a", "b"], error=RuntimeError("upstream")), window=0.05, max_bytes=1024):
+                frames.append(frame)
+        return frames
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_closing_consumer_stops_source():
+    async def main():
+        closed = asyncio.Event()
+        frames = coalesce(_pieces(["a"] * 1000, delay=0.001, closed=closed), window=0.01, max_bytes=1024)
+        assert await frames.__anext__() == "a"
+        await frames.aclose()
+        await asyncio.wait_for(closed.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_cancelling_consumer_stops_source():
+    async def main():
+        closed = asyncio.Event()
+        started = asyncio.Event()
+
+        async def consume():
+            async for _ in coalesce(_pieces(["a"] * 1000, delay=0.001, closed=closed), window=0.01, max_bytes=1024):
+                started.set()
+
+        task = asyncio.create_task(consume())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.wait_for(closed.wait(), 1)
+
+    asyncio.run(main())